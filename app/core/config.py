@@ -9,4 +9,103 @@ class Settings:
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     GOOGLE_MODEL_NAME = os.getenv("GOOGLE_MODEL_NAME", "gemini-3-flash-preview")
 
+    # 摄取配置缓存 (同一文件重复上传时跳过 LLM)
+    INGESTION_CACHE_DIR = os.getenv("INGESTION_CACHE_DIR", ".cache/ingestion")
+    INGESTION_CACHE_MAX_ENTRIES = int(os.getenv("INGESTION_CACHE_MAX_ENTRIES", "500"))
+
+    # Sheet/Header 探测器：heuristic (本地打分, 低置信度时 LLM 兜底) | llm (始终询问 LLM)
+    INGESTION_DETECTOR = os.getenv("INGESTION_DETECTOR", "heuristic")
+    INGESTION_CONFIDENCE_THRESHOLD = float(os.getenv("INGESTION_CONFIDENCE_THRESHOLD", "0.75"))
+    # Excel 解析引擎：留空时自动选择 (优先 calamine，其次 openpyxl)
+    INGESTION_ENGINE = os.getenv("INGESTION_ENGINE", "")
+    # 上传摄取进程池大小 (同时解析的文件数上限)
+    INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+    # LLM 响应缓存 (仅 temperature=0)：精确匹配 + 可选的语义近似匹配 (阈值为 0 时关闭，只对列出的链生效)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".cache/llm")
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 86400)))
+    LLM_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD", "0"))
+    LLM_CACHE_SEMANTIC_CHAINS = [c.strip() for c in os.getenv("LLM_CACHE_SEMANTIC_CHAINS", "supervisor").split(",") if c.strip()]
+    # 不缓存的链：代码生成的输出是否可用要执行后才知道，缓存会原样重放失败的代码 (成功的代码由配方库 RECIPE_* 复用)
+    LLM_CACHE_EXCLUDED_CHAINS = [c.strip() for c in os.getenv("LLM_CACHE_EXCLUDED_CHAINS", "python_worker,auto_eda").split(",") if c.strip()]
+
+    # 代码配方库：成功脚本按 (规范化指令 + 表结构签名) 保存，下次直接回放；未固定的配方按 TTL / 数量淘汰
+    RECIPE_ENABLED = os.getenv("RECIPE_ENABLED", "true").lower() in ("1", "true", "yes")
+    RECIPE_DIR = os.getenv("RECIPE_DIR", ".cache/recipes")
+    RECIPE_MAX_ENTRIES = int(os.getenv("RECIPE_MAX_ENTRIES", "500"))
+    RECIPE_TTL_DAYS = float(os.getenv("RECIPE_TTL_DAYS", "90"))
+
+    # 表快照 (reload_data 还原用)：落盘为 Arrow IPC，不再在内存中保留深拷贝
+    SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "temp_snapshots")
+    SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "zstd")  # zstd | lz4 | uncompressed
+
+    # Session 生命周期：空闲过期时间、全部 Session 的 DataFrame 内存预算、清理周期
+    SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    SESSION_MEMORY_BUDGET_MB = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "2048"))
+    SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+    # 对话执行线程池：工作线程数、全局并发上限、最大排队数 (超出返回 503)
+    CHAT_MAX_WORKERS = int(os.getenv("CHAT_MAX_WORKERS", "8"))
+    CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+    CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "100"))
+
+    # 报表导出后台线程数 (数据未变化时复用上一次的报表，不重复导出)
+    EXPORT_MAX_WORKERS = int(os.getenv("EXPORT_MAX_WORKERS", "2"))
+    EXPORT_DEFAULT_FORMAT = os.getenv("EXPORT_DEFAULT_FORMAT", "xlsx")  # xlsx | parquet | csv
+
+    # supervisor 路由快速路径：rules (关键词/正则) | hybrid (规则 + 本地句向量模型) | llm (始终调用 LLM)
+    INTENT_CLASSIFIER = os.getenv("INTENT_CLASSIFIER", "rules")
+    INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+
+    # 投机代码生成：需要 LLM 路由时，同时提前生成 worker 代码 (路由不一致时丢弃，会多消耗一次 LLM 调用)
+    SPECULATIVE_CODEGEN = os.getenv("SPECULATIVE_CODEGEN", "false").lower() in ("1", "true", "yes")
+    SPECULATIVE_MAX_WORKERS = int(os.getenv("SPECULATIVE_MAX_WORKERS", "4"))
+
+    # 执行前对生成代码做 AST 静态检查 (表名/列名/禁用调用/未定义变量)，不通过时直接退回 worker
+    CODE_VALIDATION = os.getenv("CODE_VALIDATION", "true").lower() in ("1", "true", "yes")
+
+    # smart_merge 模糊匹配：得分矩阵分块大小 (MB，决定峰值内存) 与 rapidfuzz 线程数 (-1 表示全部 CPU)
+    FUZZY_CHUNK_MB = int(os.getenv("FUZZY_CHUNK_MB", "256"))
+    FUZZY_WORKERS = int(os.getenv("FUZZY_WORKERS", "-1"))
+
+    # smart_merge LLM 裁决：每个 Prompt 裁决的实体数与并发请求数
+    LLM_JUDGE_BATCH_SIZE = int(os.getenv("LLM_JUDGE_BATCH_SIZE", "20"))
+    LLM_JUDGE_CONCURRENCY = int(os.getenv("LLM_JUDGE_CONCURRENCY", "4"))
+
+    # 实体匹配句向量：持久化缓存 (float16 memory map，跨 Session 复用) 与 ANN 索引 (候选数达到阈值时启用)
+    EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+    EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", ".cache/embeddings")
+    ANN_MIN_ENTRIES = int(os.getenv("ANN_MIN_ENTRIES", "50000"))
+    ANN_NPROBE = int(os.getenv("ANN_NPROBE", "32"))
+
+    # 实体别名库：smart_merge 确认过的映射按租户命名空间持久化，匹配前先查表 (学习的方法：fuzz / llm)
+    ALIAS_STORE_ENABLED = os.getenv("ALIAS_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+    ALIAS_STORE_DIR = os.getenv("ALIAS_STORE_DIR", ".cache/aliases")
+    ALIAS_DEFAULT_NAMESPACE = os.getenv("ALIAS_DEFAULT_NAMESPACE", "default")
+    ALIAS_LEARN_METHODS = [m.strip() for m in os.getenv("ALIAS_LEARN_METHODS", "fuzz,llm").split(",") if m.strip()]
+
+    # 代码执行输出捕获上限：保留开头 / 结尾各若干字符，中间截断 (避免超长打印撑爆内存和下一轮 Prompt)
+    EXEC_OUTPUT_HEAD_CHARS = int(os.getenv("EXEC_OUTPUT_HEAD_CHARS", "4000"))
+    EXEC_OUTPUT_TAIL_CHARS = int(os.getenv("EXEC_OUTPUT_TAIL_CHARS", "4000"))
+
+    # 代码执行后端：inprocess (服务进程内 exec) | sandbox (预热的独立进程，数据表经共享内存 Arrow IPC 传递)
+    EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "inprocess")
+    SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+    SANDBOX_TIMEOUT_SECONDS = float(os.getenv("SANDBOX_TIMEOUT_SECONDS", "120"))  # 墙钟超时，超出终止进程
+    SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "60"))  # 单次执行 CPU 时间 (0 表示不限)
+    SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))  # worker 常驻内存上限 (0 表示不限)
+    SANDBOX_SHM_MB = int(os.getenv("SANDBOX_SHM_MB", "1024"))  # 共享内存中保留的数据表总大小
+
+    # 代码生成 Prompt 中表结构画像的 Token 预算 (所有表合计，按表平分)
+    SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", "3000"))
+
+    # 临时目录清理：报表/上传文件的保留时长与磁盘配额 (0 表示不限)、清理周期
+    OUTPUT_RETENTION_SECONDS = int(os.getenv("OUTPUT_RETENTION_SECONDS", "86400"))
+    OUTPUT_DISK_QUOTA_MB = int(os.getenv("OUTPUT_DISK_QUOTA_MB", "2048"))
+    UPLOAD_RETENTION_SECONDS = int(os.getenv("UPLOAD_RETENTION_SECONDS", "86400"))
+    UPLOAD_DISK_QUOTA_MB = int(os.getenv("UPLOAD_DISK_QUOTA_MB", "2048"))
+    STORAGE_SWEEP_INTERVAL = int(os.getenv("STORAGE_SWEEP_INTERVAL", "300"))
+
 settings = Settings()
\ No newline at end of file
@@ -1,21 +1,38 @@
 import sys
 import os
-import uuid
-import shutil
+import asyncio
+import multiprocessing
 import pandas as pd
 import uvicorn
 import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterator
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.services.ingestion import load_file
-from app.services.workflow import create_workflow
-from app.utils.tools import AuditLogger
+from app.services.ingestion import load_file_with_config
+from app.services.workflow import clean_code_string
+from app.services.session_store import SessionManager, SessionData
+from app.services.task_runner import SessionTaskRunner, QueueFullError
+from app.services.report_export import ReportExporter, EXPORT_FORMATS
+from app.services.retention import enforce_retention
+from app.services.intent_router import router_stats
+from app.services.speculation import speculation_stats, shutdown_speculation
+from app.services.llm_cache import get_llm_cache
+from app.services.recipe_store import get_recipe_store
+from app.services.code_validator import validator_stats
+from app.services.sandbox import get_sandbox_pool, shutdown_sandbox_pool
+from app.services.embedding_store import get_embedding_store
+from app.services.alias_store import get_alias_store, check_namespace
+from app.utils.tools import VECTOR_MODEL_NAME
+from app.core.config import settings
 
 app = FastAPI(title="Agentic Data Analyst API")
 
@@ -26,16 +43,37 @@ UPLOAD_DIR = "temp_uploads"
 OUTPUT_DIR = "temp_outputs"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 # ==========================================
-# 🧠 Session 管理
+# ⚙️ 摄取进程池 (解析 + 识别在独立进程中并发执行，不阻塞事件循环)
 # ==========================================
-class SessionData:
-    def __init__(self):
-        self.dfs_context = {}  # 存放 DataFrames
-        self.workflow_app = None # 编译好的 Graph
+_ingest_pool: Optional[ProcessPoolExecutor] = None
+
+def get_ingest_pool() -> ProcessPoolExecutor:
+    global _ingest_pool
+    if _ingest_pool is None:
+        # spawn 避免在多线程的服务进程中 fork
+        _ingest_pool = ProcessPoolExecutor(
+            max_workers=settings.INGEST_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _ingest_pool
 
-sessions: dict[str, SessionData] = {}
+def reset_ingest_pool():
+    global _ingest_pool
+    if _ingest_pool is not None:
+        _ingest_pool.shutdown(wait=False, cancel_futures=True)
+    _ingest_pool = None
+
+# ==========================================
+# 🧠 Session 管理 (TTL + 内存预算 + LRU 换出)
+# ==========================================
+session_manager = SessionManager()
+# 阻塞任务线程池：同一 Session 串行，不同 Session 并行
+chat_runner = SessionTaskRunner()
+# 报表后台导出 (数据未变化时复用上一次的报表)
+report_exporter = ReportExporter(OUTPUT_DIR)
 
 # ==========================================
 # 📦 数据模型
@@ -43,107 +81,199 @@ sessions: dict[str, SessionData] = {}
 class ChatRequest(BaseModel):
     session_id: str
     message: str
+    export_format: str = settings.EXPORT_DEFAULT_FORMAT  # xlsx | parquet | csv
+    alias_namespace: Optional[str] = None  # 实体别名库的租户命名空间，设置后对该 Session 后续对话持续生效
 
 class ChatResponse(BaseModel):
     response_text: str
     chart_jsons: List[str] = []
     download_url: Optional[str] = None
     audit_summary: Optional[str] = None
+    job_id: Optional[str] = None  # 报表导出任务，进度见 /jobs/{job_id}
 
 # ==========================================
 # 🛠️ 核心工具：纯净版导出 (User Request Fix)
 # ==========================================
-def save_full_context_excel(result_df: Optional[pd.DataFrame], 
-                          dfs_context: Dict[str, pd.DataFrame], 
-                          audit: AuditLogger, 
-                          output_path: str):
-    """
-    将 【所有当前数据表】 + 【审计日志】 保存到一个 Excel。
-    修改点：不再强制生成“分析结果”Sheet，而是直接保存 dfs_context 中的文件，
-    确保文件名和 Sheet 名一一对应，且内容为清洗后的版本。
-    """
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        saved_sheets = set()
-
-        # 1. 优先写入上下文中的所有数据表 (Cleaned Files)
-        # 因为 Worker 已经执行了 dfs[name] = df，所以这里就是清洗后的数据
-        if dfs_context:
-            for name, df in dfs_context.items():
-                if name.startswith("__"): continue # 跳过系统变量
-                
-                # Sheet 名处理 (Excel 限制 31 字符)
-                # 去掉 .xlsx 后缀，直接用文件名，简洁明了
-                safe_name = os.path.splitext(name)[0][:30]
-                
-                # 避免重名
-                counter = 1
-                original_name = safe_name
-                while safe_name in saved_sheets:
-                    safe_name = f"{original_name}_{counter}"
-                    counter += 1
-                
-                df.to_excel(writer, sheet_name=safe_name, index=False)
-                saved_sheets.add(safe_name)
-        
-        # 2. (可选) 只有当 result_df 是全新的聚合结果(不在dfs_context里)时，才保存
-        # 但为了满足“不需要分析结果Sheet”的要求，这里直接注释掉，除非你做聚合分析
-        # if result_df is not None: ...
-        
-        # 3. 写入审计日志 (Audit)
-        if audit:
-            log_df = audit.get_log_df()
-            if not log_df.empty:
-                log_df.to_excel(writer, sheet_name='处理日志(Audit)', index=False)
-            
-            # 4. 写入被剔除的数据 (Exclusions)
-            for name, ex_df in audit.excluded_data.items():
-                # 简化的 Sheet 名
-                clean_name = os.path.splitext(name)[0][:10]
-                sheet_name = f"剔除_{clean_name}"[:30]
-                ex_df.to_excel(writer, sheet_name=sheet_name, index=False)
-                
 # ==========================================
 # 🚀 API 接口
 # ==========================================
 
-@app.post("/upload")
-async def upload_files(session_id: str = Form(...), files: List[UploadFile] = File(...)):
-    if session_id not in sessions:
-        sessions[session_id] = SessionData()
-    
-    session = sessions[session_id]
+async def save_upload(file: UploadFile, file_path: str):
+    """分块流式写盘，避免整个文件读入内存；磁盘写入放到线程池执行"""
+    with open(file_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await run_in_threadpool(buffer.write, chunk)
+
+def commit_uploads(session_id: str, saved: list, results: list):
+    """逐文件汇总摄取结果并写入 Session：单个文件失败不影响整批"""
     loaded_info = []
+    errors = []
+    file_results = []
+    cache_stats = {"hits": 0, "misses": 0}
+
+    with session_manager.use(session_id, create=True) as session:
+        for (filename, _), result in zip(saved, results):
+            if isinstance(result, BaseException):
+                errors.append(f"Failed to load {filename}: {str(result)}")
+                file_results.append({"filename": filename, "status": "error", "error": str(result)})
+                continue
+
+            df, config = result
+            cache_stats["hits" if config.from_cache else "misses"] += 1
+            session.dfs_context[filename] = df
+            # ✅ 原始数据写入磁盘快照 (供 reload_data 还原)，不在内存中保留副本
+            session.snapshots.save(filename, df, "original")
+            loaded_info.append(f"{filename} (Rows: {len(df)})")
+            file_results.append({
+                "filename": filename, "status": "ok", "rows": len(df),
+                "sheet_name": config.sheet_name, "header_row": config.header_row,
+                "from_cache": config.from_cache
+            })
 
+        session.rebuild_workflow()
+    return loaded_info, errors, file_results, cache_stats
+
+@app.post("/upload")
+async def upload_files(session_id: str = Form(...), files: List[UploadFile] = File(...)):
+    # 1. 流式落盘
+    saved = []
     for file in files:
-        file_path = os.path.join(UPLOAD_DIR, f"{session_id}_{file.filename}")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        try:
-            df = load_file(file_path)
-            session.dfs_context[file.filename] = df
-            # ✅ 新增：创建隐形备份 (Deep Copy)
-            session.dfs_context[f"__backup_{file.filename}"] = df.copy(deep=True)
-            loaded_info.append(f"{file.filename} (Rows: {len(df)})")
-        except Exception as e:
-            return {"error": f"Failed to load {file.filename}: {str(e)}"}
+        filename = os.path.basename(file.filename)
+        file_path = os.path.join(UPLOAD_DIR, f"{session_id}_{filename}")
+        await save_upload(file, file_path)
+        saved.append((filename, file_path))
 
-    session.workflow_app = create_workflow(session.dfs_context)
-    return {"message": "Upload success", "details": loaded_info}
+    # 2. 进程池并发摄取 (并发度受 INGEST_MAX_WORKERS 限制)
+    loop = asyncio.get_running_loop()
+    pool = get_ingest_pool()
+    results = await asyncio.gather(
+        *[loop.run_in_executor(pool, load_file_with_config, path) for _, path in saved],
+        return_exceptions=True
+    )
+    if any(isinstance(r, BrokenProcessPool) for r in results):
+        reset_ingest_pool()
+
+    # 3. 写入 Session (与该 Session 的对话请求串行，避免并发修改 dfs_context)
+    try:
+        loaded_info, errors, file_results, cache_stats = await chat_runner.run(
+            session_id, commit_uploads, session_id, saved, results
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    message = "Upload success" if not errors else ("Partial success" if loaded_info else "Upload failed")
+    return {
+        "message": message,
+        "details": loaded_info,
+        "errors": errors,
+        "files": file_results,
+        "cache": cache_stats
+    }
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
-    session_id = request.session_id
-    if session_id not in sessions:
-        raise HTTPException(status_code=404, detail="Session expired")
-    
-    session = sessions[session_id]
+    check_export_format(request.export_format)
+    check_alias_namespace(request.alias_namespace)
+    # 工作流包含 LLM 调用和 exec，全部放到线程池中执行；同一 Session 的请求串行
+    try:
+        return await chat_runner.run(request.session_id, run_chat, request.session_id, request.message,
+                                     request.export_format, request.alias_namespace)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    /chat 的流式版本 (Server-Sent Events)：工作流每产生一个事件就立即推送。
+    事件类型: status / plan / code / log / retry / chart / answer / report / done / error
+    """
+    check_export_format(request.export_format)
+    check_alias_namespace(request.alias_namespace)
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: dict):
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def produce():
+        with session_manager.use(request.session_id) as session:
+            if session is None:
+                emit({"event": "error", "data": {"message": "Session expired"}})
+                return
+            transcript = ChatTranscript()
+            for event in iter_chat_events(session, request.message, request.export_format, request.alias_namespace):
+                transcript.add(event)
+                emit(event)
+            emit({"event": "done", "data": transcript.to_response().model_dump()})
+
+    emit({"event": "status", "data": {"message": "🤖 已接收指令，正在排队执行..."}})
+    task = asyncio.create_task(chat_runner.run(request.session_id, produce))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+
+    async def event_source():
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield format_sse(event)
+        if not task.cancelled() and task.exception() is not None:
+            yield format_sse({"event": "error", "data": {"message": str(task.exception())}})
+
+    return StreamingResponse(event_source(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def check_export_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {fmt}, choose from {list(EXPORT_FORMATS)}")
+
+def format_sse(event: dict) -> str:
+    payload = json.dumps(event["data"], ensure_ascii=False)
+    return f"event: {event['event']}\ndata: {payload}\n\n"
+
+def check_alias_namespace(namespace: Optional[str]):
+    if namespace is None:
+        return
+    try:
+        check_namespace(namespace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def run_chat(session_id: str, message: str, export_format: str = "xlsx",
+             alias_namespace: Optional[str] = None) -> ChatResponse:
+    """同步执行一轮对话 (在工作线程中运行)"""
+    with session_manager.use(session_id) as session:
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session expired")
+        transcript = ChatTranscript()
+        for event in iter_chat_events(session, message, export_format, alias_namespace):
+            transcript.add(event)
+        return transcript.to_response()
+
+def extract_plan(text: str) -> Optional[str]:
+    """从代码或日志中提取 # PLAN 段落"""
+    if "# PLAN:" not in text:
+        return None
+    try:
+        plan_part = text.split("# PLAN:")[1].split("# CODE")[0].strip()
+        # 移除 # 号，防止字体过大
+        return "\n".join([line.strip("# ").strip() for line in plan_part.splitlines()])
+    except Exception:
+        return None
+
+def iter_chat_events(session: SessionData, message: str, export_format: str = "xlsx",
+                     alias_namespace: Optional[str] = None) -> Iterator[dict]:
+    """
+    执行一轮工作流，并把 LangGraph 的每个节点输出转换为前端可消费的事件。
+    /chat 聚合这些事件后一次性返回，/chat/stream 逐条推送。
+    """
     if not session.workflow_app:
-        session.workflow_app = create_workflow({})
+        session.rebuild_workflow()
+    # 上一轮的报表可能仍在后台导出，等它写完再修改数据表
+    report_exporter.wait(session)
 
     state = {
         "messages": [], 
-        "user_instruction": request.message,
+        "user_instruction": message,
         "error_count": 0,
         "chart_jsons": [],
         "reply": ""
@@ -152,50 +282,57 @@ async def chat(request: ChatRequest):
     # 清理旧状态 (保留 context 中的数据表，清除上一次的临时结果)
     if '__last_result_df__' in session.dfs_context: del session.dfs_context['__last_result_df__']
     if '__last_audit__' in session.dfs_context: del session.dfs_context['__last_audit__']
-
-    # 初始化返回变量
-    chart_jsons = []
-    download_link = None
-    audit_summary = None
-    steps_log = []
-    final_answer = ""
-    error_msg = None
+    if alias_namespace:
+        session.set_alias_namespace(alias_namespace)
 
     try:
         # 运行 Workflow
         for event in session.workflow_app.stream(state, config={"recursion_limit": 30}):
             for key, val in event.items():
-                if key == "executor":
+                if key == "supervisor":
+                    decision = (val or {}).get("router_decision")
+                    if decision and decision != "end":
+                        yield {"event": "status", "data": {"message": f"🧭 路由决策: {decision}"}}
+
+                elif key in ("python_worker", "auto_eda"):
+                    if val and "messages" in val:
+                        code = clean_code_string(val["messages"][-1].content)
+                        plan = extract_plan(code)
+                        if plan:
+                            yield {"event": "plan", "data": {"text": plan}}
+                        yield {"event": "code", "data": {"code": code}}
+
+                elif key == "validator":
+                    if val and "messages" in val:
+                        yield {"event": "log", "data": {"text": val["messages"][-1].content}}
+                        yield {"event": "retry", "data": {"message": "静态检查发现问题，正在自动修正..."}}
+
+                elif key == "executor":
                     if "messages" in val:
                         raw_msg = val["messages"][-1].content
-                        
-                        # 1. 提取 PLAN (思考过程)
-                        if "# PLAN:" in raw_msg:
-                            try:
-                                plan_part = raw_msg.split("# PLAN:")[1].split("# CODE")[0].strip()
-                                # 移除 # 号，防止字体过大
-                                plan_clean = "\n".join([line.strip("# ").strip() for line in plan_part.splitlines()])
-                                steps_log.append(f"🧠 **思考**: {plan_clean}")
-                            except:
-                                pass
+                        yield {"event": "log", "data": {"text": raw_msg}}
+
+                        # 1. 提取 PLAN (思考过程；代码打印出的计划同样展示)
+                        plan = extract_plan(raw_msg)
+                        if plan:
+                            yield {"event": "plan", "data": {"text": plan}}
                         
                         # 2. 提取 Insights (分析结论)
                         # 识别包含结论的文本，并清洗
                         if "📊 分析结论" in raw_msg or "✅" in raw_msg or "清洗完成" in raw_msg:
                             clean = raw_msg.replace("(Signal: WORKER_DONE)", "").strip()
-                            if clean not in final_answer:
-                                final_answer += clean + "\n\n"
+                            yield {"event": "answer", "data": {"text": clean}}
 
                         # 3. 拦截报错
                         if "❌ Runtime Error" in raw_msg:
-                            steps_log.append("🔧 **自愈**: 检测到代码错误，正在自动修正...")
+                            yield {"event": "retry", "data": {"message": "检测到代码错误，正在自动修正..."}}
 
-                    if "chart_jsons" in val:
-                        chart_jsons.extend(val["chart_jsons"])
+                    for chart_json in val.get("chart_jsons", []):
+                        yield {"event": "chart", "data": {"chart_json": chart_json}}
                 
                 elif key == "general_chat":
                     if "messages" in val:
-                        final_answer += val["messages"][0].content
+                        yield {"event": "answer", "data": {"text": val["messages"][0].content}}
 
         # ==========================================
         # 💾 文件导出逻辑 (核心修改)
@@ -206,64 +343,286 @@ async def chat(request: ChatRequest):
         result_df = session.dfs_context.pop('__last_result_df__', None)
         audit_logger = session.dfs_context.pop('__last_audit__', None)
         
-        # 只要有数据或者有结果，就生成 Excel
+        # 只要有数据或者有结果，就生成报表 (后台导出任务；数据未变化时复用上一次的报表)
         if result_df is not None or len(session.dfs_context) > 0:
-            filename = f"Analysis_Report_{uuid.uuid4().hex[:6]}.xlsx"
-            file_path = os.path.join(OUTPUT_DIR, filename)
-            
-            # ✅ 调用新的全量保存函数
-            # 传入 session.dfs_context 以保存所有被清洗过的表
-            save_full_context_excel(result_df, session.dfs_context, audit_logger, file_path)
-            
-            download_link = f"/download/{filename}"
+            # 传入 session 以保存 dfs_context 中所有被清洗过的表
+            job = report_exporter.submit(session, result_df, audit_logger, export_format)
             
+            audit_summary = None
             if audit_logger:
                 op_count = len([l for l in audit_logger.logs if l['Type']=='Operation'])
                 ex_count = len([l for l in audit_logger.logs if l['Type']=='Exclusion'])
                 audit_summary = f"🛡️ 审计追踪: 执行 {op_count} 步操作, 剔除 {ex_count} 次异常数据。"
 
+            yield {"event": "report", "data": {"job_id": job.job_id, "download_url": f"/download/{job.filename}",
+                                               "audit_summary": audit_summary}}
+
     except Exception as e:
-        error_msg = f"系统异常: {str(e)}"
         print(f"Server Error: {str(e)}")
+        yield {"event": "error", "data": {"message": f"系统异常: {str(e)}"}}
 
-    # ==========================================
-    # 🎨 响应文本格式化 (解决字体过大问题)
-    # ==========================================
-    formatted_response = ""
-    
-    if steps_log:
-        formatted_response += "### 🧩 执行过程\n\n"
-        for step in steps_log:
-            # 再次确保清洗掉 Markdown 标题符
-            clean_step = step.replace("#", "").strip()
-            formatted_response += f"- {clean_step}\n\n"
-        formatted_response += "---\n\n"
-
-    if final_answer:
-        formatted_response += "### 💡 分析结论\n\n"
-        # 降级标题，防止字体爆炸
-        lines = final_answer.split('\n')
-        clean_lines = []
-        for line in lines:
-            if line.strip().startswith("#"):
-                clean_lines.append(f"**{line.strip('# ')}**")
-            else:
-                clean_lines.append(line)
-        formatted_response += "\n\n".join(clean_lines)
-    
-    if error_msg:
-        formatted_response += f"\n\n🚨 **错误提示**: {error_msg}"
-        if not final_answer: formatted_response = error_msg
-
-    return ChatResponse(
-        response_text=formatted_response,
-        chart_jsons=chart_jsons,
-        download_url=download_link,
-        audit_summary=audit_summary
-    )
+class ChatTranscript:
+    """把事件流聚合成 ChatResponse (与流式接口共用一套事件)"""
+    def __init__(self):
+        self.chart_jsons = []
+        self.download_link = None
+        self.audit_summary = None
+        self.job_id = None
+        self.steps_log = []
+        self.final_answer = ""
+        self.error_msg = None
+
+    def add(self, event: dict):
+        kind, data = event["event"], event["data"]
+        if kind == "plan":
+            step = f"🧠 **思考**: {data['text']}"
+            if step not in self.steps_log:
+                self.steps_log.append(step)
+        elif kind == "retry":
+            self.steps_log.append("🔧 **自愈**: 检测到代码错误，正在自动修正...")
+        elif kind == "answer":
+            if data["text"] not in self.final_answer:
+                self.final_answer += data["text"] + "\n\n"
+        elif kind == "chart":
+            self.chart_jsons.append(data["chart_json"])
+        elif kind == "report":
+            self.download_link = data["download_url"]
+            self.audit_summary = data["audit_summary"]
+            self.job_id = data["job_id"]
+        elif kind == "error":
+            self.error_msg = data["message"]
+
+    def to_response(self) -> ChatResponse:
+        # ==========================================
+        # 🎨 响应文本格式化 (解决字体过大问题)
+        # ==========================================
+        formatted_response = ""
+        
+        if self.steps_log:
+            formatted_response += "### 🧩 执行过程\n\n"
+            for step in self.steps_log:
+                # 再次确保清洗掉 Markdown 标题符
+                clean_step = step.replace("#", "").strip()
+                formatted_response += f"- {clean_step}\n\n"
+            formatted_response += "---\n\n"
+
+        if self.final_answer:
+            formatted_response += "### 💡 分析结论\n\n"
+            # 降级标题，防止字体爆炸
+            lines = self.final_answer.split('\n')
+            clean_lines = []
+            for line in lines:
+                if line.strip().startswith("#"):
+                    clean_lines.append(f"**{line.strip('# ')}**")
+                else:
+                    clean_lines.append(line)
+            formatted_response += "\n\n".join(clean_lines)
+        
+        if self.error_msg:
+            formatted_response += f"\n\n🚨 **错误提示**: {self.error_msg}"
+            if not self.final_answer: formatted_response = self.error_msg
+
+        return ChatResponse(
+            response_text=formatted_response,
+            chart_jsons=self.chart_jsons,
+            download_url=self.download_link,
+            audit_summary=self.audit_summary,
+            job_id=self.job_id
+        )
+
+@app.get("/stats/sessions")
+def session_stats():
+    # 普通 def：FastAPI 放到线程池执行，等待 Session 锁时不阻塞事件循环
+    return session_manager.stats()
+
+@app.get("/stats/chat")
+async def chat_stats():
+    return chat_runner.stats()
+
+@app.get("/stats/exports")
+async def export_stats():
+    return report_exporter.stats()
+
+@app.get("/stats/router")
+async def router_stats_view():
+    return router_stats.snapshot()
+
+@app.get("/stats/speculation")
+async def speculation_stats_view():
+    return speculation_stats.snapshot()
+
+@app.get("/stats/llm_cache")
+async def llm_cache_stats():
+    return get_llm_cache().stats()
+
+@app.get("/stats/validator")
+async def validator_stats_view():
+    return validator_stats.snapshot()
+
+@app.get("/stats/embeddings")
+async def embedding_stats():
+    if not settings.EMBEDDING_STORE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_embedding_store(VECTOR_MODEL_NAME).stats()}
+
+@app.get("/stats/aliases")
+async def alias_stats():
+    if not settings.ALIAS_STORE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_alias_store().stats()}
+
+@app.get("/stats/sandbox")
+async def sandbox_stats():
+    if settings.EXECUTION_BACKEND != "sandbox":
+        return {"backend": settings.EXECUTION_BACKEND}
+    return {"backend": "sandbox", **get_sandbox_pool().stats()}
+
+@app.get("/recipes")
+async def list_recipes():
+    store = get_recipe_store()
+    return {"stats": store.stats(), "recipes": store.list()}
+
+@app.get("/recipes/{recipe_id}")
+async def get_recipe(recipe_id: str):
+    recipe = get_recipe_store().get(recipe_id)
+    if recipe is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return recipe
+
+@app.post("/recipes/{recipe_id}/pin")
+async def pin_recipe(recipe_id: str, pinned: bool = True):
+    recipe = get_recipe_store().pin(recipe_id, pinned)
+    if recipe is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return {"id": recipe["id"], "pinned": recipe["pinned"], "stale": recipe["stale"]}
+
+@app.delete("/recipes/{recipe_id}")
+async def delete_recipe(recipe_id: str):
+    if not get_recipe_store().delete(recipe_id):
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return {"id": recipe_id, "deleted": True}
+
+class AliasEntry(BaseModel):
+    source: str
+    target: str
+    method: Optional[str] = None
+    score: Optional[float] = None
+
+class AliasImport(BaseModel):
+    entries: List[AliasEntry]
+    replace: bool = False  # True 时先清空该命名空间
+
+def alias_namespace_or_400(namespace: str) -> str:
+    try:
+        return check_namespace(namespace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/aliases/{namespace}")
+async def export_aliases(namespace: str, format: str = "json"):
+    """导出别名库：format=json 返回条目列表，format=csv 返回可直接编辑后再导入的 CSV 文件"""
+    namespace = alias_namespace_or_400(namespace)
+    rows = await run_in_threadpool(get_alias_store().export, namespace)
+    if format == "json":
+        return {"namespace": namespace, "count": len(rows), "entries": rows}
+    if format != "csv":
+        raise HTTPException(status_code=400, detail="Unsupported format, choose from ['json', 'csv']")
+    buffer = io.StringIO()
+    pd.DataFrame(rows, columns=["source", "target", "method", "score", "hits", "created", "last_used"]).to_csv(buffer, index=False)
+    return StreamingResponse(iter([buffer.getvalue()]), media_type="text/csv",
+                             headers={"Content-Disposition": f"attachment; filename=aliases_{namespace}.csv"})
+
+@app.post("/aliases/{namespace}")
+async def import_aliases(namespace: str, payload: AliasImport):
+    namespace = alias_namespace_or_400(namespace)
+    rows = [entry.model_dump() for entry in payload.entries]
+    written = await run_in_threadpool(get_alias_store().import_entries, namespace, rows, payload.replace)
+    return {"namespace": namespace, "imported": written}
+
+@app.post("/aliases/{namespace}/upload")
+async def upload_aliases(namespace: str, file: UploadFile = File(...), replace: bool = Form(False)):
+    """批量导入 CSV / Excel 别名表 (必需列 source、target，可选列 method、score)"""
+    namespace = alias_namespace_or_400(namespace)
+    content = await file.read()
+    try:
+        if (file.filename or "").lower().endswith((".xlsx", ".xls")):
+            df = pd.read_excel(io.BytesIO(content), dtype=str)
+        else:
+            df = pd.read_csv(io.BytesIO(content), dtype=str)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"无法解析别名文件: {e}")
+    missing = {"source", "target"} - set(df.columns)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"别名文件缺少列: {sorted(missing)}")
+    columns = [c for c in ("source", "target", "method", "score") if c in df.columns]
+    rows = df[columns].astype(object).where(df[columns].notna(), None).to_dict("records")
+    written = await run_in_threadpool(get_alias_store().import_entries, namespace, rows, replace)
+    return {"namespace": namespace, "imported": written}
+
+@app.delete("/aliases/{namespace}")
+async def delete_aliases(namespace: str, source: Optional[str] = None):
+    """删除一个源名称的别名；不指定 source 时清空整个命名空间"""
+    namespace = alias_namespace_or_400(namespace)
+    removed = await run_in_threadpool(get_alias_store().delete, namespace, source)
+    return {"namespace": namespace, "source": source, "deleted": removed}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = report_exporter.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+async def session_janitor():
+    """后台定期清理过期 Session，避免无请求时内存得不到回收"""
+    while True:
+        await asyncio.sleep(settings.SESSION_SWEEP_INTERVAL)
+        await run_in_threadpool(session_manager.sweep)
+
+def sweep_storage() -> dict:
+    """按保留时长和磁盘配额清理报表与上传文件；正在导出的报表不删除"""
+    outputs = enforce_retention(OUTPUT_DIR, settings.OUTPUT_RETENTION_SECONDS,
+                                settings.OUTPUT_DISK_QUOTA_MB * 1024 * 1024,
+                                protect=report_exporter.pending_files())
+    uploads = enforce_retention(UPLOAD_DIR, settings.UPLOAD_RETENTION_SECONDS,
+                                settings.UPLOAD_DISK_QUOTA_MB * 1024 * 1024)
+    report_exporter.prune_jobs(settings.OUTPUT_RETENTION_SECONDS)
+    for name, stats in (("outputs", outputs), ("uploads", uploads)):
+        deleted = stats["deleted_age"] + stats["deleted_quota"]
+        if deleted:
+            print(f"🧹 [Storage] {name}: 删除 {deleted} 个文件，释放 {stats['freed_bytes'] / 1024 / 1024:.1f} MB")
+    return {"outputs": outputs, "uploads": uploads}
+
+async def storage_janitor():
+    """后台定期清理临时目录，避免报表和上传文件无限堆积"""
+    while True:
+        await run_in_threadpool(sweep_storage)
+        await asyncio.sleep(settings.STORAGE_SWEEP_INTERVAL)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    asyncio.create_task(session_janitor())
+    asyncio.create_task(storage_janitor())
+    if settings.EXECUTION_BACKEND == "sandbox":
+        await run_in_threadpool(get_sandbox_pool)  # 启动时预热执行进程
+
+@app.on_event("shutdown")
+def shutdown_pools():
+    reset_ingest_pool()
+    chat_runner.shutdown()
+    report_exporter.shutdown()
+    shutdown_speculation()
+    shutdown_sandbox_pool()
 
 @app.get("/download/{filename}")
 async def download_file(filename: str):
+    # 报表仍在后台导出时，等待写完再返回
+    pending = report_exporter.pending(filename)
+    if pending is not None:
+        try:
+            await asyncio.wrap_future(pending)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Export failed: {e}")
     file_path = os.path.join(OUTPUT_DIR, filename)
     if os.path.exists(file_path):
         return FileResponse(file_path, filename=filename)
@@ -0,0 +1,288 @@
+# 实体别名库：smart_merge 已确认的映射 (源名称 → 标准名称) 按租户命名空间持久化，下次匹配前先查表，命中的 key 不再打分、不再调用 LLM
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.embedding_store import normalize_text
+from app.utils.file_lock import file_lock
+
+_NAMESPACE = re.compile(r"^[0-9A-Za-z._-]{1,64}$")
+
+# 导入/导出的列；method 为 import / manual 的条目视为人工确认，优先于自动学习的条目
+FIELDS = ["source", "target", "method", "score"]
+MANUAL_METHODS = ("import", "manual")
+# 会话数据字典中保存当前租户命名空间的键 (以 __ 开头，不会被当作数据表)
+NAMESPACE_KEY = "__alias_namespace__"
+
+
+def check_namespace(namespace: Optional[str]) -> str:
+    namespace = namespace or settings.ALIAS_DEFAULT_NAMESPACE
+    if not _NAMESPACE.match(namespace) or namespace.startswith("."):
+        raise ValueError(f"非法的别名库命名空间: {namespace!r} (仅允许字母、数字、. _ -，最长 64)")
+    return namespace
+
+
+def master_fingerprint(normalized_keys: Iterable[str]) -> str:
+    """主数据指纹：与顺序无关，主数据增删任意一个名称后指纹即变化"""
+    digest = hashlib.sha1()
+    for key in sorted(normalized_keys):
+        digest.update(key.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class AliasStore:
+    """
+    - 每个命名空间 (租户) 一个 <namespace>.json，写入采用 tmp + os.replace；命名空间之间互不可见。
+    - 条目按规范化后的源名称 (normalize_text) 存放；同一源名称可对应多个目标 (不同主数据表)，
+      查找时只采用出现在当前主数据中的目标，人工导入的条目优先，其次是最近使用的条目。
+    - "无匹配" 结论 (target 为 None) 同样记录，但绑定主数据指纹：主数据不变时不再重复询问 LLM，主数据变化后自动失效。
+    - 自动学习的条目让位于精确匹配：源名称本身已出现在主数据中时，只有人工条目生效。
+    - 多进程共用 (服务进程 + 沙箱 worker)：读取时按文件版本 (inode + mtime) 发现其他进程的写入并重新加载；
+      所有修改都在跨进程文件锁内 "重新读取 → 修改 → 写回"，不会互相覆盖，也不会把已删除的条目写回来。
+      查找产生的使用次数先记在内存，下次写入时合并。
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.ALIAS_STORE_DIR
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._namespaces: Dict[str, Dict[str, List[dict]]] = {}
+        self._versions: Dict[str, Optional[Tuple[int, int, int]]] = {}  # 已加载文件的 (inode, mtime_ns, size)
+        self._usage: Dict[str, Dict[Tuple[str, Optional[str]], list]] = {}  # 待写回的 [命中次数, 最近使用时间]
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+
+    # ---------- 查找 ----------
+    def lookup(self, namespace: Optional[str], sources: Iterable[str], right_keys: Iterable[str]) -> Dict[str, dict]:
+        """
+        返回 {源名称: 条目}；条目的 target 已换成当前主数据中的原始写法，target 为 None 表示已确认无匹配。
+        未命中的源名称不出现在结果中。
+        """
+        namespace = check_namespace(namespace)
+        sources = list(sources)
+        with self._lock:
+            aliases = self._load(namespace)
+            if not aliases:
+                self.misses += len(sources)
+                return {}
+            masters = {}
+            for key in right_keys:
+                masters.setdefault(normalize_text(key), key)
+            fingerprint = master_fingerprint(masters)
+
+            found, now = {}, time.time()
+            usage = self._usage.setdefault(namespace, {})
+            for source in sources:
+                key = normalize_text(source)
+                entry = self._resolve(aliases.get(key), masters, fingerprint, exact=key in masters)
+                if entry is None:
+                    continue
+                target = masters[normalize_text(entry["target"])] if entry["target"] is not None else None
+                pending = usage.setdefault((key, normalize_text(target) if target is not None else None), [0, now])
+                pending[0] += 1
+                pending[1] = now
+                found[source] = {**entry, "target": target}
+            self.hits += len(found)
+            self.misses += len(sources) - len(found)
+            return found
+
+    @staticmethod
+    def _resolve(entries: Optional[List[dict]], masters: Dict[str, str], fingerprint: str,
+                 exact: bool = False) -> Optional[dict]:
+        if not entries:
+            return None
+        if exact:
+            # 源名称本身就在主数据中：自动学习的条目让位于精确匹配 (交给 Fuzz)，只有人工条目仍然生效
+            entries = [e for e in entries if e["method"] in MANUAL_METHODS]
+        usable = [e for e in entries
+                  if (e["target"] is None and e.get("master") == fingerprint)
+                  or (e["target"] is not None and normalize_text(e["target"]) in masters)]
+        if not usable:
+            return None
+        return max(usable, key=lambda e: (e["method"] in MANUAL_METHODS, e["target"] is not None, e.get("last_used", 0)))
+
+    # ---------- 写入 ----------
+    def record(self, namespace: Optional[str], entries: Iterable[dict], right_keys: Optional[Iterable[str]] = None) -> int:
+        """
+        写入已确认的映射 [{source, target, method, score}]。target 为 None 的 "无匹配" 条目必须提供 right_keys
+        (用于计算主数据指纹)，否则忽略。人工条目不会被自动学习的条目覆盖。返回实际写入的条数。
+        """
+        namespace = check_namespace(namespace)
+        fingerprint = None
+        if right_keys is not None:
+            fingerprint = master_fingerprint({normalize_text(k) for k in right_keys})
+        now = time.time()
+        written = 0
+        with self._lock, self._locked(namespace) as aliases:
+            for item in entries:
+                entry = self._make_entry(item, now)
+                if entry is None or (entry["target"] is None and fingerprint is None):
+                    continue
+                if entry["target"] is None:
+                    entry["master"] = fingerprint
+                if self._upsert(aliases, entry):
+                    written += 1
+                    self.learned += entry["method"] not in MANUAL_METHODS
+            if written:
+                self._write(namespace)
+        return written
+
+    def import_entries(self, namespace: Optional[str], rows: Iterable[dict], replace: bool = False) -> int:
+        """批量导入 (人工维护的别名表)：缺省 method 为 import、score 为 100；replace=True 时先清空该命名空间"""
+        namespace = check_namespace(namespace)
+        rows = [{**row, "method": row.get("method") or "import",
+                 "score": 100 if row.get("score") in (None, "") else row["score"]}
+                for row in rows if (row.get("target") or "") != ""]
+        if replace:
+            self.delete(namespace)
+        return self.record(namespace, rows)
+
+    def export(self, namespace: Optional[str]) -> List[dict]:
+        namespace = check_namespace(namespace)
+        with self._lock:
+            aliases = self._load(namespace)
+            rows = [e for entries in aliases.values() for e in entries if e["target"] is not None]
+        rows.sort(key=lambda e: (e["source"], e["target"]))
+        return [{k: e.get(k) for k in FIELDS + ["hits", "created", "last_used"]} for e in rows]
+
+    def delete(self, namespace: Optional[str], source: Optional[str] = None) -> int:
+        """删除一个源名称的全部条目；source 为空时清空整个命名空间。返回删除的条数"""
+        namespace = check_namespace(namespace)
+        with self._lock, self._locked(namespace) as aliases:
+            if source is None:
+                removed = sum(len(v) for v in aliases.values())
+                aliases.clear()
+            else:
+                removed = len(aliases.pop(normalize_text(source), []))
+            if removed:
+                self._write(namespace)
+            return removed
+
+    def flush(self, namespace: Optional[str]):
+        """持久化查找时更新的使用次数 / 最近使用时间"""
+        namespace = check_namespace(namespace)
+        with self._lock:
+            if not self._usage.get(namespace):
+                return
+            with self._locked(namespace):
+                self._write(namespace)
+
+    def stats(self) -> dict:
+        with self._lock:
+            names = sorted(f[:-5] for f in os.listdir(self.directory) if f.endswith(".json"))
+            namespaces = {}
+            for name in names:
+                aliases = self._load(name)
+                namespaces[name] = {
+                    "aliases": sum(1 for v in aliases.values() for e in v if e["target"] is not None),
+                    "no_match": sum(1 for v in aliases.values() for e in v if e["target"] is None),
+                }
+            lookups = self.hits + self.misses
+            return {
+                "namespaces": namespaces,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "learned": self.learned,
+            }
+
+    # ---------- 内部 ----------
+    @staticmethod
+    def _make_entry(item: dict, now: float) -> Optional[dict]:
+        source = str(item.get("source") or "").strip()
+        target = item.get("target")
+        target = None if target is None or str(target).strip() == "" else str(target).strip()
+        if not source:
+            return None
+        try:
+            score = float(item.get("score") or 0)
+        except (TypeError, ValueError):
+            score = 0.0
+        return {"source": source, "target": target, "method": str(item.get("method") or "manual"),
+                "score": score, "created": now, "last_used": now, "hits": 0}
+
+    @staticmethod
+    def _upsert(aliases: Dict[str, List[dict]], entry: dict) -> bool:
+        entries = aliases.setdefault(normalize_text(entry["source"]), [])
+        manual = entry["method"] in MANUAL_METHODS
+        target = normalize_text(entry["target"]) if entry["target"] is not None else None
+        for i, old in enumerate(entries):
+            same = (old["target"] is None and target is None) or (
+                old["target"] is not None and target is not None and normalize_text(old["target"]) == target)
+            if not same:
+                continue
+            if old["method"] in MANUAL_METHODS and not manual:
+                return False  # 人工确认的条目不被自动学习覆盖
+            entry["created"], entry["hits"] = old["created"], old.get("hits", 0)
+            entries[i] = entry
+            return True
+        if target is not None:
+            # 源名称已确认有匹配：同一主数据下的 "无匹配" 结论失效
+            entries[:] = [e for e in entries if e["target"] is not None]
+        entries.append(entry)
+        return True
+
+    def _path(self, namespace: str) -> str:
+        return os.path.join(self.directory, f"{namespace}.json")
+
+    def _file_version(self, namespace: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self._path(namespace))
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self, namespace: str) -> Dict[str, List[dict]]:
+        """返回命名空间的条目；文件被其他进程改写 (或删除) 后重新读取"""
+        version = self._file_version(namespace)
+        if namespace not in self._namespaces or self._versions.get(namespace) != version:
+            try:
+                with open(self._path(namespace), "r", encoding="utf-8") as f:
+                    aliases = json.load(f)
+            except (OSError, ValueError):
+                aliases = {}
+            self._namespaces[namespace] = aliases
+            self._versions[namespace] = version
+        return self._namespaces[namespace]
+
+    @contextmanager
+    def _locked(self, namespace: str):
+        """跨进程文件锁内读取最新的条目 (调用方修改后用 _write 写回，写回前锁不会释放)"""
+        with file_lock(os.path.join(self.directory, f"{namespace}.lock")):
+            yield self._load(namespace)
+
+    def _write(self, namespace: str):
+        """调用方持有 _locked：合并内存中的使用次数后整体写回"""
+        aliases = self._namespaces.get(namespace, {})
+        for (key, target), (hits, last_used) in self._usage.pop(namespace, {}).items():
+            for entry in aliases.get(key, []):
+                entry_target = normalize_text(entry["target"]) if entry["target"] is not None else None
+                if entry_target == target:
+                    entry["hits"] = entry.get("hits", 0) + hits
+                    entry["last_used"] = max(entry.get("last_used", 0), last_used)
+        path = self._path(namespace)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(aliases, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._versions[namespace] = self._file_version(namespace)
+
+
+_store: Optional[AliasStore] = None
+_store_lock = threading.Lock()
+
+
+def get_alias_store() -> AliasStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AliasStore()
+        return _store
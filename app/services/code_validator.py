@@ -0,0 +1,383 @@
+# 生成代码静态预检：执行前用 AST 检查表名、列名、禁用调用和未定义变量，问题直接反馈给 worker，省去一次失败的执行
+import ast
+import time
+import difflib
+import builtins
+import threading
+from typing import Dict, List, Optional, Set
+import pandas as pd
+
+STATIC_ERROR_MARK = "❌ Static Check Error"
+
+# execute_code 注入的局部变量 (保持同步)
+INJECTED_NAMES = {
+    "dfs", "pd", "np", "px", "go", "audit", "smart_merge", "smart_reconcile", "auto_clean",
+    "reload_data", "snapshot_data", "df", "warnings",
+}
+BUILTIN_NAMES = set(dir(builtins))
+COMMON_MODULES = {"re", "os", "math", "json", "datetime", "time", "itertools", "collections", "difflib"}
+
+# (调用对象, 方法名) -> 提示；调用对象为 None 表示任意对象
+FORBIDDEN_CALLS = {
+    (None, "to_excel"): "禁止使用 to_excel 保存文件，请把结果赋值给 result_df，系统会自动导出",
+    ("pd", "read_excel"): "禁止使用 pd.read_excel 读取文件，请直接使用 dfs['文件名']",
+    ("pd", "read_csv"): "禁止使用 pd.read_csv 读取文件，请直接使用 dfs['文件名']",
+    ("plt", "show"): "禁止使用 plt.show()，请用 Plotly 绘图并赋值给 fig 变量",
+}
+# 第一个位置参数 / by= 是列名的方法
+COLUMN_METHODS = {"groupby": "by", "sort_values": "by"}
+# 不改变列结构的方法：df = dfs['X'].dropna() 之后仍可按原表检查列名
+COLUMN_PRESERVING = {"copy", "dropna", "drop_duplicates", "fillna", "sort_values", "head", "tail", "query", "sample"}
+_SELF = object()
+MAX_LISTED_COLUMNS = 30
+
+
+class ValidationIssue:
+    def __init__(self, line: int, kind: str, message: str):
+        self.line = line
+        self.kind = kind
+        self.message = message
+
+    def __str__(self):
+        return f"第 {self.line} 行 [{self.kind}] {self.message}"
+
+    def to_dict(self) -> dict:
+        return {"line": self.line, "kind": self.kind, "message": self.message}
+
+
+def _const_str(node) -> Optional[str]:
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+
+def _const_strs(node) -> List[str]:
+    """字符串常量或字符串常量列表/元组；其他表达式返回空列表 (无法静态确定)"""
+    single = _const_str(node)
+    if single is not None:
+        return [single]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [_const_str(e) for e in node.elts]
+        if values and all(v is not None for v in values):
+            return values
+    return []
+
+
+def _dfs_key(node) -> Optional[str]:
+    """dfs['X'] -> 'X'"""
+    if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == "dfs":
+        return _const_str(node.slice)
+    return None
+
+
+def _owner(node) -> Optional[str]:
+    """变量名或 dfs 表名"""
+    return node.id if isinstance(node, ast.Name) else _dfs_key(node)
+
+
+def _table_source(node, var: str):
+    """
+    赋值来源对应的表名：dfs['X']、dfs['X'].copy()、df[mask]、df.loc[mask]、df.dropna() 等不改变列的写法。
+    来源是变量自身 (df = df[mask]) 时返回 _SELF，无法确定时返回 None。
+    """
+    while True:
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr in COLUMN_PRESERVING):
+            node = node.func.value
+        elif isinstance(node, ast.Subscript) and _dfs_key(node) is None and not _const_strs(node.slice):
+            node = node.value.value if isinstance(node.value, ast.Attribute) and node.value.attr == "loc" else node.value
+        else:
+            break
+    if isinstance(node, ast.Name) and node.id == var:
+        return _SELF
+    return _dfs_key(node)
+
+
+def _suggest(name: str, options) -> str:
+    close = difflib.get_close_matches(name, [str(o) for o in options], n=1, cutoff=0.5)
+    return f" (是否应为 '{close[0]}'？)" if close else ""
+
+
+class _Scope(ast.NodeVisitor):
+    """第一遍：收集所有绑定的变量名、变量的赋值来源、被新建/修改的列"""
+
+    def __init__(self):
+        self.bound: Set[str] = set()
+        self.assigned: Dict[str, list] = {}  # 变量 -> 赋值表达式 (非普通赋值记为 None)
+        self.created_columns: Dict[str, Set[str]] = {}  # 变量或 dfs 表名 -> 新建的列
+        self.tainted: Set[str] = set()  # 列结构被原地修改、无法静态推断的变量
+        self.written_tables: Set[str] = set()  # 被 dfs['X'] = ... 重新赋值的表
+        self.dynamic_writes = False  # dfs[name] = ... (表名不是常量)，任何表的列都可能被改写
+
+    def _bind(self, target, value=None):
+        if isinstance(target, ast.Name):
+            self.bound.add(target.id)
+            self.assigned.setdefault(target.id, []).append(value)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for elt in target.elts:
+                self._bind(elt)
+        elif isinstance(target, ast.Starred):
+            self._bind(target.value)
+        elif isinstance(target, ast.Subscript):
+            self._store_subscript(target)
+        elif isinstance(target, ast.Attribute) and _owner(target.value) is not None:
+            if target.attr in ("columns", "loc", "iloc"):
+                self.tainted.add(_owner(target.value))
+
+    def _store_subscript(self, target: ast.Subscript):
+        key = _dfs_key(target)
+        if key is not None:
+            self.written_tables.add(key)
+            return
+        if isinstance(target.value, ast.Name) and target.value.id == "dfs":
+            self.dynamic_writes = True
+            return
+        owner = target.value
+        columns = _const_strs(target.slice)
+        # df.loc[mask, 'col'] = ...
+        if isinstance(owner, ast.Attribute) and owner.attr in ("loc", "at") and isinstance(target.slice, ast.Tuple):
+            columns = _const_strs(target.slice.elts[-1]) if target.slice.elts else []
+            owner = owner.value
+        name = _owner(owner)
+        if name is None:
+            return
+        if columns:
+            self.created_columns.setdefault(name, set()).update(columns)
+        else:
+            self.tainted.add(name)
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            self._bind(target, node.value)
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        self._bind(node.target)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        self._bind(node.target, node.value)
+        self.generic_visit(node)
+
+    def visit_NamedExpr(self, node):
+        self._bind(node.target, node.value)
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        self._bind(node.target)
+        self.generic_visit(node)
+
+    visit_AsyncFor = visit_For
+
+    def visit_comprehension(self, node):
+        self._bind(node.target)
+        self.generic_visit(node)
+
+    def visit_withitem(self, node):
+        if node.optional_vars is not None:
+            self._bind(node.optional_vars)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.bound.add((alias.asname or alias.name).split(".")[0])
+
+    visit_ImportFrom = visit_Import
+
+    def visit_FunctionDef(self, node):
+        self.bound.add(node.name)
+        for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs:
+            self.bound.add(arg.arg)
+        for arg in (node.args.vararg, node.args.kwarg):
+            if arg is not None:
+                self.bound.add(arg.arg)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs:
+            self.bound.add(arg.arg)
+        for arg in (node.args.vararg, node.args.kwarg):
+            if arg is not None:
+                self.bound.add(arg.arg)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.bound.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_Call(self, node):
+        # 原地修改列结构：df.insert(...)、df.rename(..., inplace=True) 等
+        func = node.func
+        if isinstance(func, ast.Attribute) and _owner(func.value) is not None:
+            inplace = any(k.arg == "inplace" and not (isinstance(k.value, ast.Constant) and k.value.value is False)
+                          for k in node.keywords)
+            if func.attr in ("insert", "pop") or inplace:
+                self.tainted.add(_owner(func.value))
+            if isinstance(func.value, ast.Name) and func.value.id == "dfs" and func.attr in ("update", "setdefault"):
+                self.dynamic_writes = True
+        self.generic_visit(node)
+
+
+class CodeValidator:
+    def __init__(self, dfs: Dict[str, pd.DataFrame]):
+        self.tables = {name: df for name, df in dfs.items()
+                       if not name.startswith("__") and isinstance(df, pd.DataFrame)}
+        self.issues: List[ValidationIssue] = []
+
+    def validate(self, code: str) -> List[ValidationIssue]:
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            return [ValidationIssue(e.lineno or 0, "语法错误", f"{e.msg}: {(e.text or '').strip()}")]
+
+        scope = _Scope()
+        scope.visit(tree)
+        self.scope = scope
+        self.table_vars = self._table_vars(scope)
+        reported_names: Set[str] = set()
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                self._check_call(node)
+            elif isinstance(node, ast.Subscript) and isinstance(node.ctx, ast.Load):
+                self._check_subscript(node)
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+                if (node.id not in scope.bound and node.id not in INJECTED_NAMES
+                        and node.id not in BUILTIN_NAMES and node.id not in reported_names):
+                    reported_names.add(node.id)
+                    hint = f"，缺少 `import {node.id}`" if node.id in COMMON_MODULES else ""
+                    self._add(node, "未定义变量", f"'{node.id}' 未定义{hint}")
+        self.issues.sort(key=lambda i: i.line)
+        return self.issues
+
+    def _add(self, node, kind: str, message: str):
+        self.issues.append(ValidationIssue(getattr(node, "lineno", 0), kind, message))
+
+    def _table_vars(self, scope: _Scope) -> Dict[str, str]:
+        """只有全部赋值都来自同一张表 (或变量自身的筛选) 的变量才能确定对应的表"""
+        table_vars = {}
+        for name, values in scope.assigned.items():
+            sources = {_table_source(v, name) if v is not None else None for v in values} - {_SELF}
+            if len(sources) == 1 and None not in sources:
+                table_vars[name] = sources.pop()
+        if "df" not in scope.bound and self.tables:
+            table_vars["df"] = next(iter(self.tables))  # execute_code 默认注入第一张表
+        return table_vars
+
+    def _columns_of(self, owner) -> Optional[tuple]:
+        """返回 (表名, 可用列集合)；无法静态确定时返回 None"""
+        if isinstance(owner, ast.Name):
+            var, table = owner.id, self.table_vars.get(owner.id)
+        else:
+            var, table = None, _dfs_key(owner)
+        if (table is None or table not in self.tables or table in self.scope.written_tables
+                or self.scope.dynamic_writes):
+            return None
+        if (var is not None and var in self.scope.tainted) or table in self.scope.tainted:
+            return None
+        df = self.tables[table]
+        if isinstance(df.columns, pd.MultiIndex):
+            return None
+        columns = {str(c) for c in df.columns}
+        columns |= self.scope.created_columns.get(table, set())
+        if var is not None:
+            columns |= self.scope.created_columns.get(var, set())
+        return table, columns
+
+    def _check_columns(self, node, owner, names: List[str]):
+        resolved = self._columns_of(owner)
+        if resolved is None:
+            return
+        table, columns = resolved
+        for col in names:
+            if col not in columns:
+                listed = ", ".join(sorted(columns)[:MAX_LISTED_COLUMNS])
+                self._add(node, "列不存在", f"dfs['{table}'] 没有列 '{col}'{_suggest(col, columns)}。可用列: {listed}")
+
+    def _check_subscript(self, node: ast.Subscript):
+        key = _dfs_key(node)
+        if key is not None:
+            # 存在动态写入 (dfs[name] = ... / dfs.update) 时任何表名都可能在运行时出现，不报 "表不存在"
+            if (key not in self.tables and key not in self.scope.written_tables
+                    and not self.scope.dynamic_writes):
+                self._add(node, "表不存在", f"dfs 中没有 '{key}'{_suggest(key, self.tables)}。可用表: {list(self.tables)}")
+            return
+        owner = node.value
+        if isinstance(owner, ast.Attribute) and owner.attr == "loc":
+            if isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2:
+                self._check_columns(node, owner.value, _const_strs(node.slice.elts[1]))
+            return
+        self._check_columns(node, owner, _const_strs(node.slice))
+
+    def _check_call(self, node: ast.Call):
+        func = node.func
+        if not isinstance(func, ast.Attribute):
+            return
+        owner = func.value.id if isinstance(func.value, ast.Name) else None
+        for (target, attr), message in FORBIDDEN_CALLS.items():
+            if func.attr == attr and (target is None or target == owner):
+                self._add(node, "禁用调用", message)
+        if func.attr in COLUMN_METHODS:
+            arg = node.args[0] if node.args else next(
+                (k.value for k in node.keywords if k.arg == COLUMN_METHODS[func.attr]), None)
+            if arg is not None:
+                self._check_columns(node, func.value, _const_strs(arg))
+
+
+def validate_code(code: str, dfs: Dict[str, pd.DataFrame]) -> List[ValidationIssue]:
+    return CodeValidator(dfs).validate(code)
+
+
+def format_issues(issues: List[ValidationIssue]) -> str:
+    lines = [f"{STATIC_ERROR_MARK} (静态检查发现 {len(issues)} 个问题，代码未执行):"]
+    lines.extend(f"- {issue}" for issue in issues)
+    return "\n".join(lines)
+
+
+class ValidatorStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = 0
+        self.by_kind: Dict[str, int] = {}
+        self._total_ms = 0.0
+
+    def record(self, issues: List[ValidationIssue], elapsed_ms: float):
+        with self._lock:
+            self.checked += 1
+            self._total_ms += elapsed_ms
+            if issues:
+                self.rejected += 1
+            for issue in issues:
+                self.by_kind[issue.kind] = self.by_kind.get(issue.kind, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "rejected": self.rejected,
+                "reject_rate": round(self.rejected / self.checked, 3) if self.checked else 0.0,
+                "avg_ms": round(self._total_ms / self.checked, 3) if self.checked else 0.0,
+                "issues_by_kind": dict(self.by_kind),
+            }
+
+
+validator_stats = ValidatorStats()
+
+
+def check_code(code: str, dfs: Dict[str, pd.DataFrame]) -> List[ValidationIssue]:
+    """带计时和统计的校验入口 (workflow 使用)"""
+    started = time.perf_counter()
+    issues = validate_code(code, dfs)
+    validator_stats.record(issues, (time.perf_counter() - started) * 1000)
+    return issues
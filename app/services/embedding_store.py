@@ -0,0 +1,315 @@
+# 持久化向量缓存 + 近似最近邻 (ANN) 索引：主数据的句向量跨 Session / 进程重启复用，百万级候选按倒排聚类检索
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+import unicodedata
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.utils.file_lock import file_lock
+
+try:
+    import faiss
+    HAS_FAISS = True
+except ImportError:
+    HAS_FAISS = False
+
+_WHITESPACE = re.compile(r"\s+")
+KEY_BYTES = 16  # 文本哈希长度 (sha1 截断)
+INITIAL_CAPACITY = 1024
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、压缩空白、统一小写：'腾讯　科技' 与 '腾讯 科技' 共用同一个向量"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", str(text))).strip().lower()
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).digest()[:KEY_BYTES]
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z._-]+", "_", name)
+
+
+class HashingEncoder:
+    """
+    离线桩编码器：字符 n-gram 哈希到固定维度并归一化 (与 SentenceTransformer.encode 接口一致)。
+    不理解语义，只用于测试和基准 (无需下载模型、结果确定)。
+    """
+
+    def __init__(self, dim: int = 64, ngram: int = 2):
+        self.dim = dim
+        self.ngram = ngram
+
+    def encode(self, texts, batch_size: int = 64, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = True) -> np.ndarray:
+        rows, cols = [], []
+        for i, text in enumerate(texts):
+            text = normalize_text(text)
+            grams = [text[j:j + self.ngram] for j in range(max(1, len(text) - self.ngram + 1))]
+            rows.extend([i] * len(grams))
+            cols.extend(zlib.crc32(g.encode("utf-8")) % self.dim for g in grams)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), 1.0)
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+class EmbeddingStore:
+    """
+    按 (模型名, 规范化文本哈希) 持久化句向量。
+    - vectors.npy：float16 矩阵 (memory map，按需分页读入)；keys.npy：与行一一对应的文本哈希。
+    - meta.json 记录已写入行数，数据先落盘再更新 meta (tmp + os.replace)，中途崩溃只会丢失未提交的行。
+    - 容量不足时按倍数扩容 (新文件写完后替换)。
+    - 多进程共用同一目录 (服务进程 + 沙箱 worker)：追加在跨进程文件锁内进行，先按 meta.json 同步其他进程
+      写入的行 (文件被扩容替换时重新映射)，再在磁盘上的行尾追加；未命中时也会先同步，复用其他进程已编码的向量。
+    """
+
+    META = "meta.json"
+    LOCK = "write.lock"
+
+    def __init__(self, directory: Optional[str] = None, model_name: str = "default"):
+        self.directory = os.path.join(directory or settings.EMBEDDING_STORE_DIR, _safe_name(model_name))
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    # ---------- 存储 ----------
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._path(self.META), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _open_files(self):
+        self._vectors = np.load(self._path("vectors.npy"), mmap_mode="r+")
+        self._keys = np.load(self._path("keys.npy"), mmap_mode="r+")
+        self._inode = os.stat(self._path("vectors.npy")).st_ino
+
+    def _load(self):
+        self._inode = None
+        try:
+            meta = self._read_meta()
+            self.count, self.dim = meta["count"], meta["dim"]
+            self._open_files()
+        except (OSError, ValueError, KeyError, TypeError):
+            self.count, self.dim = 0, None
+            self._vectors = self._keys = None
+        self._rows = {k.tobytes(): i for i, k in enumerate(self._keys[:self.count])} if self.count else {}
+
+    def _sync(self):
+        """同步其他进程已提交的行 (meta.json 只在数据落盘后更新，读到的行数内的数据都是完整的)"""
+        meta = self._read_meta()
+        if not meta or meta.get("count", 0) <= self.count:
+            return
+        try:
+            if self._inode != os.stat(self._path("vectors.npy")).st_ino:
+                self._open_files()  # 其他进程扩容后替换了文件
+        except OSError:
+            return
+        start, self.count, self.dim = self.count, meta["count"], meta["dim"]
+        for i, key in enumerate(self._keys[start:self.count], start):
+            self._rows[key.tobytes()] = i
+
+    def _ensure_capacity(self, needed: int, dim: int):
+        capacity = 0 if self._vectors is None else len(self._vectors)
+        if needed <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        vectors = np.lib.format.open_memmap(self._path("vectors.npy.tmp"), mode="w+", dtype=np.float16,
+                                            shape=(new_capacity, dim))
+        # 哈希按 uint8 矩阵保存 (定长字节串 dtype 会丢掉末尾的 \x00)
+        keys = np.lib.format.open_memmap(self._path("keys.npy.tmp"), mode="w+", dtype=np.uint8,
+                                         shape=(new_capacity, KEY_BYTES))
+        if self.count:
+            vectors[:self.count] = self._vectors[:self.count]
+            keys[:self.count] = self._keys[:self.count]
+        vectors.flush()
+        keys.flush()
+        del vectors, keys
+        os.replace(self._path("vectors.npy.tmp"), self._path("vectors.npy"))
+        os.replace(self._path("keys.npy.tmp"), self._path("keys.npy"))
+        self._open_files()
+        self.dim = dim
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        """调用方持有跨进程文件锁，且已 _sync 到磁盘上的最新行数"""
+        self._ensure_capacity(self.count + len(keys), vectors.shape[1])
+        start = self.count
+        self._vectors[start:start + len(keys)] = vectors.astype(np.float16)
+        self._keys[start:start + len(keys)] = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(-1, KEY_BYTES)
+        self._vectors.flush()
+        self._keys.flush()
+        for i, key in enumerate(keys):
+            self._rows[key] = start + i
+        self.count += len(keys)
+        tmp_path = f"{self._path(self.META)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"count": self.count, "dim": self.dim, "model": self.model_name}, f)
+        os.replace(tmp_path, self._path(self.META))
+
+    # ---------- 读取 ----------
+    def rows_for(self, texts: List[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """返回每个文本在向量矩阵中的行号；缓存中没有的文本一次批量编码后追加"""
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._sync()
+            missing = {}
+            for text, key in zip(texts, keys):
+                if key not in self._rows and key not in missing:
+                    missing[key] = text
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            vectors = np.asarray(encode(list(missing.values())), dtype=np.float32)
+            with self._lock, file_lock(self._path(self.LOCK)):
+                self._sync()
+                fresh = [(k, v) for k, v in zip(missing, vectors) if k not in self._rows]  # 并发时可能已被写入
+                if fresh:
+                    self._append([k for k, _ in fresh], np.stack([v for _, v in fresh]))
+        with self._lock:
+            return np.fromiter((self._rows[k] for k in keys), dtype=np.int64, count=len(keys))
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """按行号取 float16 向量 (只读取涉及的页)"""
+        return self._vectors[rows]
+
+    def get_many(self, texts: List[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        return self.vectors(self.rows_for(texts, encode)).astype(np.float32)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"model": self.model_name, "entries": self.count, "dim": self.dim,
+                    "hits": self.hits, "misses": self.misses,
+                    "disk_mb": round((self.count * (self.dim or 0) * 2 + self.count * KEY_BYTES) / 1024 / 1024, 1)}
+
+
+# ==========================================
+# 🔎 近似最近邻 (IVF：k-means 聚类 + 倒排表)
+# ==========================================
+def _top_k(sims: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    k = min(k, sims.shape[1])
+    if k < sims.shape[1]:
+        idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.tile(np.arange(sims.shape[1]), (len(sims), 1))
+    scores = np.take_along_axis(sims, idx, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+class IVFIndex:
+    """
+    倒排聚类索引 (内积 / 归一化向量即余弦)：
+    - 训练：对采样向量做球面 k-means 得到 nlist 个中心；所有向量按最近中心分桶并按桶连续存放。
+    - 查询：先找 nprobe 个最近的中心，只在这些桶内精确计算，代价约为全量的 nprobe / nlist。
+    - 安装了 faiss 时使用 faiss.IndexIVFFlat (同样的算法，C++ 多线程实现)。
+    """
+
+    def __init__(self, vectors: np.ndarray, nlist: Optional[int] = None, nprobe: Optional[int] = None,
+                 iterations: int = 10, sample: int = 65536, seed: int = 0):
+        n, dim = vectors.shape
+        self.nlist = nlist or max(1, int(np.sqrt(n)))
+        self.nprobe = min(nprobe or settings.ANN_NPROBE, self.nlist)
+        rng = np.random.default_rng(seed)
+        train = np.asarray(vectors[rng.choice(n, min(n, max(sample, self.nlist)), replace=False)], dtype=np.float32)
+
+        if HAS_FAISS:
+            quantizer = faiss.IndexFlatIP(dim)
+            self._faiss = faiss.IndexIVFFlat(quantizer, dim, self.nlist, faiss.METRIC_INNER_PRODUCT)
+            self._faiss.train(train)
+            self._faiss.add(np.ascontiguousarray(vectors, dtype=np.float32))
+            self._faiss.nprobe = self.nprobe
+            return
+        self._faiss = None
+
+        centroids = train[rng.choice(len(train), self.nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            empty = np.bincount(assign, minlength=self.nlist) == 0
+            sums[empty] = centroids[empty]  # 空簇保留原中心
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        self.centroids = centroids
+
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            block = np.asarray(vectors[start:start + 65536], dtype=np.float32)
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.searchsorted(assign[self.order], np.arange(self.nlist + 1))
+        # 按桶连续存放的副本 (与输入同精度)：每个桶是一段连续内存，查询时按桶批量计算
+        self.bucketed = np.ascontiguousarray(vectors[self.order])
+
+    def search(self, queries: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (indices, scores)，形状 (len(queries), k)；不足 k 个时 index 为 -1"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if self._faiss is not None:
+            scores, indices = self._faiss.search(queries, k)
+            return indices, scores
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        probes, _ = _top_k(queries @ self.centroids.T, self.nprobe)
+        # 按桶遍历：探测同一个桶的所有查询一次矩阵乘法，再与各自已有的 Top K 合并
+        probe_q, probe_slot = np.nonzero(probes >= 0)
+        probe_list = probes[probe_q, probe_slot]
+        by_list = np.argsort(probe_list, kind="stable")
+        bounds = np.searchsorted(probe_list[by_list], np.arange(self.nlist + 1))
+        for c in range(self.nlist):
+            lo, hi = self.offsets[c], self.offsets[c + 1]
+            q_ids = probe_q[by_list[bounds[c]:bounds[c + 1]]]
+            if hi == lo or not len(q_ids):
+                continue
+            sims = queries[q_ids] @ np.asarray(self.bucketed[lo:hi], dtype=np.float32).T
+            top, top_scores = _top_k(sims, k)
+            merged_idx = np.concatenate([indices[q_ids], self.order[lo + top]], axis=1)
+            merged_scores = np.concatenate([scores[q_ids], top_scores], axis=1)
+            best, best_scores = _top_k(merged_scores, k)
+            indices[q_ids] = np.take_along_axis(merged_idx, best, axis=1)
+            scores[q_ids] = best_scores
+        return indices, scores
+
+
+def exact_search(vectors: np.ndarray, queries: np.ndarray, k: int = 5,
+                 block_rows: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """精确检索 (按候选分块做矩阵乘法 + argpartition)，用于小规模候选集，也是 ANN 召回率的基准"""
+    queries = np.asarray(queries, dtype=np.float32)
+    best_idx = np.full((len(queries), k), -1, dtype=np.int64)
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        idx, scores = _top_k(queries @ block.T, k)
+        merged_idx = np.concatenate([best_idx, idx + start], axis=1)
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        top, best_scores = _top_k(merged_scores, k)
+        best_idx = np.take_along_axis(merged_idx, top, axis=1)
+    return best_idx, best_scores
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(model_name: str) -> EmbeddingStore:
+    with _stores_lock:
+        if model_name not in _stores:
+            _stores[model_name] = EmbeddingStore(model_name=model_name)
+        return _stores[model_name]
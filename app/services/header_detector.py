@@ -0,0 +1,139 @@
+# 本地确定性 Sheet / Header 探测器。高置信度时直接采纳，低于阈值才交给 LLM 兜底。
+import re
+from typing import Dict, Union, Type, Optional
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+
+# 与 header prompt 中的特征保持一致，并补充财务场景常见字段
+HEADER_KEYWORDS = re.compile(
+    r"(日期|时间|金额|数量|单价|总价|总额|名称|客户|产品|订单|编号|流水|账号|摘要|备注|状态|部门|类别|"
+    r"\bID\b|Name|Code|Date|Amount|Price|Qty|Total|Type|Status)",
+    re.I,
+)
+# 表头单元格通常是不含数字的短文本；含数字的字符串 (ORD-001, 2024-01-01) 更像数据
+_DIGIT = re.compile(r"\d")
+# 非数据类 Sheet 的常见命名
+AUX_SHEET_PATTERN = re.compile(r"(封面|说明|目录|备注|注释|cover|readme|instruction|note|index|toc)", re.I)
+
+
+class Detection(BaseModel):
+    """探测结果：答案 + 置信度 (0~1) + 一句话理由"""
+    value: Union[str, int]
+    confidence: float = Field(ge=0.0, le=1.0)
+    reason: str
+
+
+class BaseDetector:
+    """探测器接口。新策略继承此类并通过 register_detector 注册即可。"""
+    name = "base"
+
+    def detect_sheet(self, previews: Dict[str, pd.DataFrame]) -> Detection:
+        raise NotImplementedError
+
+    def detect_header(self, preview: pd.DataFrame) -> Detection:
+        raise NotImplementedError
+
+
+class HeuristicDetector(BaseDetector):
+    """
+    基于规则打分的探测器：
+    - Sheet: 预览区非空单元格数量 (表规模) + 辅助 Sheet 命名惩罚。
+    - Header: 行非空密度、字符串占比、关键字命中、取值唯一性，以及与下方数据行的类型反差。
+    """
+    name = "heuristic"
+
+    def detect_sheet(self, previews: Dict[str, pd.DataFrame]) -> Detection:
+        names = list(previews.keys())
+        if len(names) == 1:
+            return Detection(value=names[0], confidence=1.0, reason="工作簿只有一个 Sheet")
+
+        scores = {}
+        for name, df in previews.items():
+            filled = int(df.notna().sum().sum()) if not df.empty else 0
+            penalty = 0.2 if AUX_SHEET_PATTERN.search(str(name)) else 1.0
+            scores[name] = filled * penalty
+
+        ranked = sorted(names, key=lambda n: scores[n], reverse=True)
+        best, second = scores[ranked[0]], scores[ranked[1]]
+        if best <= 0:
+            return Detection(value=names[0], confidence=0.0, reason="所有 Sheet 预览均为空")
+
+        margin = (best - second) / best
+        confidence = round(min(1.0, 0.4 + 0.6 * margin), 3)
+        return Detection(
+            value=ranked[0], confidence=confidence,
+            reason=f"数据量最大 (得分 {best:.0f} vs 次优 {second:.0f})"
+        )
+
+    def detect_header(self, preview: pd.DataFrame) -> Detection:
+        if preview.empty:
+            return Detection(value=0, confidence=0.0, reason="预览为空，默认首行")
+
+        # 转为纯 Python 列表后逐行打分，避免 pandas 逐行索引的开销
+        rows = [[v for v in r if not pd.isna(v)] for r in preview.astype(object).values.tolist()]
+        width = max(max(len(r) for r in rows), 1)
+        n_candidates = min(len(rows), 10)
+        label_ratios = [(sum(map(_is_label, r)) / len(r)) if r else 0.0 for r in rows]
+        row_scores = [self._score_row(rows, label_ratios, i, width) for i in range(n_candidates)]
+
+        best_row = max(range(n_candidates), key=lambda i: row_scores[i])
+        # 保守原则：与第 0 行得分接近时选 0
+        if best_row != 0 and row_scores[best_row] - row_scores[0] < 0.05:
+            best_row = 0
+
+        ordered = sorted(row_scores, reverse=True)
+        runner_up = ordered[1] if len(ordered) > 1 else 0.0
+        margin = max(row_scores[best_row] - runner_up, 0.0)
+        confidence = round(min(1.0, row_scores[best_row] * (0.6 + 0.4 * min(margin / 0.25, 1.0))), 3)
+        return Detection(
+            value=best_row, confidence=confidence,
+            reason=f"第 {best_row} 行字段特征最明显 (得分 {row_scores[best_row]:.2f})"
+        )
+
+    @staticmethod
+    def _score_row(rows: list, label_ratios: list, idx: int, width: int) -> float:
+        row = rows[idx]
+        if not row:
+            return 0.0
+
+        values = [str(v).strip() for v in row]
+        density = len(row) / width
+        str_ratio = label_ratios[idx]
+        keyword_hits = sum(bool(HEADER_KEYWORDS.search(v)) for v in row if _is_label(v))
+        uniqueness = len(set(values)) / len(values)
+
+        # 表头下方通常是数字/日期，表头本身是文字
+        below = [r for r in rows[idx + 1: idx + 6] if r]
+        if below:
+            below_str_ratio = sum(map(_is_label, (v for r in below for v in r))) / sum(map(len, below))
+            contrast = max(str_ratio - below_str_ratio, 0.0)
+        else:
+            contrast = 0.0
+
+        return (0.35 * density + 0.25 * str_ratio + 0.2 * min(keyword_hits / 2, 1.0)
+                + 0.1 * uniqueness + 0.1 * contrast)
+
+
+def _is_label(value) -> bool:
+    return isinstance(value, str) and not _DIGIT.search(value)
+
+
+DETECTORS: Dict[str, Type[BaseDetector]] = {
+    HeuristicDetector.name: HeuristicDetector,
+}
+
+
+def register_detector(name: str, detector_cls: Type[BaseDetector]):
+    DETECTORS[name] = detector_cls
+
+
+def get_detector(name: Optional[str] = None) -> Optional[BaseDetector]:
+    """按名称获取探测器；名称为 'llm' 时返回 None，表示始终走 LLM。"""
+    name = name or settings.INGESTION_DETECTOR
+    if name == "llm":
+        return None
+    if name not in DETECTORS:
+        raise ValueError(f"未知的探测器: {name}，可选: {list(DETECTORS.keys()) + ['llm']}")
+    return DETECTORS[name]()
@@ -2,9 +2,16 @@ import pandas as pd
 import os
 import re
 import json
+import hashlib
+import zipfile
+from typing import Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from app.services.llm_factory import get_llm
+from app.services.header_detector import get_detector
+from app.services.workbook_reader import WorkbookReader
+from app.core.config import settings
+from app.utils.disk_cache import DiskCache
 from pydantic import BaseModel, Field
 
 # 定义加载配置对象
@@ -13,6 +20,55 @@ class FileLoadConfig(BaseModel):
     sheet_name: str
     header_row: int
     reason: str = Field(description="AI 做出此判断的理由")
+    from_cache: bool = Field(default=False, description="是否命中摄取配置缓存")
+
+# ==========================================
+# 💾 摄取配置缓存 (Content Hash + 结构指纹)
+# ==========================================
+# 识别逻辑变化时递增，旧缓存自动失效
+INGESTION_CACHE_VERSION = "v2"
+
+_config_cache: Optional[DiskCache] = None
+
+def get_config_cache() -> DiskCache:
+    global _config_cache
+    if _config_cache is None:
+        _config_cache = DiskCache(settings.INGESTION_CACHE_DIR, max_entries=settings.INGESTION_CACHE_MAX_ENTRIES)
+    return _config_cache
+
+def file_content_hash(file_path: str) -> str:
+    """按块计算文件内容 SHA-256，避免大文件一次性读入内存"""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def workbook_fingerprint(file_path: str) -> str:
+    """
+    工作簿结构指纹：xlsx 本质是 zip，只读 workbook.xml 和成员清单，不解析任何单元格。
+    非 zip 格式 (xls/csv) 退化为扩展名。
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if not zipfile.is_zipfile(file_path):
+        return ext
+    h = hashlib.sha256(ext.encode("utf-8"))
+    with zipfile.ZipFile(file_path) as zf:
+        for info in sorted(zf.infolist(), key=lambda i: i.filename):
+            h.update(f"{info.filename}:{info.file_size};".encode("utf-8"))
+        if "xl/workbook.xml" in zf.namelist():
+            h.update(zf.read("xl/workbook.xml"))
+    return h.hexdigest()
+
+def ingestion_cache_key(file_path: str) -> str:
+    return f"{INGESTION_CACHE_VERSION}:{file_content_hash(file_path)}:{workbook_fingerprint(file_path)}"
+
+def invalidate_ingestion_cache(file_path: Optional[str] = None) -> int:
+    """失效指定文件的缓存；不传路径则清空全部缓存。返回删除条目数。"""
+    cache = get_config_cache()
+    if file_path is None:
+        return cache.clear()
+    return int(cache.delete(ingestion_cache_key(file_path)))
 
 def clean_gemini_output(raw_content: str) -> str:
     """清洗 Gemini 输出"""
@@ -25,19 +81,9 @@ def clean_gemini_output(raw_content: str) -> str:
     content = content.replace("```json", "").replace("```", "").strip()
     return content
 
-def propose_ingestion_config(file_path: str) -> FileLoadConfig:
-    """
-    👁️ AI 观察文件，提出加载建议
-    """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"文件未找到: {file_path}")
-
-    # 1. 扫描 Sheet
-    xls_file = pd.ExcelFile(file_path)
-    sheet_names = xls_file.sheet_names
-    
-    # 2. 选择 Sheet (LLM)
-    llm = get_llm(temperature=0)
+def llm_select_sheet(sheet_names: list) -> str:
+    """让 LLM 从 Sheet 列表中挑选主数据表"""
+    llm = get_llm(temperature=0, chain="ingestion_sheet")
     
     sheet_prompt = ChatPromptTemplate.from_messages([
         ("system", "从以下 Excel Sheet 列表中，找出最可能包含主数据的那个。排除 '封面', '说明' 等。只返回 Sheet 名称。"),
@@ -56,9 +102,14 @@ def propose_ingestion_config(file_path: str) -> FileLoadConfig:
                 break
         if not found:
             target_sheet = sheet_names[0]
+    return target_sheet
 
-    # 3. 探测 Header (读取前20行)
-    df_preview = pd.read_excel(file_path, sheet_name=target_sheet, header=None, nrows=20)
+def llm_detect_header(df_preview: pd.DataFrame) -> Tuple[int, str, bool]:
+    """
+    让 LLM 判断 Header 行号。
+    返回 (行号, 理由, 是否识别成功)；失败时兜底为第 0 行。
+    """
+    llm = get_llm(temperature=0, chain="ingestion_header")
     csv_preview = df_preview.to_csv(index=True)
     
     header_prompt = ChatPromptTemplate.from_messages([
@@ -89,33 +140,93 @@ def propose_ingestion_config(file_path: str) -> FileLoadConfig:
         json_match = re.search(r"\{.*\}", clean_resp, re.DOTALL)
         if json_match:
             data = json.loads(json_match.group())
-            header_row = int(data.get("row", 0))
-            reason = data.get("reason", "AI 自动识别")
-        else:
-            header_row = 0
-            reason = "JSON 解析失败，默认首行"
+            return int(data.get("row", 0)), data.get("reason", "AI 自动识别"), True
+        return 0, "JSON 解析失败，默认首行", False
     except Exception as e:
         print(f"Ingestion Error: {e}")
-        header_row = 0
-        reason = f"智能识别出错，默认首行"
+        return 0, f"智能识别出错，默认首行", False
 
-    return FileLoadConfig(
+def propose_ingestion_config(file_path: str, use_cache: bool = True,
+                             reader: Optional[WorkbookReader] = None) -> FileLoadConfig:
+    """
+    👁️ AI 观察文件，提出加载建议
+    命中缓存 (相同内容 + 相同结构) 时直接返回，不调用 LLM。
+    未命中时先用本地探测器打分，置信度低于阈值才询问 LLM。
+    传入 reader 时复用其已打开的工作簿，后续 apply_ingestion 不再重复解析。
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"文件未找到: {file_path}")
+
+    cache_key = None
+    if use_cache:
+        cache_key = ingestion_cache_key(file_path)
+        cached = get_config_cache().get(cache_key)
+        if cached:
+            print(f"⚡ [Ingestion-Cache] 命中缓存: {os.path.basename(file_path)}")
+            return FileLoadConfig(file_path=file_path, from_cache=True, **cached)
+
+    if reader is None:
+        with WorkbookReader(file_path) as own_reader:
+            config, cacheable = _detect_config(file_path, own_reader)
+    else:
+        config, cacheable = _detect_config(file_path, reader)
+
+    # 识别出错的兜底结果不写入缓存，下次重新识别
+    if cache_key and cacheable:
+        get_config_cache().set(cache_key, config.model_dump(include={"sheet_name", "header_row", "reason"}))
+    return config
+
+def _detect_config(file_path: str, reader: WorkbookReader) -> Tuple[FileLoadConfig, bool]:
+    """本地探测器优先，置信度不足时调用 LLM。返回 (配置, 是否可缓存)"""
+    detector = get_detector()
+    threshold = settings.INGESTION_CONFIDENCE_THRESHOLD
+
+    # 1. 扫描 Sheet
+    sheet_names = reader.sheet_names
+    
+    # 2. 选择 Sheet (本地探测 -> LLM 兜底)
+    previews = {}
+    sheet_reason = ""
+    if detector:
+        previews = {s: reader.preview(s, nrows=20) for s in sheet_names}
+        sheet_det = detector.detect_sheet(previews)
+    if detector and sheet_det.confidence >= threshold:
+        target_sheet = sheet_det.value
+        sheet_reason = f"Sheet[{detector.name} {sheet_det.confidence:.2f}]: {sheet_det.reason}; "
+    else:
+        target_sheet = llm_select_sheet(sheet_names)
+
+    # 3. 探测 Header (读取前20行)
+    df_preview = previews.get(target_sheet)
+    if df_preview is None:
+        df_preview = reader.preview(target_sheet, nrows=20)
+
+    ok = True
+    header_det = detector.detect_header(df_preview) if detector else None
+    if header_det and header_det.confidence >= threshold:
+        header_row = int(header_det.value)
+        reason = f"Header[{detector.name} {header_det.confidence:.2f}]: {header_det.reason}"
+    else:
+        header_row, reason, ok = llm_detect_header(df_preview)
+
+    config = FileLoadConfig(
         file_path=file_path,
         sheet_name=target_sheet,
         header_row=header_row,
-        reason=reason
+        reason=sheet_reason + reason
     )
+    return config, ok
 
-def apply_ingestion(config: FileLoadConfig) -> pd.DataFrame:
+def apply_ingestion(config: FileLoadConfig, reader: Optional[WorkbookReader] = None) -> pd.DataFrame:
     """
     🚀 执行加载
     """
     print(f"   📂 [Loader] 加载参数: Sheet='{config.sheet_name}', Header={config.header_row}")
-    df = pd.read_excel(
-        config.file_path, 
-        sheet_name=config.sheet_name, 
-        header=config.header_row
-    )
+    if reader is None:
+        with WorkbookReader(config.file_path) as own_reader:
+            df = own_reader.load(config.sheet_name, config.header_row)
+    else:
+        df = reader.load(config.sheet_name, config.header_row)
     df.dropna(how='all', axis=1, inplace=True)
     df.dropna(how='all', axis=0, inplace=True)
     return df
@@ -123,11 +234,20 @@ def apply_ingestion(config: FileLoadConfig) -> pd.DataFrame:
 # ==========================================
 # ✅ 补回 load_file 函数 (适配 Web API)
 # ==========================================
+def load_file_with_config(file_path: str) -> Tuple[pd.DataFrame, FileLoadConfig]:
+    """
+    [自动模式] 同 load_file，但同时返回所采用的加载配置 (含缓存命中信息)。
+    整个过程只打开、解析一次工作簿。
+    """
+    print(f"🔄 [Auto-Ingest] 正在自动分析并加载: {os.path.basename(file_path)}")
+    with WorkbookReader(file_path) as reader:
+        config = propose_ingestion_config(file_path, reader=reader)
+        return apply_ingestion(config, reader=reader), config
+
 def load_file(file_path: str) -> pd.DataFrame:
     """
     [自动模式] 组合 propose 和 apply，直接加载文件。
     专门供 Server API 使用，默认采纳 AI 建议。
     """
-    print(f"🔄 [Auto-Ingest] 正在自动分析并加载: {os.path.basename(file_path)}")
-    config = propose_ingestion_config(file_path)
-    return apply_ingestion(config)
\ No newline at end of file
+    df, _ = load_file_with_config(file_path)
+    return df
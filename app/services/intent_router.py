@@ -0,0 +1,280 @@
+# 本地意图分类器：高置信度的指令直接路由，跳过 supervisor 的 LLM 调用；低于阈值才交给 LLM
+import re
+import time
+import threading
+from typing import Dict, List, Optional, Tuple, Type
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+
+WORKER = "python_worker"
+CHAT = "general_chat"
+
+# (正则, 意图, 权重, 闲聊回复)。权重按 noisy-or 累加：多条规则同时命中时置信度更高
+INTENT_RULES: List[Tuple[re.Pattern, str, float, Optional[str]]] = [
+    # ---- 明确的数据操作 (与 worker prompt 中 L1~L4 的触发词一致) ----
+    (re.compile(r"(对账|核对|勾稽|流水差异|reconcil)", re.I), WORKER, 0.95, None),
+    (re.compile(r"(清洗|体检|去重|重复|缺失值|空值|异常值|极端值|\bclean)", re.I), WORKER, 0.9, None),
+    (re.compile(r"(合并|关联|连接|拼接|匹配|\bmerge\b|\bjoin\b)", re.I), WORKER, 0.9, None),
+    (re.compile(r"(画|绘制|图表|可视化|柱状图|条形图|折线图|饼图|散点图|直方图|热力图|\bplot|\bchart)", re.I), WORKER, 0.9, None),
+    (re.compile(r"(导出|下载|保存|生成.{0,6}(表|文件|报表)|\bexport)", re.I), WORKER, 0.9, None),
+    (re.compile(r"(透视|分组|汇总|统计|聚合|求和|平均|均值|中位数|占比|同比|环比|排名|排序|筛选|过滤|"
+                r"\bgroup ?by\b|\bpivot\b|\bsum\b|\baverage\b|\bfilter\b|\bsort\b)", re.I), WORKER, 0.85, None),
+    (re.compile(r"(还原|重置|撤销|恢复原始|\breload\b)", re.I), WORKER, 0.85, None),
+    (re.compile(r"(删除|删掉|去掉|剔除|替换|填充|转换|转成|重命名|拆分)", re.I), WORKER, 0.85, None),
+    # ---- 弱信号：单独命中不足以跳过 LLM ----
+    (re.compile(r"(分析|查看|看看|看一下|找出|列出|计算|多少|哪些|哪个|最高|最低|最大|最小|前\s*\d+|\btop\b|"
+                r"趋势|分布|对比|比较|变化|检查|了解|明细)", re.I), WORKER, 0.6, None),
+    (re.compile(r"(数据|表格|报表|这张表|两张表|字段|列)", re.I), WORKER, 0.4, None),
+    # ---- 闲聊 (自带回复，无需 LLM 生成) ----
+    (re.compile(r"^\s*(你好|您好|嗨|哈喽|在吗|hi|hello|hey)[\s!！。.~～呀啊]*$", re.I), CHAT, 0.95,
+     "你好！我是数据分析助手。上传数据后，可以让我清洗数据、合并表格、财务对账或绘制图表。"),
+    (re.compile(r"^\s*(谢谢|多谢|感谢|辛苦了|thanks|thank you|thx)[\s!！。.~～你啦了]*$", re.I), CHAT, 0.95,
+     "不客气！还有其他需要分析的数据吗？"),
+    (re.compile(r"(你是谁|你能做什么|你会什么|你有什么功能|怎么用|如何使用|使用说明|\bhelp\b)", re.I), CHAT, 0.9,
+     "我是数据分析助手，可以：1) 数据体检与清洗；2) 多表智能合并；3) 财务对账；4) 统计分析与可视化，并导出带审计日志的报表。"),
+    (re.compile(r"(天气|笑话|新闻|写诗|写一首|讲个故事|星座|彩票)", re.I), CHAT, 0.85,
+     "抱歉，我专注于数据分析，无法回答与当前数据无关的问题。请告诉我需要对数据做什么操作。"),
+]
+# 提到表名或列名时，几乎一定是数据操作
+MENTION_WEIGHT = 0.7
+
+
+class Intent(BaseModel):
+    """分类结果：路由目标 + 置信度 (0~1) + 理由；闲聊时附带回复"""
+    decision: str
+    confidence: float = Field(ge=0.0, le=1.0)
+    reason: str
+    reply: Optional[str] = None
+
+
+class BaseIntentClassifier:
+    """意图分类器接口。新策略继承此类并通过 register_intent_classifier 注册即可。"""
+    name = "base"
+
+    def classify(self, instruction: str, dfs_context: Optional[Dict[str, pd.DataFrame]] = None) -> Optional[Intent]:
+        raise NotImplementedError
+
+
+def _noisy_or(weights: List[float]) -> float:
+    p = 1.0
+    for w in weights:
+        p *= 1.0 - w
+    return 1.0 - p
+
+
+def _mentions(instruction: str, dfs_context: Optional[Dict[str, pd.DataFrame]]) -> List[str]:
+    """指令中提到的表名 (含去后缀) 或列名"""
+    found = []
+    text = instruction.lower()
+    for name, df in (dfs_context or {}).items():
+        if name.startswith("__"):
+            continue
+        stem = name.rsplit(".", 1)[0].lower()
+        if len(stem) >= 2 and stem in text:
+            found.append(name)
+        if isinstance(df, pd.DataFrame):
+            found.extend(str(c) for c in df.columns if len(str(c)) >= 2 and str(c).lower() in text)
+    return found
+
+
+class RuleIntentClassifier(BaseIntentClassifier):
+    """
+    关键词/正则打分：每个意图按命中规则的权重做 noisy-or 得到分数，
+    置信度 = 最高分 × (1 - 次高分)，两类信号冲突时 (如“翻译这张表的列名”) 置信度自然下降。
+    """
+    name = "rules"
+
+    def classify(self, instruction, dfs_context=None):
+        text = (instruction or "").strip()
+        if not text:
+            return None
+        weights: Dict[str, List[float]] = {}
+        hits: Dict[str, List[str]] = {}
+        replies: Dict[str, Tuple[float, str]] = {}
+        for pattern, decision, weight, reply in INTENT_RULES:
+            match = pattern.search(text)
+            if not match:
+                continue
+            weights.setdefault(decision, []).append(weight)
+            hits.setdefault(decision, []).append(match.group(0).strip())
+            if reply and weight > replies.get(decision, (0.0, ""))[0]:
+                replies[decision] = (weight, reply)
+
+        mentioned = _mentions(text, dfs_context)
+        if mentioned:
+            weights.setdefault(WORKER, []).append(MENTION_WEIGHT)
+            hits.setdefault(WORKER, []).append(f"提及 {mentioned[0]}")
+
+        if not weights:
+            return None
+        scores = sorted(((_noisy_or(w), d) for d, w in weights.items()), reverse=True)
+        top_score, decision = scores[0]
+        second = scores[1][0] if len(scores) > 1 else 0.0
+        return Intent(
+            decision=decision,
+            confidence=round(top_score * (1.0 - second), 4),
+            reason=f"命中: {', '.join(hits[decision][:4])}",
+            reply=replies.get(decision, (0.0, None))[1],
+        )
+
+
+# 嵌入分类器的种子样例 (也是 benchmarks/data/intent_corpus.jsonl 的一部分来源)
+INTENT_EXAMPLES = {
+    WORKER: [
+        "帮我清洗一下数据", "把两张表按客户名称合并", "核对系统流水和银行流水", "画出每月销售额的趋势图",
+        "统计每个客户的订单数量", "找出金额最大的前10笔交易", "导出处理后的结果", "检查有没有重复的订单",
+        "按部门汇总费用", "筛选出2024年的记录",
+    ],
+    CHAT: ["你好", "谢谢你", "你是谁", "今天天气怎么样", "讲个笑话"],
+}
+
+
+class EmbeddingIntentClassifier(BaseIntentClassifier):
+    """
+    可选的本地小模型：复用 smart_merge 已加载的多语言句向量模型，按与样例的最大余弦相似度分类。
+    闲聊没有可用的回复文本，因此只对数据操作给出结论。未安装 sentence-transformers 时不生效。
+    """
+    name = "embedding"
+    MIN_SIMILARITY = 0.6
+
+    def __init__(self, examples: Optional[Dict[str, List[str]]] = None):
+        from app.utils.tools import VectorMatcher
+        self._model = VectorMatcher()._model
+        self._labels, texts = [], []
+        for label, items in (examples or INTENT_EXAMPLES).items():
+            self._labels.extend([label] * len(items))
+            texts.extend(items)
+        self._embeddings = self._model.encode(texts, normalize_embeddings=True) if self._model else None
+
+    def classify(self, instruction, dfs_context=None):
+        if self._embeddings is None or not (instruction or "").strip():
+            return None
+        query = self._model.encode([instruction], normalize_embeddings=True)[0]
+        sims = self._embeddings @ query
+        best = {}
+        for label, sim in zip(self._labels, sims):
+            best[label] = max(best.get(label, -1.0), float(sim))
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+        decision, top = ranked[0]
+        second = ranked[1][1] if len(ranked) > 1 else 0.0
+        if decision != WORKER or top < self.MIN_SIMILARITY:
+            return None
+        confidence = max(0.0, min(1.0, top * (1.0 - max(second, 0.0) / 2)))
+        return Intent(decision=decision, confidence=round(confidence, 4), reason=f"语义相似度 {top:.2f}")
+
+
+class HybridIntentClassifier(BaseIntentClassifier):
+    """先规则，规则不确定时再用本地嵌入模型"""
+    name = "hybrid"
+
+    def __init__(self):
+        self.rules = RuleIntentClassifier()
+        self.embedding = EmbeddingIntentClassifier()
+
+    def classify(self, instruction, dfs_context=None):
+        intent = self.rules.classify(instruction, dfs_context)
+        if intent is not None and intent.confidence >= settings.INTENT_CONFIDENCE_THRESHOLD:
+            return intent
+        return self.embedding.classify(instruction, dfs_context) or intent
+
+
+INTENT_CLASSIFIERS: Dict[str, Type[BaseIntentClassifier]] = {
+    RuleIntentClassifier.name: RuleIntentClassifier,
+    EmbeddingIntentClassifier.name: EmbeddingIntentClassifier,
+    HybridIntentClassifier.name: HybridIntentClassifier,
+}
+_instances: Dict[str, BaseIntentClassifier] = {}
+_instances_lock = threading.Lock()
+
+
+def register_intent_classifier(name: str, classifier_cls: Type[BaseIntentClassifier]):
+    INTENT_CLASSIFIERS[name] = classifier_cls
+    _instances.pop(name, None)
+
+
+def get_intent_classifier(name: Optional[str] = None) -> Optional[BaseIntentClassifier]:
+    """按名称获取分类器 (进程内单例)；名称为 'llm' 时返回 None，表示始终走 LLM。"""
+    name = name or settings.INTENT_CLASSIFIER
+    if name == "llm":
+        return None
+    if name not in INTENT_CLASSIFIERS:
+        raise ValueError(f"未知的意图分类器: {name}，可选: {list(INTENT_CLASSIFIERS.keys()) + ['llm']}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = INTENT_CLASSIFIERS[name]()
+        return _instances[name]
+
+
+# ==========================================
+# 📊 路由统计
+# ==========================================
+class RouterStats:
+    """快速路径命中数、LLM 路由次数与平均耗时；节省的时间按 LLM 路由的平均耗时估算"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.llm_calls = 0
+        self._llm_total_ms = 0.0
+        self._fast_total_ms = 0.0
+        self.by_decision: Dict[str, int] = {}
+
+    def record_fast(self, decision: str, elapsed_ms: float):
+        with self._lock:
+            self.fast_path += 1
+            self._fast_total_ms += elapsed_ms
+            self.by_decision[decision] = self.by_decision.get(decision, 0) + 1
+
+    def record_llm(self, elapsed_ms: float):
+        with self._lock:
+            self.llm_calls += 1
+            self._llm_total_ms += elapsed_ms
+
+    @property
+    def avg_llm_ms(self) -> float:
+        return self._llm_total_ms / self.llm_calls if self.llm_calls else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.fast_path + self.llm_calls
+            return {
+                "fast_path": self.fast_path,
+                "llm_calls": self.llm_calls,
+                "fast_path_ratio": round(self.fast_path / total, 3) if total else 0.0,
+                "avg_llm_ms": round(self.avg_llm_ms, 1),
+                "avg_fast_ms": round(self._fast_total_ms / self.fast_path, 3) if self.fast_path else 0.0,
+                "estimated_saved_ms": round(self.fast_path * self.avg_llm_ms, 1),
+                "fast_path_by_decision": dict(self.by_decision),
+            }
+
+
+router_stats = RouterStats()
+
+
+def fast_route(instruction: str, dfs_context: Optional[Dict[str, pd.DataFrame]] = None) -> Optional[dict]:
+    """
+    本地分类置信度达到 INTENT_CONFIDENCE_THRESHOLD 时直接返回 supervisor 的状态更新，否则返回 None (走 LLM)。
+    """
+    classifier = get_intent_classifier()
+    if classifier is None:
+        return None
+    started = time.perf_counter()
+    intent = classifier.classify(instruction, dfs_context)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if intent is None or intent.confidence < settings.INTENT_CONFIDENCE_THRESHOLD:
+        if intent is not None:
+            print(f"🧭 [Router] 规则置信度不足: {intent.decision} ({intent.confidence:.2f}, {intent.reason})，交给 LLM")
+        return None
+    if intent.decision == CHAT and not intent.reply:
+        return None
+
+    router_stats.record_fast(intent.decision, elapsed_ms)
+    saved = f", 预计节省 {router_stats.avg_llm_ms:.0f} ms" if router_stats.llm_calls else ""
+    print(f"⚡ [Router] 快速路由: {intent.decision} (置信度 {intent.confidence:.2f}, {intent.reason}, "
+          f"{elapsed_ms:.2f} ms{saved})")
+    update = {"router_decision": intent.decision}
+    if intent.decision == CHAT:
+        update["reply"] = intent.reply
+    return update
@@ -0,0 +1,215 @@
+# LLM 响应缓存：按规范化 Prompt + 模型参数缓存到本地磁盘，所有链 (摄取/路由/代码生成/裁判) 共用，按链统计命中率
+import re
+import json
+import hashlib
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.caches import BaseCache
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+from app.core.config import settings
+from app.utils.disk_cache import DiskCache
+
+# Prompt 规范化或存储格式变化时递增，旧缓存自动失效
+LLM_CACHE_VERSION = "v1"
+SEMANTIC_INDEX_MAX = 2000  # 每个 (链, 模型参数) 在内存中保留的向量条数
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    LangChain 传入的是消息列表的 JSON 序列化结果；只保留角色和内容，并压缩空白，
+    这样 Prompt 模板缩进、换行的差异不会造成缓存未命中。
+    """
+    try:
+        messages = json.loads(prompt)
+    except (TypeError, ValueError):
+        return _WHITESPACE.sub(" ", str(prompt)).strip()
+    if not isinstance(messages, list):
+        return _WHITESPACE.sub(" ", prompt).strip()
+    parts = []
+    for message in messages:
+        kwargs = message.get("kwargs", {}) if isinstance(message, dict) else {}
+        content = kwargs.get("content", message)
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, sort_keys=True)
+        parts.append(f"[{kwargs.get('type', '')}] {_WHITESPACE.sub(' ', content).strip()}")
+    return "\n".join(parts)
+
+
+def _dump_generations(generations: Sequence[Generation]) -> List[dict]:
+    dumped = []
+    for gen in generations:
+        if isinstance(gen, ChatGeneration):
+            dumped.append({"chat": True, "content": gen.message.content})
+        else:
+            dumped.append({"chat": False, "text": gen.text})
+    return dumped
+
+
+def _load_generations(items: List[dict]) -> List[Generation]:
+    return [ChatGeneration(message=AIMessage(content=item["content"])) if item.get("chat")
+            else Generation(text=item.get("text", "")) for item in items]
+
+
+class ChainStats:
+    def __init__(self):
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round((self.hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+class LLMResponseCache:
+    """
+    - 精确匹配：key = sha256(版本 + 模型参数 + 规范化 Prompt)，存储在 DiskCache (TTL + LRU)。
+    - 语义匹配 (可选)：LLM_CACHE_SEMANTIC_THRESHOLD > 0 且链在 LLM_CACHE_SEMANTIC_CHAINS 中时，
+      精确未命中后按句向量余弦相似度查找同一链、同一模型参数下的近似 Prompt。
+      向量索引只保存在内存中 (重启后从新写入的条目重建)；未安装 sentence-transformers 时不生效。
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_entries: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None, semantic_threshold: Optional[float] = None,
+                 semantic_chains: Optional[List[str]] = None):
+        self.backend = DiskCache(
+            directory or settings.LLM_CACHE_DIR,
+            max_entries=max_entries or settings.LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds,
+        )
+        self.semantic_threshold = (settings.LLM_CACHE_SEMANTIC_THRESHOLD
+                                   if semantic_threshold is None else semantic_threshold)
+        self.semantic_chains = set(semantic_chains if semantic_chains is not None
+                                   else settings.LLM_CACHE_SEMANTIC_CHAINS)
+        self._lock = threading.Lock()
+        self._chains: Dict[str, ChainStats] = {}
+        self._index: Dict[str, list] = {}  # (链, 模型参数) -> [(向量, key)]
+        self._model = None
+        self._model_loaded = False
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        h = hashlib.sha256()
+        for part in (LLM_CACHE_VERSION, llm_string, normalize_prompt(prompt)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _stats(self, chain: str) -> ChainStats:
+        with self._lock:
+            return self._chains.setdefault(chain, ChainStats())
+
+    def _semantic_enabled(self, chain: str) -> bool:
+        return self.semantic_threshold > 0 and chain in self.semantic_chains
+
+    def _encode(self, text: str) -> Optional[np.ndarray]:
+        if not self._model_loaded:
+            # 延迟导入：tools 依赖 llm_factory，避免循环导入
+            from app.utils.tools import VectorMatcher
+            self._model = VectorMatcher()._model
+            self._model_loaded = True
+        if self._model is None:
+            return None
+        return self._model.encode([text], normalize_embeddings=True)[0]
+
+    def _scope(self, chain: str, llm_string: str) -> str:
+        return f"{chain}\0{llm_string}"
+
+    def lookup(self, chain: str, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        stats = self._stats(chain)
+        key = self.make_key(prompt, llm_string)
+        value = self.backend.get(key)
+        if value is not None:
+            with self._lock:
+                stats.hits += 1
+            return _load_generations(value["generations"])
+
+        if self._semantic_enabled(chain):
+            vector = self._encode(normalize_prompt(prompt))
+            with self._lock:
+                candidates = list(self._index.get(self._scope(chain, llm_string), []))
+            if vector is not None and candidates:
+                sims = np.stack([c[0] for c in candidates]) @ vector
+                best = int(np.argmax(sims))
+                if sims[best] >= self.semantic_threshold:
+                    value = self.backend.get(candidates[best][1])
+                    if value is not None:
+                        with self._lock:
+                            stats.semantic_hits += 1
+                        print(f"🗃️ [LLM Cache] {chain} 语义命中 (相似度 {sims[best]:.3f})")
+                        return _load_generations(value["generations"])
+        with self._lock:
+            stats.misses += 1
+        return None
+
+    def update(self, chain: str, prompt: str, llm_string: str, return_val: Sequence[Generation]):
+        key = self.make_key(prompt, llm_string)
+        self.backend.set(key, {"chain": chain, "generations": _dump_generations(return_val)})
+        if self._semantic_enabled(chain):
+            vector = self._encode(normalize_prompt(prompt))
+            if vector is not None:
+                with self._lock:
+                    entries = self._index.setdefault(self._scope(chain, llm_string), [])
+                    entries.append((vector, key))
+                    del entries[:-SEMANTIC_INDEX_MAX]
+
+    def record_bypass(self, chain: str):
+        stats = self._stats(chain)
+        with self._lock:
+            stats.bypassed += 1
+
+    def clear(self) -> int:
+        with self._lock:
+            self._index.clear()
+        return self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            chains = {name: s.to_dict() for name, s in self._chains.items()}
+        return {"enabled": settings.LLM_CACHE_ENABLED, "backend": self.backend.stats(), "chains": chains}
+
+
+class ChainCache(BaseCache):
+    """绑定链名称的 LangChain 缓存视图，多个链共享同一个 LLMResponseCache"""
+
+    def __init__(self, store: LLMResponseCache, chain: str):
+        self.store = store
+        self.chain = chain
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        return self.store.lookup(self.chain, prompt, llm_string)
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        self.store.update(self.chain, prompt, llm_string, return_val)
+
+    def clear(self, **kwargs) -> None:
+        self.store.clear()
+
+
+_store: Optional[LLMResponseCache] = None
+_store_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LLMResponseCache()
+        return _store
+
+
+def chain_cache(chain: str) -> ChainCache:
+    return ChainCache(get_llm_cache(), chain)
@@ -1,18 +1,29 @@
 # LLM工厂模式。负责生产 LLM 实例，统一管理参数（如 Temperature）和安全设置。
 from langchain_google_genai import ChatGoogleGenerativeAI, HarmBlockThreshold, HarmCategory
 from app.core.config import settings
+from app.services.llm_cache import chain_cache, get_llm_cache
 
-def get_llm(temperature=0):
+def get_llm(temperature=0, chain: str = "default"):
     """
     获取 Google Gemini LLM 实例。
+    chain: 调用方名称，用于按链统计缓存命中率。只有 temperature == 0 (输出确定) 时才启用响应缓存，
+    LLM_CACHE_EXCLUDED_CHAINS 中的链 (代码生成) 始终不缓存。
     """
     if not settings.GOOGLE_API_KEY:
         raise ValueError("❌ 未找到 GOOGLE_API_KEY，请检查 .env 文件")
 
+    if settings.LLM_CACHE_ENABLED and temperature == 0 and chain not in settings.LLM_CACHE_EXCLUDED_CHAINS:
+        cache = chain_cache(chain)
+    else:
+        if settings.LLM_CACHE_ENABLED:
+            get_llm_cache().record_bypass(chain)
+        cache = False  # 显式关闭，避免使用 LangChain 全局缓存
+
     return ChatGoogleGenerativeAI(
         google_api_key=settings.GOOGLE_API_KEY,
         model=settings.GOOGLE_MODEL_NAME,
         temperature=temperature,
+        cache=cache,
         # 👇 关掉安全过滤，防止分析数据时误报
         safety_settings={
             HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
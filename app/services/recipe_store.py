@@ -0,0 +1,253 @@
+# 代码配方库：成功执行的脚本按 (规范化指令 + 表结构签名) 持久化，下次遇到同样的指令和表结构时直接回放，不再调用 LLM
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+
+from app.core.config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s。．.!！?？~～]+$")
+
+
+def table_signature(df: pd.DataFrame) -> str:
+    """表结构签名：列名 + 类型 (与行数、取值无关，下个月的同格式文件签名相同)"""
+    payload = json.dumps([[str(c), str(t)] for c, t in zip(df.columns, df.dtypes)], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def schema_signature(dfs: Dict[str, pd.DataFrame]) -> List[List[str]]:
+    """
+    当前会话所有数据表的 [表名, 签名]，按 (签名, 表名) 排序。
+    排序后的位置即表的占位编号，文件名每月变化时按位置对应。
+    """
+    tables = [[name, table_signature(df)] for name, df in dfs.items()
+              if not name.startswith("__") and isinstance(df, pd.DataFrame)]
+    return sorted(tables, key=lambda t: (t[1], t[0]))
+
+
+def _table_aliases(name: str) -> List[str]:
+    stem = name.rsplit(".", 1)[0]
+    return [name, stem] if stem and stem != name else [name]
+
+
+def normalize_instruction(instruction: str, tables: List[List[str]]) -> str:
+    """指令规范化：表名替换为位置占位符、压缩空白、去掉句末标点、统一小写"""
+    text = instruction or ""
+    aliases = [(alias, i) for i, (name, _) in enumerate(tables) for alias in _table_aliases(name)]
+    for alias, i in sorted(aliases, key=lambda a: len(a[0]), reverse=True):
+        text = text.replace(alias, f"<表{i}>")
+    text = _WHITESPACE.sub(" ", text).strip().lower()
+    return _TRAILING.sub("", text)
+
+
+def remap_code(code: str, old_tables: List[List[str]], new_tables: List[List[str]]) -> str:
+    """把配方代码中引用的旧表名 (引号内的字符串字面量) 换成当前会话中结构相同的表名"""
+    pairs = []
+    for (old, _), (new, _) in zip(old_tables, new_tables):
+        if old == new:
+            continue
+        for old_alias, new_alias in zip(_table_aliases(old), _table_aliases(new)):
+            pairs.append((old_alias, new_alias))
+    if not pairs:
+        return code
+    # 两阶段替换，避免表名互换时 A→B→A 串改
+    pairs.sort(key=lambda p: len(p[0]), reverse=True)
+    for i, (old, _) in enumerate(pairs):
+        for quote in ("'", '"'):
+            code = code.replace(f"{quote}{old}{quote}", f"{quote}\0{i}\0{quote}")
+    for i, (_, new) in enumerate(pairs):
+        code = code.replace(f"\0{i}\0", new)
+    return code
+
+
+class RecipeStore:
+    """
+    - 索引 recipes.json 与所有配方存放在同一目录，写入采用 tmp + os.replace。
+    - 回放失败：未固定的配方直接删除；已固定 (pinned) 的配方标记为 stale，不再回放，直到重新固定或被新代码覆盖。
+    - 未固定的配方超过 RECIPE_TTL_DAYS 未使用时过期；数量超过 RECIPE_MAX_ENTRIES 时按最近使用时间淘汰。
+    """
+
+    INDEX = "recipes.json"
+
+    def __init__(self, directory: Optional[str] = None, max_entries: Optional[int] = None,
+                 ttl_days: Optional[float] = None):
+        self.directory = directory or settings.RECIPE_DIR
+        self.max_entries = max_entries or settings.RECIPE_MAX_ENTRIES
+        self.ttl_seconds = (settings.RECIPE_TTL_DAYS if ttl_days is None else ttl_days) * 86400
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._recipes: Dict[str, dict] = self._read_index()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(intent: str, tables: List[List[str]]) -> str:
+        payload = json.dumps([intent, [sig for _, sig in tables]], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ---------- 匹配 / 回放 ----------
+    def match(self, instruction: str, dfs: Dict[str, pd.DataFrame]) -> Optional[Tuple[dict, str]]:
+        """命中时返回 (配方, 已替换表名的代码)"""
+        tables = schema_signature(dfs)
+        if not tables or not (instruction or "").strip():
+            return None
+        key = self.make_key(normalize_instruction(instruction, tables), tables)
+        with self._lock:
+            self._expire()
+            recipe = self._recipes.get(key)
+            if recipe is None or recipe.get("stale"):
+                self.misses += 1
+                return None
+            self.hits += 1
+            recipe = dict(recipe)
+        return recipe, remap_code(recipe["code"], recipe["tables"], tables)
+
+    def record_success(self, recipe_id: str):
+        with self._lock:
+            recipe = self._by_id(recipe_id)
+            if recipe is None:
+                return
+            recipe["uses"] += 1
+            recipe["last_used"] = time.time()
+            self._write_index()
+
+    def record_failure(self, recipe_id: str, error: str = ""):
+        """回放失败即视为配方过期 (表结构相同但数据内容已不适用)"""
+        with self._lock:
+            recipe = self._by_id(recipe_id)
+            if recipe is None:
+                return
+            recipe["failures"] += 1
+            recipe["last_error"] = error[-500:]
+            if recipe["pinned"]:
+                recipe["stale"] = True
+            else:
+                self._recipes.pop(recipe["key"], None)
+            self._write_index()
+        print(f"🗑️ [Recipe] 配方 {recipe_id} 回放失败，已{'标记为过期' if recipe['pinned'] else '删除'}")
+
+    # ---------- 保存 ----------
+    def save(self, instruction: str, tables: List[List[str]], code: str) -> Optional[dict]:
+        if not tables or not (instruction or "").strip() or not code.strip():
+            return None
+        intent = normalize_instruction(instruction, tables)
+        key = self.make_key(intent, tables)
+        now = time.time()
+        with self._lock:
+            existing = self._recipes.get(key)
+            if existing is not None and existing["pinned"] and not existing.get("stale"):
+                return existing  # 已固定的配方不被覆盖
+            recipe = {
+                "id": key[:12],
+                "key": key,
+                "instruction": instruction,
+                "intent": intent,
+                "tables": tables,
+                "code": code,
+                "created": now,
+                "last_used": now,
+                "uses": 0,
+                "failures": 0,
+                "pinned": bool(existing and existing["pinned"]),
+                "stale": False,
+            }
+            self._recipes[key] = recipe
+            self._evict()
+            self._write_index()
+        print(f"📒 [Recipe] 已保存配方 {recipe['id']}: {intent[:40]}")
+        return recipe
+
+    # ---------- 管理 ----------
+    def list(self) -> List[dict]:
+        with self._lock:
+            self._expire()
+            recipes = sorted(self._recipes.values(), key=lambda r: r["last_used"], reverse=True)
+            return [{k: v for k, v in r.items() if k not in ("key", "code")} for r in recipes]
+
+    def get(self, recipe_id: str) -> Optional[dict]:
+        with self._lock:
+            recipe = self._by_id(recipe_id)
+            return dict(recipe) if recipe else None
+
+    def pin(self, recipe_id: str, pinned: bool = True) -> Optional[dict]:
+        with self._lock:
+            recipe = self._by_id(recipe_id)
+            if recipe is None:
+                return None
+            recipe["pinned"] = pinned
+            if pinned:
+                recipe["stale"] = False
+            self._write_index()
+            return dict(recipe)
+
+    def delete(self, recipe_id: str) -> bool:
+        with self._lock:
+            recipe = self._by_id(recipe_id)
+            if recipe is None:
+                return False
+            self._recipes.pop(recipe["key"], None)
+            self._write_index()
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "recipes": len(self._recipes),
+                "pinned": sum(1 for r in self._recipes.values() if r["pinned"]),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    # ---------- 内部 ----------
+    def _by_id(self, recipe_id: str) -> Optional[dict]:
+        for recipe in self._recipes.values():
+            if recipe["id"] == recipe_id:
+                return recipe
+        return None
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        expired = [k for k, r in self._recipes.items() if not r["pinned"] and r["last_used"] < cutoff]
+        for key in expired:
+            self._recipes.pop(key)
+        if expired:
+            self._write_index()
+
+    def _evict(self):
+        unpinned = sorted((r for r in self._recipes.values() if not r["pinned"]), key=lambda r: r["last_used"])
+        overflow = len(self._recipes) - self.max_entries
+        for recipe in unpinned[:max(0, overflow)]:
+            self._recipes.pop(recipe["key"])
+
+    def _read_index(self) -> Dict[str, dict]:
+        try:
+            with open(os.path.join(self.directory, self.INDEX), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        path = os.path.join(self.directory, self.INDEX)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._recipes, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+_store: Optional[RecipeStore] = None
+_store_lock = threading.Lock()
+
+
+def get_recipe_store() -> RecipeStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecipeStore()
+        return _store
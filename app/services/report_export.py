@@ -0,0 +1,384 @@
+# 报表导出：后台任务队列 (可查询进度)；数据未变化时复用上一次的报表；支持 xlsx / Parquet / CSV 压缩包
+import io
+import os
+import re
+import time
+import uuid
+import zipfile
+import hashlib
+import datetime
+import decimal
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional, Tuple
+import pandas as pd
+
+from app.core.config import settings
+from app.utils.tools import AuditLogger
+
+try:
+    import xlsxwriter
+    HAS_XLSXWRITER = True
+except ImportError:
+    HAS_XLSXWRITER = False
+
+try:
+    import pyarrow as pa
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+AUDIT_SHEET = "处理日志(Audit)"
+EXCEL_MAX_ROWS = 1048576
+PROGRESS_EVERY_ROWS = 10000
+# 导出格式 -> 文件名后缀；大表优先 parquet / csv (无需逐单元格编码，生成快得多)
+EXPORT_FORMATS = {"xlsx": ".xlsx", "parquet": "_parquet.zip", "csv": "_csv.zip"}
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+# xlsxwriter 能直接写入的单元格类型，其余 (list/dict 等) 转成字符串
+_CELL_TYPES = (str, int, float, bool, decimal.Decimal,
+               datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+
+ProgressFn = Optional[Callable[[int], None]]
+
+
+# ==========================================
+# 🔑 指纹
+# ==========================================
+def table_fingerprint(df: pd.DataFrame) -> Optional[str]:
+    """按列名、类型和逐行哈希计算表指纹；含不可哈希对象 (list/dict) 时返回 None"""
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False)
+    except TypeError:
+        return None
+    h = hashlib.sha1()
+    h.update(repr(([str(c) for c in df.columns], [str(t) for t in df.dtypes])).encode("utf-8"))
+    h.update(row_hashes.to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def report_fingerprint(tables: Dict[str, pd.DataFrame]) -> Optional[str]:
+    """所有数据表的联合指纹；任意一张表无法计算时返回 None (视为已变化)"""
+    h = hashlib.sha1()
+    for name, df in tables.items():
+        fp = table_fingerprint(df)
+        if fp is None:
+            return None
+        h.update(name.encode("utf-8"))
+        h.update(fp.encode("ascii"))
+    return h.hexdigest()
+
+
+# ==========================================
+# 📝 写入
+# ==========================================
+def report_tables(dfs_context: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """报表包含的数据表 (跳过 __ 开头的系统变量)"""
+    return {name: df for name, df in dfs_context.items()
+            if not name.startswith("__") and isinstance(df, pd.DataFrame)}
+
+
+def _sheet_name(name: str, used: set) -> str:
+    """Excel Sheet 名：去掉非法字符、限制 31 字符、忽略大小写去重"""
+    base = _INVALID_SHEET_CHARS.sub("_", name).strip("'")[:30] or "Sheet"
+    candidate, counter = base, 1
+    while candidate.lower() in used:
+        suffix = f"_{counter}"
+        candidate = f"{base[:30 - len(suffix)]}{suffix}"
+        counter += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def report_sheets(tables: Dict[str, pd.DataFrame], audit: Optional[AuditLogger]) -> List[Tuple[str, pd.DataFrame]]:
+    """按写入顺序列出 (sheet 名, DataFrame)：数据表 → 审计日志 → 剔除数据"""
+    used = set()
+    # 去掉 .xlsx 后缀，直接用文件名，简洁明了
+    sheets = [(_sheet_name(os.path.splitext(name)[0], used), df) for name, df in tables.items()]
+    if audit:
+        log_df = audit.get_log_df()
+        if not log_df.empty:
+            sheets.append((_sheet_name(AUDIT_SHEET, used), log_df))
+        for name, ex_df in audit.excluded_data.items():
+            clean_name = os.path.splitext(name)[0][:10]
+            sheets.append((_sheet_name(f"剔除_{clean_name}", used), ex_df))
+    return sheets
+
+
+def _column_values(s: pd.Series) -> list:
+    """一列转成可直接写入的 Python 值：NaN/NaT → None，时间戳 → datetime (去时区)"""
+    if isinstance(s.dtype, pd.DatetimeTZDtype):
+        s = s.dt.tz_localize(None)
+    values = s.astype(object).where(s.notna(), None).tolist()
+    if s.dtype == object:
+        values = [v if v is None or isinstance(v, _CELL_TYPES) else str(v) for v in values]
+    return values
+
+
+def _write_xlsxwriter(sheets, output_path: str, progress: ProgressFn = None):
+    # constant_memory：按行刷盘，内存占用与表大小无关 (要求严格按行顺序写入)
+    workbook = xlsxwriter.Workbook(output_path, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "nan_inf_to_errors": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    header_fmt = workbook.add_format({"bold": True, "border": 1, "align": "center"})
+    try:
+        for sheet_name, df in sheets:
+            if len(df) + 1 > EXCEL_MAX_ROWS:
+                raise ValueError(f"表 {sheet_name} 共 {len(df)} 行，超出 Excel 单表上限 {EXCEL_MAX_ROWS - 1} 行，"
+                                 f"请改用 parquet 或 csv 格式导出")
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+            columns = [_column_values(df.iloc[:, i]) for i in range(df.shape[1])]
+            for row_idx, row in enumerate(zip(*columns), start=1):
+                worksheet.write_row(row_idx, 0, row)
+                if progress and row_idx % PROGRESS_EVERY_ROWS == 0:
+                    progress(PROGRESS_EVERY_ROWS)
+            if progress:
+                progress(len(df) % PROGRESS_EVERY_ROWS)
+    finally:
+        workbook.close()
+
+
+def _write_pandas(sheets, output_path: str, progress: ProgressFn = None):
+    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            if progress:
+                progress(len(df))
+
+
+def _parquet_ready(df: pd.DataFrame) -> pd.DataFrame:
+    """Parquet 要求列名为字符串；Arrow 无法表示的混合类型 object 列转成字符串"""
+    df = df.rename(columns=str)
+    try:
+        pa.Table.from_pandas(df.head(1000), preserve_index=False)
+        return df
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        mixed = [c for c in df.columns if df[c].dtype == object]
+        return df.astype({c: str for c in mixed})
+
+
+def _write_archive(sheets, output_path: str, fmt: str, progress: ProgressFn = None):
+    """每张表一个文件打包成 zip：parquet 自带压缩，zip 只做容器；csv 用 deflate 压缩"""
+    if fmt == "parquet" and not HAS_ARROW:
+        raise RuntimeError("导出 parquet 需要安装 pyarrow")
+    compression = zipfile.ZIP_STORED if fmt == "parquet" else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(output_path, "w", compression=compression) as zf:
+        for sheet_name, df in sheets:
+            with zf.open(f"{sheet_name}.{fmt}", "w", force_zip64=True) as raw:
+                if fmt == "parquet":
+                    _parquet_ready(df).to_parquet(raw, index=False, compression="zstd")
+                else:
+                    # utf-8-sig：Excel 打开中文 CSV 不乱码
+                    with io.TextIOWrapper(raw, encoding="utf-8-sig", newline="") as text:
+                        df.to_csv(text, index=False)
+            if progress:
+                progress(len(df))
+
+
+def _atomic_write(output_path: str, write: Callable[[str], None]):
+    """先写入临时文件再原子替换，下载方不会读到写了一半的文件"""
+    directory, filename = os.path.split(output_path)
+    tmp_path = os.path.join(directory, f".{filename}")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_full_context_excel(result_df: Optional[pd.DataFrame],
+                            dfs_context: Dict[str, pd.DataFrame],
+                            audit: Optional[AuditLogger],
+                            output_path: str,
+                            progress: ProgressFn = None):
+    """
+    将 【所有当前数据表】 + 【审计日志】 + 【剔除数据】 保存到一个 Excel。
+    直接保存 dfs_context 中的表 (清洗后的版本)，文件名与 Sheet 名一一对应；不单独生成“分析结果”Sheet。
+    """
+    sheets = report_sheets(report_tables(dfs_context), audit)
+    writer = _write_xlsxwriter if HAS_XLSXWRITER else _write_pandas
+    _atomic_write(output_path, lambda path: writer(sheets, path, progress))
+
+
+def save_full_context_archive(dfs_context: Dict[str, pd.DataFrame],
+                              audit: Optional[AuditLogger],
+                              output_path: str,
+                              fmt: str = "parquet",
+                              progress: ProgressFn = None):
+    """与 Excel 报表内容相同，但每张表单独存为 parquet / csv 并打包成 zip (适合大表)"""
+    sheets = report_sheets(report_tables(dfs_context), audit)
+    _atomic_write(output_path, lambda path: _write_archive(sheets, path, fmt, progress))
+
+
+# ==========================================
+# ⏳ 导出任务
+# ==========================================
+class ExportJob:
+    def __init__(self, session_id: str, filename: str, fmt: str, total_rows: int = 0):
+        self.job_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.filename = filename
+        self.format = fmt
+        self.status = "queued"  # queued | running | done | failed
+        self.reused = False
+        self.error = None
+        self.rows_written = 0
+        self.total_rows = total_rows
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def advance(self, rows: int):
+        self.rows_written += rows
+
+    def to_dict(self) -> dict:
+        progress = 1.0 if self.status == "done" else (
+            min(self.rows_written / self.total_rows, 0.99) if self.total_rows else 0.0)
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "format": self.format,
+            "reused": self.reused,
+            "progress": round(progress, 3),
+            "rows_written": self.rows_written,
+            "total_rows": self.total_rows,
+            "download_url": f"/download/{self.filename}" if self.status == "done" else None,
+            "error": self.error,
+            "elapsed_ms": round(((self.finished or time.time()) - self.started) * 1000, 1) if self.started else None,
+        }
+
+
+class ReportExporter:
+    """
+    - 每次导出是一个后台任务 (job_id)，可通过 /jobs/{id} 查询进度，完成后经 /download 下载。
+    - 每个 Session 记录上一次报表的表指纹；数据未变化、格式相同且本轮没有新的审计记录时直接复用旧文件。
+    - 同一 Session 下一轮对话开始前需调用 wait()，避免代码在导出途中原地修改数据表。
+    """
+
+    def __init__(self, output_dir: str, max_workers: Optional[int] = None):
+        self.output_dir = output_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or settings.EXPORT_MAX_WORKERS,
+                                            thread_name_prefix="export")
+        self._jobs: Dict[str, ExportJob] = {}
+        self._pending: Dict[str, Future] = {}  # filename -> 未完成的导出任务
+        self._lock = threading.Lock()
+        self.counters = {"exported": 0, "reused": 0, "failed": 0}
+        self._export_total = 0.0
+
+    def submit(self, session, result_df: Optional[pd.DataFrame], audit: Optional[AuditLogger],
+               fmt: str = "xlsx") -> ExportJob:
+        """提交一次导出，返回任务 (可能直接复用旧文件，状态为 done)"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式 {fmt}，可选: {list(EXPORT_FORMATS)}")
+        tables = report_tables(session.dfs_context)  # 浅拷贝字典，后续增删表不影响本次导出
+        has_audit = audit is not None and bool(audit.logs or audit.excluded_data)
+        fingerprint = report_fingerprint(tables)
+
+        last = session.last_report
+        if (fingerprint is not None and not has_audit and last and last["fingerprint"] == fingerprint
+                and last["format"] == fmt and self.available(last["filename"])):
+            job = ExportJob(session.session_id, last["filename"], fmt)
+            job.reused = True
+            job.status = "done"
+            job.started = job.finished = time.time()
+            with self._lock:
+                self._jobs[job.job_id] = job
+                self.counters["reused"] += 1
+            print(f"♻️ [Export] 数据未变化，复用报表 {last['filename']}")
+            return job
+
+        filename = f"Analysis_Report_{uuid.uuid4().hex[:6]}{EXPORT_FORMATS[fmt]}"
+        total_rows = sum(len(df) for _, df in report_sheets(tables, audit))
+        job = ExportJob(session.session_id, filename, fmt, total_rows=total_rows)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            future = self._executor.submit(self._run, job, result_df, tables, audit)
+            self._pending[filename] = future
+        future.add_done_callback(lambda _: self._done(filename))
+        session.export_future = future
+        session.last_report = {"fingerprint": fingerprint, "filename": filename, "format": fmt}
+        return job
+
+    def _run(self, job: ExportJob, result_df, tables, audit):
+        job.status = "running"
+        job.started = time.time()
+        output_path = os.path.join(self.output_dir, job.filename)
+        try:
+            if job.format == "xlsx":
+                save_full_context_excel(result_df, tables, audit, output_path, progress=job.advance)
+            else:
+                save_full_context_archive(tables, audit, output_path, job.format, progress=job.advance)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            job.finished = time.time()
+            with self._lock:
+                self.counters["failed"] += 1
+            print(f"❌ [Export] 报表导出失败 {job.filename}: {e}")
+            raise
+        job.finished = time.time()
+        job.status = "done"
+        elapsed = job.finished - job.started
+        with self._lock:
+            self.counters["exported"] += 1
+            self._export_total += elapsed
+        print(f"💾 [Export] 报表已生成 {job.filename} ({elapsed * 1000:.0f} ms)")
+
+    def _done(self, filename: str):
+        with self._lock:
+            self._pending.pop(filename, None)
+
+    def job(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self, filename: str) -> Optional[Future]:
+        """正在导出的任务 (已完成或不存在时返回 None)"""
+        with self._lock:
+            return self._pending.get(filename)
+
+    def pending_files(self) -> set:
+        with self._lock:
+            return set(self._pending.keys())
+
+    def available(self, filename: str) -> bool:
+        return self.pending(filename) is not None or os.path.exists(os.path.join(self.output_dir, filename))
+
+    def wait(self, session):
+        """等待该 Session 上一次导出结束 (失败已记录在任务中，这里忽略)"""
+        future = getattr(session, "export_future", None)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                pass
+            session.export_future = None
+
+    def prune_jobs(self, max_age_seconds: int) -> int:
+        """清理结束超过 max_age_seconds 的任务记录"""
+        deadline = time.time() - max_age_seconds
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items() if job.finished and job.finished < deadline]
+            for jid in expired:
+                self._jobs.pop(jid)
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            exported = self.counters["exported"]
+            return {
+                **self.counters,
+                "pending": len(self._pending),
+                "jobs": len(self._jobs),
+                "avg_export_ms": round(self._export_total / exported * 1000, 1) if exported else 0.0,
+                "writer": "xlsxwriter" if HAS_XLSXWRITER else "openpyxl",
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,61 @@
+# 磁盘清理：临时目录 (上传文件、导出报表) 按文件年龄和磁盘配额回收
+import os
+import time
+from typing import Iterable, Optional
+
+
+def enforce_retention(directory: str, max_age_seconds: int, max_bytes: int,
+                      protect: Optional[Iterable[str]] = None) -> dict:
+    """
+    1. 删除修改时间超过 max_age_seconds 的文件 (<=0 表示不按年龄清理)；
+    2. 剩余文件总大小仍超过 max_bytes 时，从最旧的开始删除 (<=0 表示不限配额)。
+    protect 中的文件 (正在写入/正在使用) 不删除；以 . 开头的临时文件只按年龄清理。
+    """
+    protect = set(protect or ())
+    now = time.time()
+    stats = {"files": 0, "bytes": 0, "deleted_age": 0, "deleted_quota": 0, "freed_bytes": 0}
+    files = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return stats
+
+    for entry in entries:
+        if not entry.is_file():
+            continue
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        name = entry.name
+        in_use = name in protect or (name.startswith(".") and name[1:] in protect)
+        if not in_use and max_age_seconds > 0 and now - st.st_mtime > max_age_seconds:
+            if _remove(entry.path):
+                stats["deleted_age"] += 1
+                stats["freed_bytes"] += st.st_size
+            continue
+        files.append((st.st_mtime, st.st_size, entry.path, in_use or name.startswith(".")))
+
+    total = sum(size for _, size, _, _ in files)
+    if max_bytes > 0 and total > max_bytes:
+        for mtime, size, path, keep in sorted(files):
+            if total <= max_bytes:
+                break
+            if keep:
+                continue
+            if _remove(path):
+                total -= size
+                stats["deleted_quota"] += 1
+                stats["freed_bytes"] += size
+
+    stats["files"] = len(files) - stats["deleted_quota"]
+    stats["bytes"] = total
+    return stats
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
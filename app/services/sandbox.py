@@ -0,0 +1,500 @@
+# 沙箱执行：生成代码在预热的独立进程中执行，限制 CPU 时间 / 墙钟时间 / 内存，数据表通过共享内存中的 Arrow IPC 文件传递
+import os
+import math
+import sys
+import time
+import uuid
+import queue
+import pickle
+import signal
+import tempfile
+import threading
+import multiprocessing
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import pandas as pd
+
+from app.core.config import settings
+from app.services.snapshot_store import SnapshotStore, _arrow_compatible
+from app.services.alias_store import NAMESPACE_KEY
+
+try:
+    import pyarrow as pa
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:  # Windows 无 rlimit，只保留墙钟超时
+    HAS_RESOURCE = False
+
+# tmpfs (内存文件系统) 中的文件即共享内存；没有 /dev/shm 时退回临时目录
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHM_PREFIX = "das_sandbox_"
+WORKER_CACHE_TABLES = 16  # 每个 worker 缓存的已解码数据表数量
+WATCHDOG_INTERVAL = 0.2  # 等待结果时检查超时 / 内存的间隔 (秒)
+
+
+# ==========================================
+# 📦 数据表序列化 (Arrow IPC 文件 + memory map)
+# ==========================================
+def write_table(df: pd.DataFrame, directory: str = SHM_DIR) -> dict:
+    """写入共享内存目录，返回引用 {path, format, bytes}。Arrow 无法表示的表退回 pickle。"""
+    base = os.path.join(directory, f"{SHM_PREFIX}{uuid.uuid4().hex}")
+    if HAS_ARROW and _arrow_compatible(df):
+        path = base + ".arrow"
+        try:
+            table = pa.Table.from_pandas(df)
+            # 不压缩：读取端可以直接 memory map，不需要解压
+            with pa.OSFile(path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            return {"path": path, "format": "arrow", "bytes": os.path.getsize(path)}
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            _remove(path)
+    path = base + ".pkl"
+    with open(path, "wb") as f:
+        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"path": path, "format": "pickle", "bytes": os.path.getsize(path)}
+
+
+def read_table(ref: dict) -> pd.DataFrame:
+    if ref["format"] == "arrow":
+        with pa.memory_map(ref["path"]) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    with open(ref["path"], "rb") as f:
+        return pickle.load(f)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SharedTables:
+    """
+    父进程侧的共享表登记：同一个 DataFrame 对象只写一次，所有 worker 共用同一份文件。
+    - 以对象 id 为键并持有强引用 (保证 id 不会被复用)；沙箱模式下数据表只会被整体替换，不会原地修改。
+    - Session 换出 / 过期 / 删除时由 SessionManager 调用 release_tables 释放 (引用与 /dev/shm 文件)。
+    - 总大小超过预算时按最近使用淘汰 (已缓存该表的 worker 不受影响)。
+    - publish 会钉住 (pin) 条目，直到执行结束 unpin：worker 读取文件之前，淘汰和 discard 都不会删除它。
+      单个任务的表加起来超过预算时暂时超出预算，unpin 后再淘汰回预算内。
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, list]" = OrderedDict()  # id -> [df, ref, pins, discarded]
+        self.writes = 0
+        self.reuses = 0
+
+    def publish(self, df: pd.DataFrame) -> dict:
+        """返回共享文件并钉住该条目 (调用方执行结束后必须 unpin)"""
+        key = id(df)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is df and not entry[3]:
+                self._entries.move_to_end(key)
+                entry[2] += 1
+                self.reuses += 1
+                return entry[1]
+        ref = write_table(df)
+        self.adopt(df, ref, pin=True)
+        with self._lock:
+            self.writes += 1
+        return ref
+
+    def adopt(self, df: pd.DataFrame, ref: dict, pin: bool = False):
+        """登记已经写好的文件 (worker 返回的新表直接复用，不再重写)"""
+        with self._lock:
+            old = self._entries.pop(id(df), None)
+            pins = int(pin)
+            if old is not None:
+                # 持有强引用，同一 id 只可能是同一个对象：继承钉住计数，旧文件只有未被钉住时才能删除
+                pins += old[2]
+                if not old[2] and old[1]["path"] != ref["path"]:
+                    _remove(old[1]["path"])
+            self._entries[id(df)] = [df, ref, pins, False]
+            self._evict()
+
+    def unpin(self, dfs):
+        with self._lock:
+            for df in dfs:
+                entry = self._entries.get(id(df))
+                if entry is None or entry[0] is not df or entry[2] == 0:
+                    continue
+                entry[2] -= 1
+                if entry[2] == 0 and entry[3]:
+                    del self._entries[id(df)]
+                    _remove(entry[1]["path"])
+            self._evict()
+
+    def _evict(self):
+        total = sum(entry[1]["bytes"] for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.budget_bytes or len(self._entries) <= 1:
+                break
+            entry = self._entries[key]
+            if entry[2]:
+                continue  # 正在执行的任务还要读取这个文件
+            del self._entries[key]
+            _remove(entry[1]["path"])
+            total -= entry[1]["bytes"]
+
+    def discard(self, df: pd.DataFrame):
+        """表已被新版本替换：释放旧版本的共享文件 (仍被钉住时延迟到 unpin)"""
+        with self._lock:
+            entry = self._entries.get(id(df))
+            if entry is None or entry[0] is not df:
+                return
+            if entry[2]:
+                entry[3] = True
+                return
+            del self._entries[id(df)]
+            _remove(entry[1]["path"])
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(entry[1]["bytes"] for entry in self._entries.values())
+
+    def pinned(self) -> int:
+        with self._lock:
+            return sum(1 for entry in self._entries.values() if entry[2])
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                _remove(entry[1]["path"])
+            self._entries.clear()
+
+
+# ==========================================
+# 🧪 Worker 进程
+# ==========================================
+class CpuLimitExceeded(Exception):
+    pass
+
+
+_cpu_limit = 0  # 当前任务的 CPU 时间配额 (仅用于报错信息)
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded(f"CPU 时间超过限制 ({_cpu_limit} 秒)，请改用向量化写法，避免逐行 apply / 循环")
+
+
+def _cpu_used() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _run_task(task: dict, cache: "OrderedDict[str, pd.DataFrame]", execute) -> dict:
+    global _cpu_limit
+    # 1. 读取输入表 (同一份文件只解码一次)；execute_code 在写时复制视图上运行，不会改动缓存中的表
+    dfs = {}
+    for name, ref in task["tables"].items():
+        df = cache.get(ref["path"])
+        if df is None:
+            df = read_table(ref)
+            cache[ref["path"]] = df
+            while len(cache) > WORKER_CACHE_TABLES:
+                cache.popitem(last=False)
+        cache.move_to_end(ref["path"])
+        dfs[name] = df
+    if task.get("alias_namespace"):
+        dfs[NAMESPACE_KEY] = task["alias_namespace"]
+
+    # 快照目录两边共用：子进程写入的快照由父进程重新读取清单后可见
+    snapshots = SnapshotStore(task["snapshot_dir"]) if task.get("snapshot_dir") else None
+
+    # 2. 执行 (CPU 时间限制：软限制 = 已用 + 配额，超出时内核发送 SIGXCPU)
+    if HAS_RESOURCE and task["cpu_seconds"]:
+        _cpu_limit = task["cpu_seconds"]
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = math.ceil(_cpu_used()) + task["cpu_seconds"]
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    try:
+        result = execute(dfs, task["code"], snapshots=snapshots)
+    finally:
+        if HAS_RESOURCE and task["cpu_seconds"]:
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+    # 3. 只回传发生变化的表 (变化的表由 execute_code 的事务提交结果给出)
+    report = result.get("changed_tables") or {"changed": [], "added": [], "removed": []}
+    changed = {name: write_table(dfs[name]) for name in report["changed"] + report["added"]
+               if isinstance(dfs.get(name), pd.DataFrame)}
+
+    result_ref = write_table(result["result_df"]) if result.get("result_df") is not None else None
+    return {
+        "success": result["success"],
+        "log": result["log"],
+        "log_summary": result.get("log_summary"),
+        "chart_jsons": result["chart_jsons"],
+        "audit_logger": result.get("audit_logger"),
+        "changed": changed,
+        "removed": report["removed"],
+        "changed_tables": report,
+        "result_df": result_ref,
+    }
+
+
+def _worker_main(conn):
+    # 预热：导入执行环境 (pandas / plotly / 工具函数)，之后每次执行不再付出导入开销
+    import plotly.express  # noqa: F401
+    import plotly.graph_objects  # noqa: F401
+    from app.services.workflow import execute_code_local
+
+    if HAS_RESOURCE:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    cache: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+    conn.send({"ready": True})
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        try:
+            reply = _run_task(task, cache, execute_code_local)
+        except Exception as e:
+            reply = {"success": False, "log": f"❌ Runtime Error:\n沙箱内部错误: {e!r}", "chart_jsons": [],
+                     "audit_logger": None, "changed": {}, "removed": [], "result_df": None}
+        conn.send(reply)
+
+
+# ==========================================
+# 🏊 进程池
+# ==========================================
+class SandboxWorker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True, name="sandbox")
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.executions = 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = bool(self.conn.recv().get("ready"))
+        return self.ready
+
+    def rss_bytes(self) -> Optional[int]:
+        """常驻内存 (Linux /proc)；其他平台返回 None"""
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=5)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.kill()
+
+
+class SandboxPool:
+    """
+    - 启动时预热 SANDBOX_WORKERS 个 spawn 进程，每个进程同时只执行一段代码。
+    - 限制：墙钟超时 / 常驻内存由父进程监控，超出时直接终止并补充新进程；CPU 时间由子进程 RLIMIT_CPU 限制。
+    - 数据：输入表写入共享内存 (Arrow IPC)，worker 按文件缓存已解码的表；执行后只回传变化的表，
+      回传文件直接登记为该表的新共享副本，下次执行无需重写。
+    """
+
+    def __init__(self, size: Optional[int] = None, timeout: Optional[float] = None,
+                 cpu_seconds: Optional[int] = None, memory_mb: Optional[int] = None, shm_mb: Optional[int] = None):
+        self.size = size or settings.SANDBOX_WORKERS
+        self.timeout = timeout or settings.SANDBOX_TIMEOUT_SECONDS
+        self.cpu_seconds = settings.SANDBOX_CPU_SECONDS if cpu_seconds is None else cpu_seconds
+        self.memory_bytes = (settings.SANDBOX_MEMORY_MB if memory_mb is None else memory_mb) * 1024 * 1024
+        self.tables = SharedTables((settings.SANDBOX_SHM_MB if shm_mb is None else shm_mb) * 1024 * 1024)
+        # spawn 避免在多线程的服务进程中 fork
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[SandboxWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.executions = 0
+        self.timeouts = 0
+        self.memory_kills = 0
+        self.crashes = 0
+        self._total_ms = 0.0
+        for _ in range(self.size):
+            self._idle.put(SandboxWorker(self._ctx))
+
+    def _replace(self, worker: SandboxWorker) -> SandboxWorker:
+        worker.kill()
+        return SandboxWorker(self._ctx)
+
+    def _failure(self, message: str, dfs: dict) -> dict:
+        return {"success": False, "dfs": dfs, "chart_jsons": [], "result_df": None, "audit_logger": None,
+                "log": f"❌ Runtime Error:\n{message}"}
+
+    def execute(self, dfs: Dict[str, pd.DataFrame], code: str, snapshots=None) -> dict:
+        """与 execute_code 返回相同的结构；变化的表直接写回 dfs (执行失败时子进程不会提交任何变化)"""
+        started = time.perf_counter()
+        # 输入表在整个往返期间保持钉住：排队等 worker 时其他 Session 的写入不会把它们淘汰掉
+        pinned = []
+        try:
+            refs = {}
+            for name, df in dfs.items():
+                if not name.startswith("__") and isinstance(df, pd.DataFrame):
+                    refs[name] = self.tables.publish(df)
+                    pinned.append(df)
+            task = {
+                "tables": refs,
+                "code": code,
+                "snapshot_dir": os.path.abspath(snapshots.directory) if snapshots is not None else None,
+                "cpu_seconds": self.cpu_seconds,
+                "alias_namespace": dfs.get(NAMESPACE_KEY),
+            }
+
+            worker = self._idle.get()
+            try:
+                reply, worker = self._roundtrip(worker, task, dfs)
+            finally:
+                if self._closed:
+                    worker.stop()
+                else:
+                    self._idle.put(worker)
+        finally:
+            self.tables.unpin(pinned)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.executions += 1
+            self._total_ms += elapsed_ms
+        if "dfs" in reply:  # 失败结果已是最终结构
+            return reply
+
+        for name, ref in reply["changed"].items():
+            df = read_table(ref)
+            if name in dfs:
+                self.tables.discard(dfs[name])
+            dfs[name] = df
+            self.tables.adopt(df, ref)
+        for name in reply["removed"]:
+            if name in dfs:
+                self.tables.discard(dfs.pop(name))
+        result_df = None
+        if reply["result_df"] is not None:
+            result_df = read_table(reply["result_df"])
+            _remove(reply["result_df"]["path"])
+        if snapshots is not None:
+            snapshots.reload()
+        return {
+            "success": reply["success"],
+            "dfs": dfs,
+            "chart_jsons": reply["chart_jsons"],
+            "result_df": result_df,
+            "audit_logger": reply["audit_logger"],
+            "log": reply["log"],
+            "log_summary": reply.get("log_summary"),
+            "changed_tables": reply.get("changed_tables"),
+        }
+
+    def _roundtrip(self, worker: SandboxWorker, task: dict, dfs: dict):
+        """发送任务并等待结果；超时、超内存或进程崩溃时终止并替换 worker"""
+        deadline = time.monotonic() + self.timeout
+        try:
+            if not worker.wait_ready(max(0.0, deadline - time.monotonic())):
+                raise EOFError("worker 启动超时")
+            worker.conn.send(task)
+            while not worker.conn.poll(WATCHDOG_INTERVAL):
+                # 进程已退出但管道尚未关闭时 poll 仍返回 False，需要主动检查
+                if not worker.process.is_alive():
+                    raise EOFError(f"exit code {worker.process.exitcode}")
+                if time.monotonic() > deadline:
+                    with self._lock:
+                        self.timeouts += 1
+                    print(f"⏱️ [Sandbox] 执行超过 {self.timeout:.0f} 秒，终止 worker")
+                    return self._failure(f"执行超时 (超过 {self.timeout:.0f} 秒被终止)，请改用向量化写法，避免逐行循环",
+                                         dfs), self._replace(worker)
+                rss = worker.rss_bytes()
+                if self.memory_bytes and rss is not None and rss > self.memory_bytes:
+                    with self._lock:
+                        self.memory_kills += 1
+                    print(f"💥 [Sandbox] 内存 {rss / 1024 / 1024:.0f} MB 超过限制，终止 worker")
+                    return self._failure(f"内存超过限制 ({self.memory_bytes // 1024 // 1024} MB)，请避免生成超大中间表 "
+                                         f"(如笛卡尔积合并)", dfs), self._replace(worker)
+            reply = worker.conn.recv()
+            worker.executions += 1
+            return reply, worker
+        except (EOFError, OSError, pickle.PicklingError) as e:
+            with self._lock:
+                self.crashes += 1
+            worker.process.join(timeout=1)
+            detail = str(e) or f"exit code {worker.process.exitcode}"
+            print(f"💥 [Sandbox] worker 异常: {detail}")
+            return self._failure(f"执行进程异常退出 ({detail})，可能是代码调用了 os._exit / 触发了底层崩溃", dfs), \
+                self._replace(worker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.size,
+                "idle": self._idle.qsize(),
+                "executions": self.executions,
+                "avg_ms": round(self._total_ms / self.executions, 1) if self.executions else 0.0,
+                "timeouts": self.timeouts,
+                "memory_kills": self.memory_kills,
+                "crashes": self.crashes,
+                "shared_tables_mb": round(self.tables.nbytes() / 1024 / 1024, 1),
+                "shared_pinned": self.tables.pinned(),
+                "shared_writes": self.tables.writes,
+                "shared_reuses": self.tables.reuses,
+            }
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+        self.tables.clear()
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+        return _pool
+
+
+def release_tables(tables):
+    """Session 被换出 / 过期 / 删除时释放其数据表的共享文件和引用 (进程池未启动时什么都不做)"""
+    pool = _pool
+    if pool is None:
+        return
+    for df in tables:
+        if isinstance(df, pd.DataFrame):
+            pool.tables.discard(df)
+
+
+def shutdown_sandbox_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,177 @@
+# 表结构画像：为代码生成节点提供精简的 Schema 上下文；按表版本缓存，只在表变化时重算，并按 Token 预算裁剪
+import io
+import hashlib
+import threading
+from typing import Dict, List, Optional
+import pandas as pd
+
+from app.core.config import settings
+from app.utils.tokens import estimate_tokens
+
+VERSION_SAMPLE_ROWS = 1000  # 计算版本号时等距抽样的行数
+HEAD_ROWS = 3
+HEAD_MAX_COLUMNS = 12
+MAX_VALUE_CHARS = 24
+MIN_TABLE_TOKENS = 200  # 表很多时每张表至少保留的预算
+
+
+def table_version(df: pd.DataFrame) -> str:
+    """
+    廉价的表版本号：对象 id + 形状 + 列名/类型 + 前几行和等距抽样行的哈希。
+    开销与表大小基本无关；抽样之外的原地修改可能漏检，只影响统计值，列名和类型始终准确。
+    """
+    step = max(1, len(df) // VERSION_SAMPLE_ROWS)
+    sample = pd.concat([df.head(HEAD_ROWS), df.iloc[::step]])
+    h = hashlib.sha1()
+    h.update(repr((id(df), df.shape, [str(c) for c in df.columns], [str(t) for t in df.dtypes])).encode("utf-8"))
+    try:
+        row_hashes = pd.util.hash_pandas_object(sample, index=False)
+    except TypeError:
+        row_hashes = pd.util.hash_pandas_object(sample.astype(str), index=False)
+    h.update(row_hashes.to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def legacy_schema(name: str, df: pd.DataFrame) -> str:
+    """旧版 Schema 文本 (df.info + head)，仅供基准脚本统计裁剪前的 Token 数"""
+    buffer = io.StringIO()
+    df.info(buf=buffer)
+    return f"\n=== File: {name} ===\n[Info]:\n{buffer.getvalue()}\n[Head (First 5 rows)]:\n{df.head().to_string()}\n"
+
+
+def _fmt(value) -> str:
+    text = f"{value:.6g}" if isinstance(value, float) else str(value).replace("\n", " ")
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 1] + "…"
+
+
+def _column_line(name, s: pd.Series) -> str:
+    """单列画像：类型、非空数，以及数值范围 / 时间范围 / 唯一值与示例"""
+    total = len(s)
+    values = s.dropna()
+    head = f"- {name} ({s.dtype}, 非空 {len(values)}/{total}"
+    if values.empty:
+        return head + ")"
+    if pd.api.types.is_bool_dtype(s):
+        return head + f", True {int(values.sum())} 个)"
+    if pd.api.types.is_numeric_dtype(s):
+        return head + f", 范围 {_fmt(values.min())} ~ {_fmt(values.max())}, 均值 {values.mean():.6g})"
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return head + f", 范围 {values.min()} ~ {values.max()})"
+
+    # 文本 / 混合类型列：提示混合类型 (生成代码时需先 astype(str))
+    kinds = sorted({type(v).__name__ for v in values.head(VERSION_SAMPLE_ROWS)})
+    mixed = f", 混合类型 {'/'.join(kinds)}" if len(kinds) > 1 else ""
+    try:
+        unique = values.nunique()
+    except TypeError:
+        unique = None
+    if unique is not None and unique <= 50:
+        examples = values.astype(str).value_counts().head(3).index
+    else:
+        examples = values.astype(str).drop_duplicates().head(3)
+    unique_str = f", 唯一值 {unique}" if unique is not None else ""
+    return head + f"{mixed}{unique_str}, 示例: {', '.join(_fmt(v) for v in examples)})"
+
+
+class TableProfile:
+    def __init__(self, name: str, df: pd.DataFrame, version: str):
+        self.version = version
+        self.header = f"\n=== File: {name} ({len(df)} 行 × {df.shape[1]} 列) ==="
+        self.column_lines = [_column_line(col, df.iloc[:, i]) for i, col in enumerate(df.columns)]
+        self.column_names = [(str(col), str(dtype)) for col, dtype in zip(df.columns, df.dtypes)]
+        head = df.iloc[:HEAD_ROWS, :HEAD_MAX_COLUMNS].astype(str).apply(lambda col: col.map(_fmt))
+        self.head_text = f"[Head (First {HEAD_ROWS} rows)]:\n{head.to_string(index=False)}"
+
+    def render(self, table_name: str, budget: int) -> str:
+        """
+        按预算输出：列画像 → 其余列只列列名 → 前几行示例；放不下的部分给出提示。
+        宽表优先保证所有列名可见：为后面的列名预留预算后，才给前面的列输出画像。
+        """
+        lines = [self.header]
+        used = estimate_tokens(self.header)
+        name_costs = [estimate_tokens(col) + 1 for col, _ in self.column_names]
+        names_left = sum(name_costs)
+
+        detailed = 0
+        for line, name_cost in zip(self.column_lines, name_costs):
+            cost = estimate_tokens(line)
+            names_left -= name_cost
+            if used + cost + names_left > budget and detailed > 0:
+                break
+            lines.append(line)
+            used += cost
+            detailed += 1
+
+        rest = self.column_names[detailed:]
+        if rest:
+            shown = []
+            for (col, dtype), cost in zip(rest, name_costs[detailed:]):
+                if used + cost > budget:
+                    break
+                shown.append((col, dtype))
+                used += cost
+            if shown:
+                # 按类型分组列出，避免每列重复类型名
+                groups: Dict[str, List[str]] = {}
+                for col, dtype in shown:
+                    groups.setdefault(dtype, []).append(col)
+                grouped = "; ".join(f"{dtype}: {', '.join(cols)}" for dtype, cols in groups.items())
+                lines.append(f"- 其余列 (仅列名) {grouped}")
+            if len(shown) < len(rest):
+                lines.append(f"- ... 另有 {len(rest) - len(shown)} 列未展示，可用 dfs['{table_name}'].columns 查看")
+
+        head_cost = estimate_tokens(self.head_text)
+        if used + head_cost <= budget:
+            lines.append(self.head_text)
+        return "\n".join(lines) + "\n"
+
+
+class SchemaProfiler:
+    """
+    - 每张表的画像按 table_version 缓存，表未变化时 (包括自愈重试) 直接复用。
+    - 总预算 SCHEMA_TOKEN_BUDGET 在各表之间平分；宽表优先保留列画像，其次列名，最后示例行。
+    """
+
+    def __init__(self, token_budget: Optional[int] = None):
+        self.token_budget = token_budget or settings.SCHEMA_TOKEN_BUDGET
+        self._profiles: Dict[str, TableProfile] = {}
+        self._lock = threading.Lock()  # 投机代码生成时可能在另一线程中渲染
+        self.hits = 0
+        self.misses = 0
+
+    def profile(self, name: str, df: pd.DataFrame) -> TableProfile:
+        version = table_version(df)
+        cached = self._profiles.get(name)
+        if cached is not None and cached.version == version:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        profile = TableProfile(name, df, version)
+        self._profiles[name] = profile
+        return profile
+
+    def render(self, dfs: Dict[str, pd.DataFrame]) -> str:
+        with self._lock:
+            return self._render(dfs)
+
+    def _render(self, dfs: Dict[str, pd.DataFrame]) -> str:
+        tables = [(name, df) for name, df in dfs.items()
+                  if not name.startswith("__") and isinstance(df, pd.DataFrame)]
+        # 已删除的表不再保留画像
+        for stale in set(self._profiles) - {name for name, _ in tables}:
+            self._profiles.pop(stale)
+        if not tables:
+            return ""
+
+        hits_before = self.hits
+        per_table = max(MIN_TABLE_TOKENS, self.token_budget // len(tables))
+        profiles = [(name, self.profile(name, df)) for name, df in tables]
+        schema = "".join(profile.render(name, per_table) for name, profile in profiles)
+
+        # 与旧版 df.info() + head 的 Token 对比见 benchmarks/bench_schema_profile.py (运行时不再重复计算旧版 Schema)
+        print(f"📐 [Schema] {len(tables)} 张表, 缓存命中 {self.hits - hits_before}/{len(tables)}, "
+              f"Token {estimate_tokens(schema)} (预算 {self.token_budget})")
+        return schema
+
+    def stats(self) -> dict:
+        return {"tables": len(self._profiles), "hits": self.hits, "misses": self.misses}
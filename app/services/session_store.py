@@ -0,0 +1,262 @@
+# Session 管理：TTL 过期 + 内存预算下的 LRU 换出 (落盘) + 下次访问时透明恢复
+import os
+import time
+import json
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from typing import Dict, Optional
+import pandas as pd
+
+from app.core.config import settings
+from app.services.snapshot_store import SnapshotStore
+from app.services.workflow import create_workflow
+from app.services.sandbox import release_tables
+from app.services.alias_store import NAMESPACE_KEY
+
+# 换出时数据表写入快照的版本名 (与用户的命名快照区分)
+RESIDENT_VERSION = "__resident__"
+SPILL_META = "spilled_tables.json"
+
+
+class SessionData:
+    def __init__(self, session_id: str, snapshot_root: Optional[str] = None):
+        self.session_id = session_id
+        self.dfs_context = {}  # 存放 DataFrames
+        self.workflow_app = None # 编译好的 Graph
+        self.snapshots = SnapshotStore(os.path.join(snapshot_root or settings.SNAPSHOT_DIR, session_id)) # 数据快照 (磁盘)
+        self.last_access = time.time()
+        self.memory_bytes = 0
+        self.busy = 0  # 正在处理的请求数，>0 时不会被换出或过期
+        self.last_report = None  # 上一次导出的报表 {fingerprint, filename}
+        self.export_future = None  # 正在后台导出的报表任务
+        self.alias_namespace: Optional[str] = None  # 实体别名库的租户命名空间 (换出时写入元数据，恢复后保持不变)
+
+    def set_alias_namespace(self, namespace: Optional[str]):
+        """记录租户命名空间，并放入 dfs_context 供执行环境中的 smart_merge 读取"""
+        self.alias_namespace = namespace
+        if namespace:
+            self.dfs_context[NAMESPACE_KEY] = namespace
+        else:
+            self.dfs_context.pop(NAMESPACE_KEY, None)
+
+    def touch(self):
+        self.last_access = time.time()
+
+    def refresh_footprint(self) -> int:
+        """重新统计该 Session 持有的 DataFrame 内存 (deep=True 计入字符串实际占用)"""
+        self.memory_bytes = int(sum(
+            df.memory_usage(deep=True).sum()
+            for df in self.dfs_context.values() if isinstance(df, pd.DataFrame)
+        ))
+        return self.memory_bytes
+
+    def rebuild_workflow(self):
+        self.workflow_app = create_workflow(self.dfs_context, self.snapshots)
+
+
+class SessionManager:
+    """
+    - 活跃 Session 保存在 OrderedDict 中，按访问顺序排列 (末尾为最近使用)。
+    - 空闲超过 TTL 的 Session 被彻底清理 (包括磁盘快照)。
+    - 内存总量超过预算时，把最久未使用的 Session 换出到磁盘 (复用 SnapshotStore)，
+      下次请求该 Session 时自动读回并重建 Graph。
+    - 全局锁只保护字典操作：换出 / 恢复 / 删除的磁盘 I/O 在锁外进行。进行中的 Session 登记在 _transit 中，
+      同一 Session 的并发请求等待其 Event，其他 Session 的请求不受影响。
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None, memory_budget_bytes: Optional[int] = None,
+                 snapshot_root: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.SESSION_TTL_SECONDS
+        self.memory_budget_bytes = (memory_budget_bytes if memory_budget_bytes is not None
+                                    else settings.SESSION_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.snapshot_root = snapshot_root or settings.SNAPSHOT_DIR
+        self._active: "OrderedDict[str, SessionData]" = OrderedDict()
+        self._evicted: Dict[str, float] = {}  # session_id -> 最后访问时间
+        self._transit: Dict[str, threading.Event] = {}  # 正在换出 / 恢复 / 删除的 Session
+        self._lock = threading.RLock()
+        self.counters = {"created": 0, "expired": 0, "evicted": 0, "rehydrated": 0}
+
+    # ---------- 访问 ----------
+    def get(self, session_id: str, acquire: bool = False) -> Optional[SessionData]:
+        """获取 Session；已换出的会被透明恢复；不存在或已过期返回 None。acquire=True 时同时占用 (busy += 1)"""
+        self.sweep()
+        return self._acquire(session_id, create=False, acquire=acquire)
+
+    def get_or_create(self, session_id: str, acquire: bool = False) -> SessionData:
+        self.sweep()
+        return self._acquire(session_id, create=True, acquire=acquire)
+
+    def _acquire(self, session_id: str, create: bool, acquire: bool) -> Optional[SessionData]:
+        while True:
+            with self._lock:
+                pending = self._transit.get(session_id)
+                if pending is None:
+                    session = self._active.get(session_id)
+                    if session is None and session_id not in self._evicted:
+                        if not create:
+                            return None
+                        session = SessionData(session_id, self.snapshot_root)
+                        self._active[session_id] = session
+                        self.counters["created"] += 1
+                    if session is not None:
+                        self._active.move_to_end(session_id)
+                        session.touch()
+                        if acquire:
+                            session.busy += 1
+                        return session
+                    # 已换出：登记恢复中，磁盘读取在锁外进行
+                    last_access = self._evicted.pop(session_id)
+                    done = self._transit[session_id] = threading.Event()
+                    break
+            pending.wait()  # 同一 Session 正在换出 / 恢复 / 删除，完成后重新判断
+
+        try:
+            session = self._rehydrate(session_id)
+        except Exception:
+            with self._lock:
+                self._evicted[session_id] = last_access
+                self._transit.pop(session_id, None)
+            done.set()
+            raise
+        with self._lock:
+            self._active[session_id] = session
+            self.counters["rehydrated"] += 1
+            session.touch()
+            if acquire:
+                session.busy += 1
+            self._transit.pop(session_id, None)
+        done.set()
+        return session
+
+    @contextmanager
+    def use(self, session_id: str, create: bool = False):
+        """
+        请求期间占用 Session：期间不会被换出/过期；结束后刷新内存统计并检查预算。
+        Session 不存在 (且 create=False) 时产出 None。
+        """
+        session = (self.get_or_create(session_id, acquire=True) if create
+                   else self.get(session_id, acquire=True))
+        try:
+            yield session
+        finally:
+            if session is not None:
+                session.refresh_footprint()
+                with self._lock:
+                    session.busy -= 1
+                    session.touch()
+                self.enforce_budget(keep=session_id)
+
+    # ---------- 回收 ----------
+    def sweep(self):
+        """清理空闲超过 TTL 的 Session (活跃的和已换出的都算)"""
+        if self.ttl_seconds <= 0:
+            return
+        deadline = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [sid for sid, s in self._active.items() if s.last_access < deadline and not s.busy]
+            expired += [sid for sid, ts in self._evicted.items() if ts < deadline]
+            claimed = [(sid, self._claim_removal(sid)) for sid in expired]
+            self.counters["expired"] += len(claimed)
+        for sid, (session, done) in claimed:
+            self._destroy(sid, session, done)
+
+    def enforce_budget(self, keep: Optional[str] = None):
+        """内存超预算时按 LRU 换出，直到回到预算内；keep 指定的 Session (当前请求) 不换出"""
+        victims = []
+        with self._lock:
+            total = sum(s.memory_bytes for s in self._active.values())
+            for sid in list(self._active.keys()):
+                if total <= self.memory_budget_bytes:
+                    break
+                if sid == keep or self._active[sid].busy:
+                    continue
+                total -= self._active[sid].memory_bytes
+                victims.append((self._active.pop(sid), self._transit.setdefault(sid, threading.Event())))
+        for session, done in victims:
+            try:
+                self._spill(session)
+            except Exception as e:
+                print(f"⚠️ [Session] 换出 Session {session.session_id} 失败，保留在内存中: {e}")
+                with self._lock:
+                    self._active[session.session_id] = session
+                    self._transit.pop(session.session_id, None)
+                done.set()
+                continue
+            with self._lock:
+                self._evicted[session.session_id] = session.last_access
+                self.counters["evicted"] += 1
+                self._transit.pop(session.session_id, None)
+            done.set()
+
+    def remove(self, session_id: str):
+        with self._lock:
+            if session_id not in self._active and session_id not in self._evicted:
+                return
+            session, done = self._claim_removal(session_id)
+        self._destroy(session_id, session, done)
+
+    def _claim_removal(self, session_id: str):
+        """锁内调用：从字典中移除并登记删除中 (同一 Session 的新请求等删除完成后再重新创建)"""
+        session = self._active.pop(session_id, None)
+        self._evicted.pop(session_id, None)
+        return session, self._transit.setdefault(session_id, threading.Event())
+
+    def _destroy(self, session_id: str, session: Optional[SessionData], done: threading.Event):
+        try:
+            if session is not None:
+                release_tables(session.dfs_context.values())
+                session.snapshots.destroy()
+            else:
+                SnapshotStore(os.path.join(self.snapshot_root, session_id)).destroy()
+        finally:
+            with self._lock:
+                self._transit.pop(session_id, None)
+            done.set()
+
+    # ---------- 换出 / 恢复 (在锁外执行，调用方已登记 _transit) ----------
+    def _spill(self, session: SessionData):
+        tables = [name for name, df in session.dfs_context.items()
+                  if not name.startswith("__") and isinstance(df, pd.DataFrame)]
+        for name in tables:
+            session.snapshots.save(name, session.dfs_context[name], RESIDENT_VERSION)
+        with open(os.path.join(session.snapshots.directory, SPILL_META), "w", encoding="utf-8") as f:
+            json.dump({"tables": tables, "alias_namespace": session.alias_namespace}, f, ensure_ascii=False)
+        # 沙箱共享表持有 DataFrame 的强引用：不释放的话换出后内存并不会下降
+        release_tables(session.dfs_context.values())
+        print(f"💤 [Session] 内存超预算，换出 Session {session.session_id} ({session.memory_bytes / 1024 / 1024:.1f} MB)")
+
+    def _rehydrate(self, session_id: str) -> SessionData:
+        session = SessionData(session_id, self.snapshot_root)
+        meta_path = os.path.join(session.snapshots.directory, SPILL_META)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if isinstance(meta, list):  # 旧版元数据只有表名列表
+            meta = {"tables": meta}
+        session.set_alias_namespace(meta.get("alias_namespace"))
+        for name in meta["tables"]:
+            session.dfs_context[name] = session.snapshots.load(name, RESIDENT_VERSION)
+            session.snapshots.delete(name, RESIDENT_VERSION)
+        os.remove(meta_path)
+        session.refresh_footprint()
+        session.rebuild_workflow()
+        print(f"♻️ [Session] 已恢复换出的 Session {session_id}")
+        return session
+
+    # ---------- 统计 ----------
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "active_sessions": len(self._active),
+                "evicted_sessions": len(self._evicted),
+                "in_transit": len(self._transit),
+                "bytes_in_memory": sum(s.memory_bytes for s in self._active.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                **self.counters,
+                "sessions": [
+                    {"session_id": sid, "bytes": s.memory_bytes, "idle_seconds": round(now - s.last_access, 1)}
+                    for sid, s in self._active.items()
+                ],
+            }
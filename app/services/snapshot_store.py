@@ -0,0 +1,166 @@
+# 表快照存储：备份写入磁盘上的压缩列式文件 (Arrow IPC)，需要时再懒加载恢复，不常驻内存
+import os
+import json
+import time
+import shutil
+import hashlib
+from typing import Dict, List, Optional
+import pandas as pd
+
+from app.core.config import settings
+
+try:
+    import pyarrow as pa
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+
+class SnapshotStore:
+    """
+    按 (表名, 版本名) 管理快照。
+    - 首选 Arrow IPC 文件 (默认 zstd 压缩)，恢复时通过 memory map 读取；
+      设置 SNAPSHOT_COMPRESSION=uncompressed 时可做到零拷贝映射。
+    - Arrow 无法表示的表 (混合类型 object 列、非字符串列名等) 退回压缩 pickle。
+    - 清单 (manifest.json) 与数据文件同目录，进程重启或 Session 换出后可直接重建。
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, directory: str, compression: Optional[str] = None):
+        self.directory = directory
+        self.compression = compression or settings.SNAPSHOT_COMPRESSION
+        os.makedirs(directory, exist_ok=True)
+        self._manifest: Dict[str, List[dict]] = self._read_manifest()
+
+    # ---------- 写入 ----------
+    def save(self, table: str, df: pd.DataFrame, version: Optional[str] = None) -> str:
+        """写入一个版本，返回版本名。同名版本会被覆盖。"""
+        versions = self._manifest.setdefault(table, [])
+        version = version or f"v{len(versions) + 1}"
+        base = os.path.join(self.directory, f"{_safe_name(table)}__{_safe_name(version)}")
+
+        fmt = "arrow" if HAS_ARROW and _arrow_compatible(df) else "pickle"
+        if fmt == "arrow":
+            try:
+                path = base + ".arrow"
+                self._write_arrow(df, path)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                if os.path.exists(path):
+                    os.remove(path)
+                fmt = "pickle"
+        if fmt == "pickle":
+            path = base + ".pkl.gz"
+            df.to_pickle(path, compression="gzip")
+
+        versions[:] = [v for v in versions if v["version"] != version]
+        versions.append({
+            "version": version,
+            "file": os.path.basename(path),
+            "format": fmt,
+            "rows": len(df),
+            "bytes": os.path.getsize(path),
+            "created": time.time(),
+        })
+        self._write_manifest()
+        return version
+
+    def _write_arrow(self, df: pd.DataFrame, path: str):
+        table = pa.Table.from_pandas(df)
+        compression = None if self.compression == "uncompressed" else self.compression
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+
+    # ---------- 读取 ----------
+    def load(self, table: str, version: Optional[str] = None) -> pd.DataFrame:
+        """恢复指定版本 (默认最新)。找不到时抛出 KeyError。"""
+        entry = self._find(table, version)
+        path = os.path.join(self.directory, entry["file"])
+        if entry["format"] == "arrow":
+            with pa.memory_map(path) as source:
+                return pa.ipc.open_file(source).read_all().to_pandas()
+        return pd.read_pickle(path, compression="gzip")
+
+    def _find(self, table: str, version: Optional[str]) -> dict:
+        versions = self._manifest.get(table)
+        if not versions:
+            raise KeyError(f"没有表 {table} 的快照")
+        if version is None:
+            return versions[-1]
+        for entry in versions:
+            if entry["version"] == version:
+                return entry
+        raise KeyError(f"表 {table} 没有版本 {version}，可选: {[v['version'] for v in versions]}")
+
+    def has(self, table: str, version: Optional[str] = None) -> bool:
+        try:
+            self._find(table, version)
+            return True
+        except KeyError:
+            return False
+
+    def versions(self, table: str) -> List[str]:
+        return [v["version"] for v in self._manifest.get(table, [])]
+
+    def tables(self) -> List[str]:
+        return list(self._manifest.keys())
+
+    def nbytes(self) -> int:
+        return sum(v["bytes"] for versions in self._manifest.values() for v in versions)
+
+    # ---------- 清理 ----------
+    def delete(self, table: str, version: Optional[str] = None):
+        """删除某张表的一个版本；不传版本则删除该表全部快照"""
+        versions = self._manifest.get(table, [])
+        targets = [v for v in versions if version is None or v["version"] == version]
+        for entry in targets:
+            try:
+                os.remove(os.path.join(self.directory, entry["file"]))
+            except OSError:
+                pass
+        remaining = [v for v in versions if v not in targets]
+        if remaining:
+            self._manifest[table] = remaining
+        else:
+            self._manifest.pop(table, None)
+        self._write_manifest()
+
+    def destroy(self):
+        """删除整个快照目录 (Session 结束时调用)"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._manifest = {}
+
+    # ---------- 清单 ----------
+    def reload(self):
+        """重新读取清单 (其他进程写入快照后调用)"""
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self) -> Dict[str, List[dict]]:
+        try:
+            with open(os.path.join(self.directory, self.MANIFEST), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, self.MANIFEST)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def _safe_name(name: str) -> str:
+    """文件名安全化：保留可读前缀 + 短哈希防冲突"""
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    prefix = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)[:40]
+    return f"{prefix}_{digest}"
+
+
+def _arrow_compatible(df: pd.DataFrame) -> bool:
+    """Arrow 要求列名为字符串且唯一，否则无法原样还原"""
+    return (not isinstance(df.columns, pd.MultiIndex)
+            and df.columns.is_unique
+            and all(isinstance(c, str) for c in df.columns))
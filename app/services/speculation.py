@@ -0,0 +1,163 @@
+# 投机代码生成：supervisor 调用 LLM 路由的同时提前生成 worker 代码，路由一致时直接采用，否则丢弃
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+LATENCY_WINDOW = 1000  # 计算 p50/p95 时保留的最近样本数
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.SPECULATIVE_MAX_WORKERS,
+                                           thread_name_prefix="speculate")
+        return _executor
+
+
+def shutdown_speculation():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class SpeculationStats:
+    """
+    命中 = 路由结果为 python_worker 且采用了提前生成的代码；未命中 = 路由到其他节点，生成结果被丢弃。
+    节省耗时 = 代码生成耗时 - 采用时仍需等待的时间 (即与路由重叠的部分)。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.failed = 0
+        self._saved_ms = deque(maxlen=LATENCY_WINDOW)
+        self._wasted_ms = 0.0
+
+    def record_start(self):
+        with self._lock:
+            self.started += 1
+
+    def record_hit(self, saved_ms: float):
+        with self._lock:
+            self.hits += 1
+            self._saved_ms.append(saved_ms)
+
+    def record_miss(self, wasted_ms: float = 0.0):
+        with self._lock:
+            self.misses += 1
+            self._wasted_ms += wasted_ms
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            resolved = self.hits + self.misses
+            saved = list(self._saved_ms)
+            return {
+                "enabled": settings.SPECULATIVE_CODEGEN,
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "failed": self.failed,
+                "hit_rate": round(self.hits / resolved, 3) if resolved else 0.0,
+                "saved_ms_p50": round(_percentile(saved, 0.5), 1),
+                "saved_ms_p95": round(_percentile(saved, 0.95), 1),
+                "saved_ms_total": round(sum(saved), 1),
+                "wasted_ms_total": round(self._wasted_ms, 1),
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+class SpeculativeCodegen:
+    """
+    单个工作流 (即单个会话) 内最多一个进行中的投机任务。
+    会话内的请求由 SessionTaskRunner 串行执行，因此这里只需保护 start/take 之间的交接。
+    """
+
+    def __init__(self, stats: Optional[SpeculationStats] = None):
+        self.stats = stats or speculation_stats
+        self._lock = threading.Lock()
+        self._pending: Optional[tuple] = None  # (instruction, future)
+
+    def start(self, instruction: str, fn: Callable[[], dict]):
+        """提交代码生成任务；fn 的返回值即 python_worker 节点的状态更新"""
+        def timed():
+            started = time.perf_counter()
+            result = fn()
+            return result, (time.perf_counter() - started) * 1000
+
+        self.discard()
+        future = _get_executor().submit(timed)
+        with self._lock:
+            self._pending = (instruction, future)
+        self.stats.record_start()
+        print(f"🔮 [Speculate] 路由同时预生成代码: {instruction[:30]}")
+
+    def take(self, instruction: str) -> Optional[dict]:
+        """路由确认走 python_worker 后取回预生成结果；指令不一致或生成失败时返回 None (照常生成)"""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return None
+        spec_instruction, future = pending
+        if spec_instruction != instruction:
+            self._drop(future)
+            return None
+
+        waited_from = time.perf_counter()
+        try:
+            result, gen_ms = future.result()
+        except Exception as e:
+            print(f"⚠️ [Speculate] 预生成失败，改为正常生成: {e}")
+            self.stats.record_failure()
+            return None
+        wait_ms = (time.perf_counter() - waited_from) * 1000
+        saved_ms = max(0.0, gen_ms - wait_ms)
+        self.stats.record_hit(saved_ms)
+        print(f"🔮 [Speculate] 命中，采用预生成代码 (生成 {gen_ms:.0f} ms, 等待 {wait_ms:.0f} ms, 节省 {saved_ms:.0f} ms)")
+        return result
+
+    def discard(self):
+        """路由未选择 python_worker：丢弃预生成结果"""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._drop(pending[1])
+            print("🔮 [Speculate] 路由未选择 python_worker，丢弃预生成代码")
+
+    def _drop(self, future: Future):
+        if future.cancel():
+            self.stats.record_miss()
+            return
+
+        def on_done(f: Future):
+            # 已经开始的 LLM 调用无法中断，完成后只计入浪费的耗时
+            try:
+                self.stats.record_miss(f.result()[1])
+            except Exception:
+                self.stats.record_failure()
+
+        future.add_done_callback(on_done)
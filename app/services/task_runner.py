@@ -0,0 +1,109 @@
+# 会话任务调度：阻塞任务 (LangGraph 工作流、LLM 调用、exec) 移出事件循环，在有界线程池中执行
+import time
+import asyncio
+import functools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+
+
+class QueueFullError(RuntimeError):
+    """排队请求超过上限"""
+
+
+class SessionTaskRunner:
+    """
+    - 同一 Session 的任务按到达顺序串行执行 (每个 Session 一把 asyncio.Lock)，避免并发修改 dfs_context。
+    - 不同 Session 之间并行，全局并发受 Semaphore 限制；等待锁/信号量只挂起协程，不阻塞事件循环。
+    - 记录排队深度、运行数、等待/执行耗时，供 /stats 接口查询。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_concurrency: Optional[int] = None,
+                 max_queue: Optional[int] = None, name: str = "chat"):
+        self.max_workers = max_workers or settings.CHAT_MAX_WORKERS
+        self.max_concurrency = min(max_concurrency or settings.CHAT_MAX_CONCURRENCY, self.max_workers)
+        self.max_queue = max_queue if max_queue is not None else settings.CHAT_MAX_QUEUE
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._pending: Dict[str, int] = defaultdict(int)  # 每个 Session 已提交未完成的任务数
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphore 需要在事件循环中创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, session_id: str, fn: Callable, *args, **kwargs):
+        """在线程池中执行 fn(*args, **kwargs)，同一 session_id 的调用串行"""
+        if self.max_queue and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"排队请求过多 ({self.queued})，请稍后重试")
+
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        self._pending[session_id] += 1
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        enqueued_at = time.perf_counter()
+        dequeued = False
+        try:
+            async with lock:
+                async with self._get_semaphore():
+                    self.queued -= 1
+                    dequeued = True
+                    self.running += 1
+                    started_at = time.perf_counter()
+                    self._wait_total += started_at - enqueued_at
+                    loop = asyncio.get_running_loop()
+                    future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+                    try:
+                        try:
+                            result = await asyncio.shield(future)
+                        except asyncio.CancelledError:
+                            # 客户端断开：线程里的任务无法中断，等它结束后再释放 Session 锁
+                            await asyncio.wait({future})
+                            raise
+                        self.completed += 1
+                        return result
+                    except BaseException:
+                        self.failed += 1
+                        raise
+                    finally:
+                        self.running -= 1
+                        self._run_total += time.perf_counter() - started_at
+        finally:
+            if not dequeued:
+                self.queued -= 1
+            self._pending[session_id] -= 1
+            if self._pending[session_id] <= 0:
+                self._pending.pop(session_id, None)
+                self._session_locks.pop(session_id, None)
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_ms": round(self._wait_total / finished * 1000, 1) if finished else 0.0,
+            "avg_run_ms": round(self._run_total / finished * 1000, 1) if finished else 0.0,
+            "session_queue_depth": {sid: n for sid, n in self._pending.items() if n > 0},
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
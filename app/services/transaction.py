@@ -0,0 +1,82 @@
+# 事务式执行：生成代码在写时复制 (Copy-on-Write) 视图上运行，成功后才把变化的表提交回会话，失败时直接丢弃视图
+from typing import Dict, List
+import pandas as pd
+
+# 回滚与变化检测都依赖 Copy-on-Write：pandas 3 默认开启；pandas 2.x 需显式打开 (否则对视图的原地修改会直接写穿到会话表)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _same_buffer(a: pd.Series, b: pd.Series) -> bool:
+    """两列是否仍指向同一块内存 (Copy-on-Write 下，被修改过的列一定已经换成了新内存)"""
+    if isinstance(a.array, pd.arrays.NumpyExtensionArray) and isinstance(b.array, pd.arrays.NumpyExtensionArray):
+        x, y = a.to_numpy(), b.to_numpy()
+        return (x.__array_interface__["data"][0] == y.__array_interface__["data"][0]
+                and x.strides == y.strides and x.shape == y.shape)
+    return False
+
+
+def table_changed(before: pd.DataFrame, after) -> bool:
+    """
+    判断表是否被修改：先比较结构，再逐列比较内存地址 (O(1))；
+    只有无法确定的列 (Arrow 字符串等扩展类型、被重新赋值为同样内容的列) 才逐值比较。
+    """
+    if after is before:
+        return False
+    if not isinstance(after, pd.DataFrame):
+        return True
+    if (before.shape != after.shape or not before.columns.equals(after.columns)
+            or not before.dtypes.equals(after.dtypes) or not before.index.equals(after.index)):
+        return True
+    if before.columns.has_duplicates:
+        return not before.equals(after)
+    for col in before.columns:
+        left, right = before[col], after[col]
+        if not _same_buffer(left, right) and not left.equals(right):
+            return True
+    return False
+
+
+class TableTransaction:
+    """
+    - begin：每张表做浅拷贝 (只复制对象外壳，列数据共享)。pandas Copy-on-Write 保证对视图的任何原地修改
+      只会复制被改动的列，原表不受影响，未改动的表/列永远不会被复制。
+    - commit：只把变化的表 (以及新增/删除的键) 写回原字典，未变化的表保持原对象不变。
+    - rollback：什么都不做 —— 丢弃视图即可，代价与表大小无关。
+    """
+
+    def __init__(self, dfs: Dict[str, object]):
+        self.dfs = dfs
+        self._before = dict(dfs)
+        self.view = {name: value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+                     for name, value in dfs.items()}
+        self.changed: List[str] = []
+        self.added: List[str] = []
+        self.removed: List[str] = []
+
+    def _is_changed(self, name: str, value) -> bool:
+        before = self._before[name]
+        if isinstance(before, pd.DataFrame):
+            # 视图中仍是 begin 时的浅拷贝：比较列内存；被整体替换为新对象时同样按内容比较
+            return table_changed(before, value)
+        return value is not before
+
+    def commit(self) -> Dict[str, List[str]]:
+        for name, value in self.view.items():
+            if name not in self._before:
+                self.added.append(name)
+                self.dfs[name] = value
+            elif self._is_changed(name, value):
+                self.changed.append(name)
+                self.dfs[name] = value
+        self.removed = [name for name in self._before if name not in self.view]
+        for name in self.removed:
+            self.dfs.pop(name, None)
+        return self.report()
+
+    def rollback(self):
+        self.view = {}
+
+    def report(self) -> Dict[str, List[str]]:
+        return {key: [n for n in names if not n.startswith("__")]
+                for key, names in (("changed", self.changed), ("added", self.added), ("removed", self.removed))}
@@ -0,0 +1,61 @@
+# 工作簿读取器：一次打开，同时服务 Sheet 列表 / 预览 / 全量加载
+import os
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+
+from app.core.config import settings
+
+# 尝试启用 calamine (Rust 实现的解析器，比 openpyxl 快数倍)
+try:
+    import python_calamine  # noqa: F401
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+
+def default_engine() -> Optional[str]:
+    """配置优先；未配置时有 calamine 就用 calamine，否则交给 pandas 默认引擎 (openpyxl)"""
+    if settings.INGESTION_ENGINE:
+        return settings.INGESTION_ENGINE
+    return "calamine" if HAS_CALAMINE else None
+
+
+class WorkbookReader:
+    """
+    对同一个工作簿只打开一次句柄，Sheet 列表 / 预览 / 全量加载共用。
+    预览只解析前 N 行 (nrows)，即使工作簿里有很大的辅助 Sheet，选 Sheet / 探测 Header 也不会整表解析；
+    全量加载直接调用 pandas 自身的解析 (表头提升、类型推断都与 pd.read_excel 相同)，只有目标 Sheet 会被完整解析一次。
+    """
+
+    def __init__(self, file_path: str, engine: Optional[str] = None):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件未找到: {file_path}")
+        self.file_path = file_path
+        self.engine = engine or default_engine()
+        self._xls = pd.ExcelFile(file_path, engine=self.engine)
+        self._previews: Dict[Tuple[str, int], pd.DataFrame] = {}
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return self._xls.sheet_names
+
+    def preview(self, sheet_name: str, nrows: int = 20) -> pd.DataFrame:
+        """前 nrows 行的原始网格 (header=None)，只解析这些行；同一 Sheet 重复预览时复用"""
+        key = (sheet_name, nrows)
+        if key not in self._previews:
+            self._previews[key] = self._xls.parse(sheet_name=sheet_name, header=None, nrows=nrows)
+        return self._previews[key]
+
+    def load(self, sheet_name: str, header_row: int = 0) -> pd.DataFrame:
+        """等价于 pd.read_excel(path, sheet_name, header=header_row)，复用已打开的工作簿句柄"""
+        return self._xls.parse(sheet_name=sheet_name, header=header_row)
+
+    def close(self):
+        self._xls.close()
+        self._previews.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
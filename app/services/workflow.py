@@ -1,11 +1,10 @@
 import pandas as pd
 import numpy as np
-import sys
-import io
 import re
 import ast
 import traceback
 import json
+import time
 import warnings # 
 from typing import TypedDict, Annotated, List, Literal, Optional, Union, Dict, Any
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
@@ -15,6 +14,15 @@ from langgraph.graph import StateGraph, END
 from app.services.llm_factory import get_llm
 import operator
 from app.utils.tools import AuditLogger, smart_merge
+from app.services.schema_profile import SchemaProfiler
+from app.services.intent_router import fast_route, router_stats
+from app.services.speculation import SpeculativeCodegen
+from app.services.recipe_store import get_recipe_store, schema_signature
+from app.services.code_validator import STATIC_ERROR_MARK, check_code, format_issues
+from app.services.transaction import TableTransaction
+from app.services.alias_store import NAMESPACE_KEY
+from app.utils.output_capture import capture_output
+from app.core.config import settings
 
 # ==========================================
 # 0. 基础工具
@@ -67,45 +75,71 @@ class AgentState(TypedDict):
     # ✅ 新增：用于传递生成的 Excel 数据对象 (不直接存 DF，而是存标记，实际数据在 context 中流转)
     # 这里我们简化：数据通过 return 字典传回，在 main 中处理
     reply: str
+    recipe: dict  # 命中的配方 {"id", "code"}，首轮直接回放
+    table_signatures: list  # 首轮执行前的表结构签名，任务成功后用于保存配方
 
 # ==========================================
 # 2. 代码执行器 (支持 result_df 捕获)
 # ==========================================
-def execute_code(dfs: Dict[str, pd.DataFrame], code: str) -> dict:
+def execute_code(dfs: Dict[str, pd.DataFrame], code: str, snapshots=None) -> dict:
+    """按 EXECUTION_BACKEND 选择在服务进程内执行，或交给沙箱进程池 (超时/超内存时终止 worker，不影响服务进程)"""
+    if settings.EXECUTION_BACKEND == "sandbox":
+        from app.services.sandbox import get_sandbox_pool
+        return get_sandbox_pool().execute(dfs, code, snapshots=snapshots)
+    return execute_code_local(dfs, code, snapshots=snapshots)
+
+
+def execute_code_local(dfs: Dict[str, pd.DataFrame], code: str, snapshots=None) -> dict:
     import plotly.graph_objects as go
     import plotly.express as px
     import traceback
-    import io
     
     # ✅ 1. 导入所有工具 (确保 tools.py 里有 smart_reconcile)
-    from app.utils.tools import AuditLogger, smart_merge, smart_reconcile
+    from app.utils.tools import AuditLogger, smart_merge, smart_reconcile, auto_clean
     
     audit = AuditLogger()
+    # 代码在写时复制视图上运行：成功才提交变化的表，报错时会话数据保持执行前的状态 (不会留下改了一半的表)
+    txn = TableTransaction(dfs)
+    view = txn.view
     
     # ✅ 2. 定义包装器 (Wrappers)
     # Smart Merge 包装器
     def smart_merge_wrapper(left, right, left_on, right_on, threshold=None):
-        return smart_merge(left, right, left_on, right_on, logger=audit)
+        return smart_merge(left, right, left_on, right_on, logger=audit, namespace=dfs.get(NAMESPACE_KEY))
 
     # ✅ Smart Reconcile 包装器 (关键！)
     def smart_reconcile_wrapper(df_sys, df_bank, sys_key, bank_key, sys_amount, bank_amount, tolerance=0.01):
         return smart_reconcile(df_sys, df_bank, sys_key, bank_key, sys_amount, bank_amount, tolerance, logger=audit)
 
-    # ✅ 新增：定义还原函数
-    def reload_data_wrapper(filename: str):
-        backup_key = f"__backup_{filename}"
-        if backup_key in dfs:
-            print(f"🔄 [System] 正在还原数据: {filename}")
-            # 从备份中恢复，并确保是深拷贝
-            dfs[filename] = dfs[backup_key].copy(deep=True)
+    # ✅ L1 数据体检包装器 (默认处理当前会话的全部表)
+    def auto_clean_wrapper(dfs=None, **options):
+        return auto_clean(view if dfs is None else dfs, logger=audit, **options)
+
+    # ✅ 还原 / 快照函数 (快照存放在磁盘，按需懒加载)
+    def reload_data_wrapper(filename: str, version: str = None):
+        if snapshots is not None and snapshots.has(filename, version):
+            start = time.perf_counter()
+            view[filename] = snapshots.load(filename, version)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            label = version or snapshots.versions(filename)[-1]
+            print(f"🔄 [System] 已还原数据: {filename} (版本 {label}, 耗时 {elapsed_ms:.1f} ms)")
+            audit.info("还原数据", f"{filename} 还原至版本 {label}，耗时 {elapsed_ms:.1f} ms", affected_rows=len(view[filename]))
             return True
         else:
             print(f"❌ [System] 未找到备份数据: {filename}")
             return False
+
+    def snapshot_data_wrapper(filename: str, version: str = None):
+        if snapshots is None or filename not in view:
+            print(f"❌ [System] 无法保存快照: {filename}")
+            return None
+        saved = snapshots.save(filename, view[filename], version)
+        print(f"📸 [System] 已保存快照: {filename} (版本 {saved})")
+        return saved
         
     # ✅ 3. 注入到局部变量
     local_vars = {
-        "dfs": dfs, 
+        "dfs": view, 
         "pd": pd, 
         "np": np, 
         "px": px, 
@@ -113,68 +147,77 @@ def execute_code(dfs: Dict[str, pd.DataFrame], code: str) -> dict:
         "audit": audit,
         "smart_merge": smart_merge_wrapper,       # L2 工具
         "smart_reconcile": smart_reconcile_wrapper, # L3 工具 (必须注入！)
-        "reload_data": reload_data_wrapper
+        "auto_clean": auto_clean_wrapper,         # L1 工具
+        "reload_data": reload_data_wrapper,
+        "snapshot_data": snapshot_data_wrapper
     }
     
-    if len(dfs) > 0:
-        local_vars['df'] = dfs[list(dfs.keys())[0]]
+    table_names = [k for k in view.keys() if not k.startswith("__")]
+    if table_names:
+        local_vars['df'] = view[table_names[0]]
 
-    old_stdout = sys.stdout
-    redirected_output = io.StringIO()
-    sys.stdout = redirected_output
-    
     captured_figs = []
     generated_df = None
     
-    try:
-        clean_code = clean_code_string(code)
-        if not clean_code: 
-            return {"success": True, "dfs": dfs, "chart_jsons": [], "log": "无代码", "result_df": None, "audit_logger": audit}
+    # 输出捕获只作用于当前线程/协程上下文，并发会话互不串扰；超长输出保留首尾、截断中间
+    with capture_output(settings.EXEC_OUTPUT_HEAD_CHARS, settings.EXEC_OUTPUT_TAIL_CHARS) as output:
+        try:
+            clean_code = clean_code_string(code)
+            if not clean_code: 
+                return {"success": True, "dfs": dfs, "chart_jsons": [], "log": "无代码", "result_df": None,
+                        "audit_logger": audit, "log_summary": output.summary(), "changed_tables": txn.report()}
 
-        # ✅ 修复点：强制注入屏蔽警告的代码，防止 SettingWithCopyWarning 污染控制台
-        # 这可以防止 Agent 被无害的警告迷惑，导致死循环
-        safe_code = "import warnings\nwarnings.filterwarnings('ignore')\n" + clean_code
-        
-        # 执行代码
-        exec(safe_code, {}, local_vars)
-        
-        # 捕获结果
-        for var_name, var_val in local_vars.items():
-            if var_name.startswith("fig") and hasattr(var_val, "to_json"):
-                captured_figs.append(var_val.to_json())
-        
-        if "result_df" in local_vars:
-            obj = local_vars["result_df"]
-            if isinstance(obj, pd.DataFrame):
-                print("💾 [System] 捕获到结果数据: result_df")
-                generated_df = obj
-        
-        return {
-            "success": True,
-            "dfs": local_vars["dfs"],
-            "chart_jsons": captured_figs,
-            "result_df": generated_df,
-            "audit_logger": audit, 
-            "log": redirected_output.getvalue()
-        }
-    except Exception:
-        error_trace = traceback.format_exc()
-        return {
-            "success": False,
-            "dfs": dfs,
-            "chart_jsons": [],
-            "result_df": None,
-            "audit_logger": audit,
-            "log": f"❌ Runtime Error:\n{error_trace}" # 将报错甩回给 Agent
-        }
-    finally:
-        sys.stdout = old_stdout
+            # ✅ 修复点：强制注入屏蔽警告的代码，防止 SettingWithCopyWarning 污染控制台
+            # 这可以防止 Agent 被无害的警告迷惑，导致死循环
+            safe_code = "import warnings\nwarnings.filterwarnings('ignore')\n" + clean_code
+            
+            # 执行代码
+            exec(safe_code, {}, local_vars)
+            
+            # 捕获结果
+            for var_name, var_val in local_vars.items():
+                if var_name.startswith("fig") and hasattr(var_val, "to_json"):
+                    captured_figs.append(var_val.to_json())
+            
+            if "result_df" in local_vars:
+                obj = local_vars["result_df"]
+                if isinstance(obj, pd.DataFrame):
+                    print("💾 [System] 捕获到结果数据: result_df")
+                    generated_df = obj
+            
+            if isinstance(local_vars["dfs"], dict):
+                txn.view = local_vars["dfs"]  # 代码可能整体重新绑定了 dfs
+            changed = txn.commit()
+            return {
+                "success": True,
+                "dfs": dfs,
+                "chart_jsons": captured_figs,
+                "result_df": generated_df,
+                "audit_logger": audit, 
+                "log": output.getvalue(),
+                "log_summary": output.summary(),
+                "changed_tables": changed
+            }
+        except Exception:
+            error_trace = traceback.format_exc()
+            txn.rollback()
+            return {
+                "success": False,
+                "dfs": dfs,
+                "chart_jsons": [],
+                "result_df": None,
+                "audit_logger": audit,
+                "log": f"❌ Runtime Error:\n{error_trace}", # 将报错甩回给 Agent
+                "log_summary": output.summary(),
+                "changed_tables": txn.report()
+            }
 
 # ==========================================
 # 3. Nodes
 # ==========================================
 
-def supervisor_node(state: AgentState, dfs_context: dict):
+def supervisor_node(state: AgentState, dfs_context: dict,
+                    speculation: Optional[SpeculativeCodegen] = None, worker=None):
     instruction = state.get("user_instruction", "")
     messages = state.get("messages", [])
     
@@ -189,9 +232,45 @@ def supervisor_node(state: AgentState, dfs_context: dict):
 
     if not instruction and len(messages) == 0:
         return {"router_decision": "auto_eda"}
-        
-    llm = get_llm(temperature=0)
-    file_list_str = ", ".join(dfs_context.keys())
+
+    if not messages:
+        # 📒 同样的指令 + 同样的表结构：直接回放已验证的配方，跳过路由和代码生成
+        signatures = schema_signature(dfs_context) if settings.RECIPE_ENABLED else []
+        if signatures:
+            matched = get_recipe_store().match(str(instruction), dfs_context)
+            if matched is not None:
+                recipe, code = matched
+                print(f"📒 [Recipe] 命中配方 {recipe['id']} (已使用 {recipe['uses']} 次)，跳过 LLM")
+                return {"router_decision": "python_worker", "recipe": {"id": recipe["id"], "code": code},
+                        "table_signatures": signatures}
+
+        # ⚡ 首轮路由先走本地意图分类，高置信度时跳过 LLM (有执行历史时仍交给 LLM 判断是否继续)
+        update = fast_route(str(instruction), dfs_context)
+        # 🔮 投机执行：LLM 路由的同时提前生成代码，路由结果为 python_worker 时直接采用
+        if update is None and speculation is not None and worker is not None:
+            speculation.start(str(instruction), lambda: worker(state))
+            try:
+                update = llm_route(str(instruction), messages, list(dfs_context.keys()))
+            except Exception:
+                speculation.discard()
+                raise
+            if update.get("router_decision") != "python_worker":
+                speculation.discard()
+        if update is None:
+            update = llm_route(str(instruction), messages, list(dfs_context.keys()))
+        return {**update, "table_signatures": signatures}
+
+    # 简单的容错机制，防止 supervisor 死循环
+    if len(messages) > 10:
+        return {"router_decision": "end"}
+
+    return llm_route(str(instruction), messages, list(dfs_context.keys()))
+
+def llm_route(instruction: str, messages: list, file_names: list) -> dict:
+    """由 LLM 决定路由 (python_worker / general_chat / end)，返回 supervisor 的状态更新"""
+    started = time.perf_counter()
+    llm = get_llm(temperature=0, chain="supervisor")
+    file_list_str = ", ".join(file_names)
     
     system_prompt = """你是一个数据操作系统的指挥官。
     当前文件: [{file_list}]
@@ -208,10 +287,6 @@ def supervisor_node(state: AgentState, dfs_context: dict):
         ("system", system_prompt),
         ("human", "指令: {instruction}\n历史: {history}")
     ])
-
-    # 简单的容错机制，防止 supervisor 死循环
-    if len(messages) > 10:
-        return {"router_decision": "end"}
     
     chain = prompt | llm | StrOutputParser()
     response = chain.invoke({
@@ -219,6 +294,8 @@ def supervisor_node(state: AgentState, dfs_context: dict):
         "history": str(messages[-2:]),
         "file_list": file_list_str
     })
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    router_stats.record_llm(elapsed_ms)
     
     try:
         import json
@@ -227,6 +304,7 @@ def supervisor_node(state: AgentState, dfs_context: dict):
         if json_match: clean_resp = json_match.group()
         res_json = json.loads(clean_resp)
         decision = res_json.get("decision", "general_chat")
+        print(f"🧭 [Router] LLM 路由: {decision} ({elapsed_ms:.0f} ms)")
         
         if decision == "python_worker": return {"router_decision": "python_worker"}
         if decision == "general_chat": 
@@ -238,7 +316,9 @@ def supervisor_node(state: AgentState, dfs_context: dict):
 def general_chat_node(state: AgentState):
     return {"messages": [AIMessage(content=state.get("reply", "无法处理。"))]}
 
-def python_worker_node(state: AgentState, dfs_context: dict, mode: str = "custom"):
+def python_worker_node(state: AgentState, dfs_context: dict, mode: str = "custom",
+                       profiler: Optional[SchemaProfiler] = None,
+                       speculation: Optional[SpeculativeCodegen] = None):
     """
     全能型 Python 代码生成节点。
     
@@ -246,23 +326,29 @@ def python_worker_node(state: AgentState, dfs_context: dict, mode: str = "custom
         state: LangGraph 状态
         dfs_context: 包含所有 DataFrame 的字典 {'filename': df}
         mode: 'custom' (响应用户指令) | 'auto_eda' (自动探索)
+        profiler: 表结构画像缓存 (同一工作流内共享，表未变化时不重算)
+        speculation: 投机代码生成 (首轮若 supervisor 已预生成代码，直接采用)
     """
     dfs = dfs_context
     messages = state['messages']
     instruction = state.get('user_instruction', '')
+
+    recipe = state.get("recipe")
+    if recipe and mode == "custom" and not messages:
+        print(f"📒 [Recipe] 回放配方 {recipe['id']}")
+        return {"messages": [AIMessage(content=recipe["code"])]}
+
+    if speculation is not None and mode == "custom" and not messages:
+        update = speculation.take(str(instruction))
+        if update is not None:
+            return update
     
     # ---------------------------------------------------------
     # 1. 构建数据全景 (Schema Context)
     # ---------------------------------------------------------
-    # 我们只给 LLM 看列名、类型和前5行，绝不传输全量数据，节省 Token
-    schema_info = ""
-    for name, df in dfs.items():
-        if name.startswith("__"): continue
-        buffer = io.StringIO()
-        df.info(buf=buffer)
-        info_str = buffer.getvalue()
-        head_str = df.head().to_string()
-        schema_info += f"\n=== File: {name} ===\n[Info]:\n{info_str}\n[Head (First 5 rows)]:\n{head_str}\n"
+    # 我们只给 LLM 看列画像 (类型、非空数、范围/示例) 和前几行，绝不传输全量数据；按 Token 预算裁剪
+    profiler = profiler or SchemaProfiler()
+    schema_info = profiler.render(dfs)
     
     # ---------------------------------------------------------
     # 2. 获取错误上下文 (Self-Healing)
@@ -272,11 +358,13 @@ def python_worker_node(state: AgentState, dfs_context: dict, mode: str = "custom
     error_context = "无"
     if isinstance(last_message, HumanMessage) and "❌ Runtime Error" in str(last_message.content):
         error_context = f"⚠️ 上一次代码执行报错，请根据以下 Traceback 修正代码:\n{last_message.content}"
+    elif isinstance(last_message, HumanMessage) and STATIC_ERROR_MARK in str(last_message.content):
+        error_context = f"⚠️ 上一次代码未通过静态检查 (未执行)，请逐条修正以下问题:\n{last_message.content}"
     
     # ---------------------------------------------------------
     # 3. 定义核心 System Prompt (植入四大层级能力)
     # ---------------------------------------------------------
-    llm = get_llm(temperature=0)
+    llm = get_llm(temperature=0, chain=mode if mode == "auto_eda" else "python_worker")
     
     system_instructions = """
     你是一个全能型 Python 数据分析专家。你拥有对 `dfs` 字典的完全访问权限，其中包含了用户上传的所有数据表。
@@ -295,8 +383,9 @@ def python_worker_node(state: AgentState, dfs_context: dict, mode: str = "custom
        - **请使用**: `result_df = smart_merge(df1, df2, left_on='name', right_on='comp_name')`
        - 它会自动处理模糊匹配并记录日志。
 
-    3. **重置数据**：如果用户想“重新清洗”或“还原”某张表，请执行 `reload_data('文件名')`。
-      示例：`reload_data('sales_data.xlsx')`
+    3. **重置数据**：如果用户想“重新清洗”或“还原”某张表，请执行 `reload_data('文件名')` (还原到最近一次快照，上传时的原始数据版本名为 'original')。
+      示例：`reload_data('sales_data.xlsx')` 或 `reload_data('sales_data.xlsx', version='original')`
+      如需保留中间结果，可执行 `snapshot_data('文件名', '版本名')`，之后用同一版本名还原。
 
     【核心要求】
     1. **必须导入库**：`import pandas as pd, numpy as np, re`。
@@ -319,95 +408,16 @@ def python_worker_node(state: AgentState, dfs_context: dict, mode: str = "custom
     在编写代码前，严格判断用户意图属于哪一层级：
     🔍 **L1: 通用数据体检 (General Hygiene)**
        - **触发**：用户问“数据体检”、“清洗数据”、“检查异常”。
-       - **策略**：
-         1. **去重与空值**：这是所有表都需要的。
-         2. **数值清洗**：尝试将所有“看起来像数字”的列转为数字（去除 ¥, 等符号）。
-         3. **异常值检测**：
-            - **负数检测**：对于名为“金额/数量/Price/Qty”的列，检测负数。
-            - **极端值检测**：检测数值是否异常巨大（如 > 10万 或 > 平均值+3倍标准差）。
-         4. **(可选) 逻辑检查**：**只有**当同时检测到 `单价`、`数量`、`总金额` 列时，才执行逻辑校验。
-       
-       - **标准代码模板 (请严格参考)**：
+       - **工具**：**必须直接调用内置的 `auto_clean`** (已向量化，百万行数秒完成)，不要手写清洗循环：
          ```python
-         import numpy as np
-         import pandas as pd
-         import re
-         
-         for name, df in dfs.items():
-             print(f"\\n### 正在分析表: {{name}}") 
-             initial_count = len(df)
-             
-             # --- 1. 基础清洗 (去重) ---
-             if df.duplicated().any():
-                 dupe_count = df.duplicated().sum()
-                 print(f"- 🗑️ 剔除 {{dupe_count}} 条完全重复行")
-                 audit.log_exclusion(f"重复剔除-{{name}}", "完全重复行", df[df.duplicated()])
-                 df = df.drop_duplicates()
-
-             # --- 2. 智能数值转换 (针对所有列) ---
-             # 自动识别可能包含数字的 Object 列
-             for col in df.columns:
-                 if df[col].dtype == 'object':
-                     # 如果包含数字且不包含过多字母(排除ID)，尝试清洗
-                     sample = str(df[col].dropna().iloc[0]) if not df[col].dropna().empty else ""
-                     if re.search(r'\d', sample) and not re.search(r'[a-zA-Z]{{3,}}', sample):
-                         try:
-                             # 尝试去除非数字字符转换
-                             cleaned = df[col].astype(str).str.replace(r'[¥,]', '', regex=True)
-                             # 只有当转换成功率高时才应用，避免误伤 ID 列
-                             converted = pd.to_numeric(cleaned, errors='coerce')
-                             if converted.notna().sum() > 0:
-                                 df[col] = converted
-                         except:
-                             pass
-
-             # --- 3. 通用异常值检测 ---
-             # 仅针对数值列
-             num_cols = df.select_dtypes(include=[np.number]).columns
-             for col in num_cols:
-                 # A. 负数检测 (仅针对具备物理意义的列名)
-                 if re.search(r'(金额|价|量|Amount|Price|Qty|Count)', col, re.I):
-                     mask_neg = df[col] < 0
-                     if mask_neg.any():
-                         print(f"- ⚠️ {{col}}: 发现 {{mask_neg.sum()}} 个负数 (已记录并剔除)")
-                         audit.log_exclusion(f"负数异常-{{name}}", f"{{col}} 为负数", df[mask_neg])
-                         df = df[~mask_neg]
-                 
-                 # B. 极端值检测 (简单阈值法，比如 > 100000，或者根据分位数)
-                 # 这里使用绝对阈值示例，防止统计学误伤小样本
-                 # 仅检测“数量”或“金额”相关
-                 if re.search(r'(Qty|Count|数量)', col, re.I):
-                     mask_huge = df[col] > 100000
-                     if mask_huge.any():
-                         print(f"- ⚠️ {{col}}: 发现 {{mask_huge.sum()}} 个极端大值 (已记录并剔除)")
-                         audit.log_exclusion(f"极端值-{{name}}", f"{{col}} 过大", df[mask_huge])
-                         df = df[~mask_huge]
-
-             # --- 4. 逻辑一致性 (防御性执行) ---
-             # 只有列名完全匹配时才执行，避免误伤
-             p_col = next((c for c in df.columns if re.search(r'(单价|Price)', c, re.I)), None)
-             q_col = next((c for c in df.columns if re.search(r'(数量|Qty)', c, re.I)), None)
-             t_col = next((c for c in df.columns if re.search(r'(总金额|Total|Amount)', c, re.I)), None)
-             
-             if p_col and q_col and t_col:
-                 try:
-                     expected = df[p_col] * df[q_col]
-                     mask_logic = abs(expected - df[t_col]) > 1.0 # 容差 1.0
-                     if mask_logic.any():
-                         print(f"- ⚠️ 发现 {{mask_logic.sum()}} 条金额逻辑不符 (已记录)")
-                         # 这里我们只记录 Audit，不一定强制剔除，由用户决定，或者剔除
-                         audit.log_exclusion(f"逻辑校验失败-{{name}}", "计算逻辑不符", df[mask_logic])
-                         df = df[~mask_logic]
-                 except:
-                     pass # 如果列之间无法计算，跳过
-
-             # --- 5. 保存 ---
-             dfs[name] = df
-             print(f"- 处理后: {{len(df)}} 行")
-         
+         report = auto_clean(dfs)  # 遍历所有表：去重 → 数值转换 (去除 ¥ , 等符号) → 负数/极端值剔除 → 单价×数量=总金额 校验；结果写回 dfs 并记入审计日志
+         print(report.to_string())
          result_df = list(dfs.values())[0]
          print("WORKER_DONE")
          ```
+       - **可选参数**：`tables=['表名']` 只处理部分表；`drop_negative=False` 不剔除负数；`extreme_threshold=100000` 数量上限；
+         `extreme_sigma=3` 额外按 均值+3σ 检测；`check_total=False` 跳过逻辑校验；`total_tolerance=1.0`；`drop_logic_errors=False` 逻辑不符只记录不剔除。
+       - 用户提出工具未覆盖的规则时，先调用 `auto_clean`，再针对性补充代码。
        
     🔗 **L2: 多表关联与整合 (Integration)**
        - **触发**：用户明确说了“合并”、“连接”、“关联表A和表B”。
@@ -503,14 +513,38 @@ def python_worker_node(state: AgentState, dfs_context: dict, mode: str = "custom
     
     return {"messages": [response]}
 
-def executor_node(state: AgentState, dfs_context: dict):
+def validator_node(state: AgentState, dfs_context: dict):
+    """
+    执行前的静态检查：表名/列名不存在、禁用调用、未定义变量、语法错误。
+    有问题时把具体问题反馈给 worker 重写 (与运行时报错共用重试次数)；重试次数用尽后放行，由执行结果兜底。
+    """
+    messages = state['messages']
+    if state.get("error_count", 0) >= 3:
+        return {}
+    issues = check_code(clean_code_string(messages[-1].content), dfs_context)
+    if not issues:
+        return {}
+    feedback = format_issues(issues)
+    print(f"\n🔎 {feedback}")
+    return {"messages": [HumanMessage(content=feedback)], "error_count": state.get("error_count", 0) + 1}
+
+def executor_node(state: AgentState, dfs_context: dict, snapshots=None):
     messages = state['messages']
     code = messages[-1].content
     print(f"\n⚡ 执行代码:\n{clean_code_string(code)[:80]}...")
     
-    result = execute_code(dfs_context, code)
+    result = execute_code(dfs_context, code, snapshots=snapshots)
+    summary = result.get("log_summary") or {}
+    if summary.get("truncated"):
+        print(f"✂️ [System] 执行输出 {summary['total_lines']} 行 / {summary['total_chars']} 个字符，"
+              f"已省略中间 {summary['dropped_lines']} 行")
     
     updates = {}
+    if settings.RECIPE_ENABLED and state.get("user_instruction"):
+        try:
+            record_recipe(state, code, result)
+        except OSError as e:
+            print(f"⚠️ [Recipe] 配方更新失败: {e}")
     if result['success']:
         updates["error_count"] = 0
         if result['chart_jsons']:
@@ -523,6 +557,12 @@ def executor_node(state: AgentState, dfs_context: dict):
         
         # 即使没有显式 print WORKER_DONE，如果没报错，我们也尝试追加标志
         log = result['log']
+        changed = result.get('changed_tables') or {}
+        touched = [f"{label}: {', '.join(changed[key])}" for key, label in
+                   (("changed", "修改"), ("added", "新增"), ("removed", "删除")) if changed.get(key)]
+        if touched:
+            print(f"🧾 [System] 数据表变化 — {' | '.join(touched)}")
+            log = f"{log}\n🧾 数据表变化 — {' | '.join(touched)}"
         if "WORKER_DONE" in log or "WORKER_DONE" in code:
              updates["messages"] = [HumanMessage(content=f"✅ 成功:\n{log}\n(Signal: WORKER_DONE)")]
         else:
@@ -534,6 +574,26 @@ def executor_node(state: AgentState, dfs_context: dict):
         
     return updates
 
+def record_recipe(state: AgentState, code: str, result: dict):
+    """
+    配方回放成功/失败时更新配方；LLM 生成的代码一次执行即完成任务时保存为配方。
+    多段脚本才完成的任务 (中途已有成功执行) 不保存，单独回放最后一段并不完整。
+    """
+    store = get_recipe_store()
+    messages = state['messages']
+    recipe = state.get("recipe")
+    if recipe and len(messages) == 1:
+        if result['success']:
+            store.record_success(recipe["id"])
+        else:
+            store.record_failure(recipe["id"], result['log'])
+        return
+
+    done = "WORKER_DONE" in result['log'] or "WORKER_DONE" in str(code)
+    earlier_success = any(isinstance(m, HumanMessage) and str(m.content).startswith("✅") for m in messages)
+    if result['success'] and done and not earlier_success and state.get("table_signatures"):
+        store.save(state["user_instruction"], state["table_signatures"], clean_code_string(code))
+
 # ==========================================
 # 4. 构建 Graph
 # ==========================================
@@ -549,6 +609,10 @@ def router_logic(state: AgentState):
     if decision == 'general_chat': return 'general_chat'
     return END
 
+def validator_router(state: AgentState):
+    last_content = str(state["messages"][-1].content)
+    return "retry" if STATIC_ERROR_MARK in last_content else "execute"
+
 def executor_router(state: AgentState):
     messages = state.get("messages", [])
     if not messages: return "supervisor"
@@ -559,19 +623,32 @@ def executor_router(state: AgentState):
     # 而是回到 Supervisor，让 LLM 决定是继续还是结束（通常 LLM 看到 log 会觉得完成了）
     return "supervisor"
 
-def create_workflow(dfs_context: dict):
+def create_workflow(dfs_context: dict, snapshots=None):
     from functools import partial
+    profiler = SchemaProfiler()
+    speculation = SpeculativeCodegen() if settings.SPECULATIVE_CODEGEN else None
+    # 投机生成直接调用不带 speculation 的 worker，避免在任务内部取回自身
+    speculative_worker = partial(python_worker_node, dfs_context=dfs_context, mode='custom', profiler=profiler)
     workflow = StateGraph(AgentState)
-    workflow.add_node("supervisor", partial(supervisor_node, dfs_context=dfs_context))
+    workflow.add_node("supervisor", partial(supervisor_node, dfs_context=dfs_context,
+                                            speculation=speculation, worker=speculative_worker))
     workflow.add_node("general_chat", general_chat_node)
-    workflow.add_node("python_worker", partial(python_worker_node, dfs_context=dfs_context, mode='custom'))
-    workflow.add_node("auto_eda", partial(python_worker_node, dfs_context=dfs_context, mode='auto_eda'))
-    workflow.add_node("executor", partial(executor_node, dfs_context=dfs_context))
+    workflow.add_node("python_worker", partial(python_worker_node, dfs_context=dfs_context, mode='custom',
+                                               profiler=profiler, speculation=speculation))
+    workflow.add_node("auto_eda", partial(python_worker_node, dfs_context=dfs_context, mode='auto_eda', profiler=profiler))
+    workflow.add_node("executor", partial(executor_node, dfs_context=dfs_context, snapshots=snapshots))
     
     workflow.set_entry_point("supervisor")
     workflow.add_conditional_edges("supervisor", router_logic, {"python_worker": "python_worker", "auto_eda": "auto_eda", "general_chat": "general_chat", END: END})
-    workflow.add_edge("auto_eda", "executor")
-    workflow.add_edge("python_worker", "executor")
+    if settings.CODE_VALIDATION:
+        # 代码先经过静态检查，不通过时直接退回 worker，不执行
+        workflow.add_node("validator", partial(validator_node, dfs_context=dfs_context))
+        workflow.add_edge("auto_eda", "validator")
+        workflow.add_edge("python_worker", "validator")
+        workflow.add_conditional_edges("validator", validator_router, {"retry": "python_worker", "execute": "executor"})
+    else:
+        workflow.add_edge("auto_eda", "executor")
+        workflow.add_edge("python_worker", "executor")
     # 路由逻辑修正
     workflow.add_conditional_edges("executor", executor_router, {
         "retry": "python_worker", 
@@ -132,13 +132,29 @@ def render_message(msg):
         # 4. 渲染下载按钮
         if "download" in msg and msg["download"]:
             full_url = f"{API_URL}{msg['download']}"
-            st.link_button("⬇️ 下载 Excel 分析报告 (含审计日志)", full_url, type="primary")
+            label = "⬇️ 下载 Excel 分析报告 (含审计日志)" if msg["download"].endswith(".xlsx") else "⬇️ 下载数据包 (含审计日志)"
+            st.link_button(label, full_url, type="primary")
 
 # ==========================================
 # 📡 3. 后端通信逻辑
 # ==========================================
+def iter_sse(response):
+    """解析 Server-Sent Events 流，逐条产出 (event, data)"""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
 def send_to_agent(prompt_text, is_system_trigger=False):
-    """发送请求到后端，处理响应，更新状态，并强制刷新"""
+    """发送请求到后端 (流式)，边执行边展示进度，结束后更新状态并强制刷新"""
     
     # 如果是用户手动输入，先展示用户消息（占位，防止刷新前看不见）
     if not is_system_trigger:
@@ -146,40 +162,64 @@ def send_to_agent(prompt_text, is_system_trigger=False):
         with st.chat_message("user"):
             st.markdown(prompt_text)
     
-    # 展示 AI 加载状态
+    # 展示 AI 实时进度：状态栏 + 过程日志 + 增量结论 + 增量图表
     with st.chat_message("assistant"):
-        with st.spinner("🤖 Agent 正在思考、编写代码并执行..."):
-            try:
-                payload = {
-                    "session_id": st.session_state.session_id,
-                    "message": prompt_text
-                }
-                res = requests.post(f"{API_URL}/chat", json=payload)
-                
-                if res.status_code == 200:
-                    data = res.json()
-                    
-                    # 构造新的消息对象
-                    new_msg = {
-                        "role": "assistant",
-                        "content": data.get("response_text", ""),
-                        "charts": data.get("chart_jsons", []),
-                        "download": data.get("download_url")
-                    }
-                    
-                    # 存入历史
-                    st.session_state.messages.append(new_msg)
-                    
-                    # ⚡ 强制刷新页面
-                    # 这是为了让 render_message 函数统一负责渲染历史记录，
-                    # 避免"实时渲染"和"历史回显"代码重复导致的格式不一致。
-                    time.sleep(0.1) 
-                    st.rerun()
-                    
-                else:
+        status = st.status("🤖 Agent 正在思考、编写代码并执行...", expanded=True)
+        answer_box = st.empty()
+        answer_text = ""
+        try:
+            payload = {
+                "session_id": st.session_state.session_id,
+                "message": prompt_text,
+                "export_format": st.session_state.get("export_format", "xlsx")
+            }
+            with requests.post(f"{API_URL}/chat/stream", json=payload, stream=True) as res:
+                if res.status_code != 200:
+                    status.update(label="❌ 请求失败", state="error")
                     st.error(f"Server Error {res.status_code}: {res.text}")
-            except Exception as e:
-                st.error(f"Connection Failed: {str(e)}")
+                    return
+
+                for event, data in iter_sse(res):
+                    if event == "status":
+                        status.update(label=data["message"])
+                    elif event == "plan":
+                        status.markdown(f"🧠 **思考**: {data['text']}")
+                    elif event == "code":
+                        status.code(data["code"], language="python")
+                    elif event == "retry":
+                        status.warning(f"🔧 {data['message']}")
+                    elif event == "answer":
+                        answer_text += data["text"] + "\n\n"
+                        answer_box.markdown(answer_text)
+                    elif event == "chart":
+                        st.plotly_chart(pio.from_json(data["chart_json"]), use_container_width=True)
+                    elif event == "report":
+                        status.update(label="💾 正在生成报表...")
+                    elif event == "error":
+                        status.update(label="❌ 执行出错", state="error")
+                        st.error(data["message"])
+                    elif event == "done":
+                        status.update(label="✅ 完成", state="complete", expanded=False)
+
+                        # 构造新的消息对象 (与 /chat 返回结构一致)
+                        new_msg = {
+                            "role": "assistant",
+                            "content": data.get("response_text", ""),
+                            "charts": data.get("chart_jsons", []),
+                            "download": data.get("download_url")
+                        }
+                        
+                        # 存入历史
+                        st.session_state.messages.append(new_msg)
+                        
+                        # ⚡ 强制刷新页面
+                        # 这是为了让 render_message 函数统一负责渲染历史记录，
+                        # 避免"实时渲染"和"历史回显"代码重复导致的格式不一致。
+                        time.sleep(0.1) 
+                        st.rerun()
+        except Exception as e:
+            status.update(label="❌ 连接失败", state="error")
+            st.error(f"Connection Failed: {str(e)}")
 
 # ==========================================
 # 📂 4. 侧边栏：文件管理
@@ -203,17 +243,25 @@ with st.sidebar:
                     res = requests.post(f"{API_URL}/upload", data=data, files=files_data)
                     if res.status_code == 200:
                         details = res.json().get('details', [])
-                        st.session_state.files_uploaded = True
-                        st.success(f"已加载 {len(details)} 个文件")
-                        with st.expander("查看文件详情"):
-                            for d in details:
-                                st.write(f"- {d}")
+                        errors = res.json().get('errors', [])
+                        if details:
+                            st.session_state.files_uploaded = True
+                            st.success(f"已加载 {len(details)} 个文件")
+                            with st.expander("查看文件详情"):
+                                for d in details:
+                                    st.write(f"- {d}")
+                        for err in errors:
+                            st.error(err)
                     else:
                         st.error("上传失败，请检查后端日志")
                 except Exception as e:
                     st.error(f"连接失败: {e}")
         else:
             st.warning("请先选择文件")
+
+    # 导出格式：大表建议 parquet / csv，生成速度远快于 Excel
+    st.selectbox("报表格式", ["xlsx", "parquet", "csv"], key="export_format",
+                 format_func=lambda f: {"xlsx": "Excel (含审计日志)", "parquet": "Parquet 压缩包", "csv": "CSV 压缩包"}[f])
             
     st.markdown("---")
     st.markdown("**核心能力:**")
@@ -262,7 +310,7 @@ if st.session_state.files_uploaded:
             trigger_prompt = """
             【任务：数据体检】
             1. 扫描所有表格，查找空值、重复行和格式错误。
-            2. 执行清洗操作，并使用 AuditLogger 记录剔除的数据。
+            2. 执行 auto_clean 清洗 (剔除的数据自动记入审计日志)。
             3. 导出清洗后的数据表。
             """
             is_btn_trigger = False
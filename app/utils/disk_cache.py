@@ -0,0 +1,107 @@
+# 轻量级磁盘缓存：一个 key 对应一个 JSON 文件，按文件 mtime 实现 LRU 淘汰
+import os
+import json
+import time
+import threading
+import hashlib
+from typing import Optional
+
+
+class DiskCache:
+    """
+    基于 JSON 文件的持久化缓存。
+    - 命中时刷新文件 mtime，淘汰时优先删除最久未访问的条目 (LRU)。
+    - 写入采用 tmp + os.replace，保证多进程/多线程并发写时不会读到半截文件。
+    - ttl_seconds > 0 时记录写入时间，过期条目在读取时删除 (mtime 用于 LRU，不能兼作过期时间)。
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1000, ttl_seconds: int = 0):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        safe_key = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{safe_key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if self.ttl_seconds:
+            if not isinstance(value, dict) or time.time() - value.get("created_at", 0) > self.ttl_seconds:
+                self.delete(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            value = value.get("value")
+        try:
+            os.utime(path, None)  # 刷新访问时间 (LRU)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: dict):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if self.ttl_seconds:
+            value = {"created_at": time.time(), "value": value}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except OSError:
+            return False
+
+    def clear(self) -> int:
+        removed = 0
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def _entries(self) -> list:
+        try:
+            return [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return []
+
+    def _evict(self):
+        entries = self._entries()
+        overflow = len(entries) - self.max_entries
+        if overflow <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:overflow]:
+            try:
+                os.remove(entry.path)
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
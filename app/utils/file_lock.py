@@ -0,0 +1,24 @@
+# 跨进程文件锁：服务进程与沙箱 worker 共用同一个缓存目录时，串行化 "读取最新状态 → 合并 → 写回"
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:  # Windows 没有 flock：退化为仅进程内互斥 (调用方自己的 threading.Lock)
+    HAS_FCNTL = False
+
+
+@contextmanager
+def file_lock(path: str):
+    """对 path (锁文件，不存在时创建) 加排他锁，退出时释放；进程崩溃时由内核自动释放"""
+    if not HAS_FCNTL:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,139 @@
+# 执行输出捕获：按上下文 (线程 / 协程) 隔离的 stdout 重定向 + 有界缓冲 (保留开头和结尾，中间截断)
+import io
+import sys
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+_current: contextvars.ContextVar[Optional["BoundedOutput"]] = contextvars.ContextVar("captured_stdout", default=None)
+_install_lock = threading.Lock()
+
+
+class BoundedOutput(io.TextIOBase):
+    """
+    只保留前 head_chars 和后 tail_chars 个字符，中间部分只计数不存储；
+    打印百万行 DataFrame 时内存占用与返回给 LLM 的日志长度都有上限。
+    """
+
+    def __init__(self, head_chars: int = 4000, tail_chars: int = 4000):
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self._head: list = []
+        self._head_len = 0
+        self._tail: deque = deque()
+        self._tail_len = 0
+        self.total_chars = 0
+        self.total_lines = 0
+        self.dropped_chars = 0
+        self.dropped_lines = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if not text:
+            return 0
+        n = len(text)
+        self.total_chars += n
+        self.total_lines += text.count("\n")
+        if self._head_len < self.head_chars:
+            take = text[:self.head_chars - self._head_len]
+            self._head.append(take)
+            self._head_len += len(take)
+            text = text[len(take):]
+            if not text:
+                return n
+        if len(text) > self.tail_chars:
+            self._drop(text[:len(text) - self.tail_chars])
+            text = text[len(text) - self.tail_chars:]
+        self._tail.append(text)
+        self._tail_len += len(text)
+        while self._tail_len > self.tail_chars:
+            chunk = self._tail.popleft()
+            overflow = self._tail_len - self.tail_chars
+            if len(chunk) > overflow:
+                self._tail.appendleft(chunk[overflow:])
+                chunk = chunk[:overflow]
+            self._tail_len -= len(chunk)
+            self._drop(chunk)
+        return n
+
+    def _drop(self, text: str):
+        self.dropped_chars += len(text)
+        self.dropped_lines += text.count("\n")
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped_chars > 0
+
+    def getvalue(self) -> str:
+        head, tail = "".join(self._head), "".join(self._tail)
+        if not self.truncated:
+            return head + tail
+        marker = f"\n... [输出过长，已省略中间 {self.dropped_lines} 行 / {self.dropped_chars} 个字符] ...\n"
+        return head + marker + tail
+
+    def summary(self) -> dict:
+        return {
+            "total_chars": self.total_chars,
+            "total_lines": self.total_lines,
+            "kept_chars": self._head_len + self._tail_len,
+            "dropped_chars": self.dropped_chars,
+            "dropped_lines": self.dropped_lines,
+            "truncated": self.truncated,
+        }
+
+
+class _StdoutProxy(io.TextIOBase):
+    """替换 sys.stdout 的代理：当前上下文正在捕获时写入捕获缓冲，否则写入原始 stdout"""
+
+    def __init__(self, original):
+        self._original = original
+
+    def _target(self):
+        return _current.get() or self._original
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self):
+        target = self._target()
+        if hasattr(target, "flush"):
+            target.flush()
+
+    def isatty(self) -> bool:
+        return _current.get() is None and self._original.isatty()
+
+    @property
+    def encoding(self):
+        return getattr(self._original, "encoding", "utf-8")
+
+    def fileno(self) -> int:
+        return self._original.fileno()
+
+
+def install_stdout_proxy():
+    """只安装一次；之后各执行通过 ContextVar 切换目标，不再修改全局 sys.stdout"""
+    with _install_lock:
+        if not isinstance(sys.stdout, _StdoutProxy):
+            sys.stdout = _StdoutProxy(sys.stdout)
+
+
+@contextmanager
+def capture_output(head_chars: int = 4000, tail_chars: int = 4000):
+    """
+    在当前上下文中捕获 print 输出：并发执行的其他会话 (其他线程 / 协程) 不受影响，
+    也不会捕获到彼此的输出。
+    """
+    install_stdout_proxy()
+    buffer = BoundedOutput(head_chars, tail_chars)
+    token = _current.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _current.reset(token)
@@ -0,0 +1,15 @@
+# Token 估算：离线、无需调用模型接口，用于 Prompt 预算控制和日志统计
+import re
+
+_CJK = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 Token 数：中日韩字符约 1 字/Token，其余文本约 4 字符/Token。
+    与 Gemini 实际计数有偏差，但足以用于预算裁剪和前后对比。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
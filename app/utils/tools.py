@@ -1,3 +1,10 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 import pandas as pd
 from rapidfuzz import process, fuzz
 from datetime import datetime
@@ -8,10 +15,13 @@ from langchain_core.output_parsers import StrOutputParser
 
 # 引入我们的 LLM 工厂
 from app.services.llm_factory import get_llm
+from app.core.config import settings
+from app.services.embedding_store import EmbeddingStore, IVFIndex, exact_search, get_embedding_store
+from app.services.alias_store import get_alias_store
 
 # 尝试导入向量库
 try:
-    from sentence_transformers import SentenceTransformer, util
+    from sentence_transformers import SentenceTransformer
     HAS_VECTOR_MODEL = True
 except ImportError:
     HAS_VECTOR_MODEL = False
@@ -53,6 +63,54 @@ class AuditLogger:
     def get_log_df(self):
         return pd.DataFrame(self.logs)
 
+VECTOR_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+VECTOR_INDEX_CACHE_SIZE = 8  # 缓存的主数据向量索引个数 (按候选列表内容区分)
+
+
+class VectorIndex:
+    """
+    一份候选列表 (通常是主数据表的 Key 列) 的归一化向量，编码一次后可被多次批量查询。
+    - 提供 store 时向量从持久化缓存读取，只编码缓存中没有的文本。
+    - 候选数 >= ANN_MIN_ENTRIES 时建立 IVF 近似索引，否则精确检索。
+    """
+
+    def __init__(self, model, keys: list, store: EmbeddingStore = None):
+        self.model = model
+        self.keys = list(keys)
+        self.store = store
+        self.embeddings = self._lookup(self.keys)
+        self.ann = None
+        if len(self.keys) >= settings.ANN_MIN_ENTRIES:
+            self.ann = IVFIndex(self.embeddings)
+            self.embeddings = None  # 索引内已按桶保存一份，释放原矩阵
+
+    def _encode(self, texts: list) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=64, convert_to_numpy=True,
+                                            normalize_embeddings=True), dtype=np.float32)
+
+    def _lookup(self, texts: list) -> np.ndarray:
+        if self.store is not None:
+            return self.store.vectors(self.store.rows_for(texts, self._encode))
+        return self._encode(texts)
+
+    def query(self, sources: list, top_k: int = 5, min_score: float = 0.1) -> list:
+        """所有源实体一次编码 (或从缓存读取)，批量检索 Top K；返回每个源实体的 [(候选, 分数)]"""
+        sources = list(sources)
+        if not sources or not self.keys:
+            return [[] for _ in sources]
+        queries = self._lookup(sources)
+        k = min(top_k, len(self.keys))
+        search = self.ann.search if self.ann is not None else \
+            (lambda q, n: exact_search(self.embeddings, q, n))
+        indices, scores = search(queries, k)
+        results = []
+        for idx_row, score_row in zip(indices, scores):
+            # 💡 降级阈值：只要有一点点相关(0.1)就召回，交给 LLM 去判断
+            results.append([(self.keys[i], float(sc)) for i, sc in zip(idx_row, score_row)
+                            if i >= 0 and sc > min_score])
+        return results
+
+
 class VectorMatcher:
     """语义向量匹配器 (负责召回 Candidates)"""
     _instance = None
@@ -61,55 +119,92 @@ class VectorMatcher:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(VectorMatcher, cls).__new__(cls)
+            cls._instance._indexes = OrderedDict()
+            cls._instance._index_lock = threading.Lock()
             if HAS_VECTOR_MODEL:
                 print("⏳ [System] 正在加载语义向量模型 (paraphrase-multilingual)...")
-                cls._model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+                cls._model = SentenceTransformer(VECTOR_MODEL_NAME)
                 print("✅ 模型加载完毕")
         return cls._instance
 
+    def get_index(self, target_candidates) -> VectorIndex:
+        """候选列表只编码一次：同一份主数据在多次合并之间复用已建好的索引"""
+        keys = [str(t) for t in target_candidates]
+        digest = hashlib.sha1("\0".join(keys).encode("utf-8")).hexdigest()
+        with self._index_lock:
+            index = self._indexes.get(digest)
+            if index is not None:
+                self._indexes.move_to_end(digest)
+                return index
+        start = time.perf_counter()
+        store = get_embedding_store(VECTOR_MODEL_NAME) if settings.EMBEDDING_STORE_ENABLED else None
+        index = VectorIndex(self._model, keys, store=store)
+        print(f"🧭 [Vector] 已编码 {len(keys)} 个候选 ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        with self._index_lock:
+            self._indexes[digest] = index
+            while len(self._indexes) > VECTOR_INDEX_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+        return index
+
+    def get_candidates_batch(self, source_words: list, target_candidates: list, top_k=5) -> list:
+        """批量召回：返回与 source_words 一一对应的 Top K 候选列表"""
+        if not self._model:
+            return [[] for _ in source_words]
+        return self.get_index(target_candidates).query(source_words, top_k=top_k)
+
     def get_candidates(self, source_word: str, target_candidates: list, top_k=5):
         """返回最相似的 Top K 个候选项"""
         if not self._model: return []
-        
-        source_emb = self._model.encode(source_word, convert_to_tensor=True)
-        target_embs = self._model.encode(target_candidates, convert_to_tensor=True)
-        
-        cosine_scores = util.cos_sim(source_emb, target_embs)[0]
-        
-        # 获取 Top K
-        k = min(top_k, len(target_candidates))
-        top_results = np.argpartition(-cosine_scores.cpu().numpy(), range(k))[:k]
-        
-        candidates = []
-        for idx in top_results:
-            score = cosine_scores[idx].item()
-            # 💡 降级阈值：只要有一点点相关(0.1)就召回，交给 LLM 去判断
-            if score > 0.1:
-                candidates.append((target_candidates[idx], score))
-        
-        candidates.sort(key=lambda x: x[1], reverse=True)
-        return candidates
+        return self.get_candidates_batch([source_word], target_candidates, top_k=top_k)[0]
+
+JUDGE_RULES = """
+            你是一个实体对齐专家。
+            任务：判断左边的【源实体】是否对应右边候选列表中的某个【标准实体】。
+            
+            规则：
+            1. 利用你的世界知识（包括中英文名、简称、别名、拼音、收购关系）。
+               例如: "ByteDance" == "字节跳动", "Meituan" == "美团点评", "JD" == "京东"。
+            2. 如果找到了确定的匹配，只返回该标准实体的名称。
+            3. 如果所有候选都不匹配，或者非常不确定，返回 "None"。
+"""
+
+
+class JudgeStats:
+    """一次批量裁决的调用统计 (写入审计日志)"""
+
+    def __init__(self):
+        self.items = 0
+        self.batch_calls = 0
+        self.retry_calls = 0
+        self.failed_batches = 0
+        self.seconds = 0.0
+        self.unconfirmed = set()  # 单条重试后仍为 None 的实体 (可能是调用失败，不能当作 "无匹配" 结论)
+
+    @property
+    def calls(self) -> int:
+        return self.batch_calls + self.retry_calls
+
+    def describe(self) -> str:
+        return (f"LLM 裁决 {self.items} 个实体：调用 {self.calls} 次 (批量 {self.batch_calls} 次，"
+                f"单条重试 {self.retry_calls} 次)，耗时 {self.seconds:.1f}s")
+
 
 class LLMJudge:
     """LLM 裁判：利用大模型的世界知识做最终决定"""
     def __init__(self):
-        self.llm = get_llm(temperature=0)
+        self.llm = get_llm(temperature=0, chain="llm_judge")
         
+    @staticmethod
+    def _names(candidates: list) -> list:
+        return [c[0] if isinstance(c, tuple) or isinstance(c, list) else c for c in candidates]
+
     def judge(self, source: str, candidates: list) -> str:
         if not candidates: return None
         
-        cand_names = [c[0] if isinstance(c, tuple) or isinstance(c, list) else c for c in candidates]
+        cand_names = self._names(candidates)
         
         prompt = ChatPromptTemplate.from_messages([
-            ("system", """
-            你是一个实体对齐专家。
-            任务：判断左边的【源实体】是否对应右边候选列表中的某个【标准实体】。
-            
-            规则：
-            1. 利用你的世界知识（包括中英文名、简称、别名、拼音、收购关系）。
-               例如: "ByteDance" == "字节跳动", "Meituan" == "美团点评", "JD" == "京东"。
-            2. 如果找到了确定的匹配，只返回该标准实体的名称。
-            3. 如果所有候选都不匹配，或者非常不确定，返回 "None"。
+            ("system", JUDGE_RULES + """
             4. 只返回名称字符串，不要有任何标点或解释。
             """),
             ("human", "源实体: '{source}'\n候选列表: {candidates}")
@@ -126,11 +221,135 @@ class LLMJudge:
         except:
             return None
 
+    # ---------- 批量裁决 ----------
+    def _batch_prompt(self) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages([
+            ("system", JUDGE_RULES + """
+            4. 一次会给出多个源实体 (带编号)，逐个判断，不匹配时 match 为 null。
+            5. 只输出 JSON 数组，不要有任何解释，格式：[{{"id": 1, "match": "标准实体名称"}}, {{"id": 2, "match": null}}]
+            """),
+            ("human", "{items}")
+        ])
+
+    @staticmethod
+    def _render_items(batch: list, shared: Optional[list]) -> str:
+        lines = []
+        if shared is not None:
+            lines.append(f"候选列表 (所有源实体共用): {shared}")
+            lines.extend(f"{i + 1}. 源实体: '{source}'" for i, (source, _) in enumerate(batch))
+        else:
+            lines.extend(f"{i + 1}. 源实体: '{source}' | 候选列表: {LLMJudge._names(cands)}"
+                         for i, (source, cands) in enumerate(batch))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _parse_batch(raw: str, batch: list) -> Dict[int, Optional[str]]:
+        """解析 JSON 结果；返回 {批内序号: 匹配结果}，格式不对或匹配值不在候选中的条目不返回 (稍后单条重试)"""
+        text = str(raw).replace("```json", "").replace("```", "").strip()
+        start, end = text.find("["), text.rfind("]")
+        try:
+            items = json.loads(text[start:end + 1]) if start >= 0 and end > start else None
+        except ValueError:
+            items = None
+        if not isinstance(items, list):
+            return {}
+        parsed = {}
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get("id"), int):
+                continue
+            pos = item["id"] - 1
+            if not 0 <= pos < len(batch):
+                continue
+            match = item.get("match")
+            if match in (None, "None", "null", ""):
+                parsed[pos] = None
+            elif isinstance(match, str) and match.strip() in LLMJudge._names(batch[pos][1]):
+                parsed[pos] = match.strip()
+        return parsed
+
+    def judge_many(self, items: list, shared_candidates: Optional[list] = None,
+                   batch_size: Optional[int] = None, concurrency: Optional[int] = None):
+        """
+        批量裁决：items 为 [(源实体, 候选列表)]，每个 Prompt 裁决 batch_size 个源实体 (JSON 输出)，
+        各批次按 concurrency 并发调用。整批失败或个别条目缺失/不合法时，只对这些条目逐个重试。
+        shared_candidates 不为空时 (全量匹配模式) 候选列表在每个 Prompt 中只出现一次。
+        返回 ({源实体: 匹配结果或 None}, JudgeStats)。
+        """
+        stats = JudgeStats()
+        stats.items = len(items)
+        results: Dict[str, Optional[str]] = {}
+        if not items:
+            return results, stats
+        started = time.perf_counter()
+        batch_size = batch_size or settings.LLM_JUDGE_BATCH_SIZE
+        concurrency = concurrency or settings.LLM_JUDGE_CONCURRENCY
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        shared = self._names(shared_candidates) if shared_candidates is not None else None
+
+        chain = self._batch_prompt() | self.llm | StrOutputParser()
+        outputs = chain.batch([{"items": self._render_items(b, shared)} for b in batches],
+                              config={"max_concurrency": concurrency}, return_exceptions=True)
+        stats.batch_calls = len(batches)
+
+        retry = []
+        for batch, output in zip(batches, outputs):
+            parsed = {} if isinstance(output, Exception) else self._parse_batch(output, batch)
+            if len(parsed) < len(batch):
+                stats.failed_batches += 1
+            for pos, (source, cands) in enumerate(batch):
+                if pos in parsed:
+                    results[source] = parsed[pos]
+                else:
+                    retry.append((source, cands))
+
+        if retry:
+            print(f"   🔁 [LLM Judge] {len(retry)} 个实体批量结果缺失或不合法，逐个重试")
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for (source, _), choice in zip(retry, pool.map(lambda item: self.judge(*item), retry)):
+                    results[source] = choice
+                    if choice is None:
+                        stats.unconfirmed.add(source)
+            stats.retry_calls = len(retry)
+        stats.seconds = time.perf_counter() - started
+        return results, stats
+
+def fuzzy_top_k(left_keys, right_keys, k: int = 1, scorer=fuzz.WRatio, score_cutoff: float = 0,
+                chunk_mb: int = None, workers: int = None):
+    """
+    批量模糊打分：分块计算 left×right 得分矩阵 (rapidfuzz cdist，多线程)，向量化提取每行 Top K。
+    - 每块行数按 chunk_mb 预算计算，峰值内存与右表大小成正比、与左表大小无关。
+    - 得分保持 float64 且同分时取右表中靠前的一项，与 process.extractOne 的结果一致。
+    - 返回 (indices, scores)，形状均为 (len(left), k)；得分低于 score_cutoff 的位置 index 为 -1。
+    """
+    left_keys, right_keys = list(left_keys), list(right_keys)
+    k = max(1, min(k, len(right_keys)))
+    indices = np.full((len(left_keys), k), -1, dtype=np.int64)
+    scores = np.zeros((len(left_keys), k), dtype=np.float64)
+    if not left_keys or not right_keys:
+        return indices, scores
+
+    chunk_bytes = (chunk_mb or settings.FUZZY_CHUNK_MB) * 1024 * 1024
+    rows = max(1, int(chunk_bytes // (len(right_keys) * np.dtype(np.float64).itemsize)))
+    workers = settings.FUZZY_WORKERS if workers is None else workers
+    for start in range(0, len(left_keys), rows):
+        block = process.cdist(left_keys[start:start + rows], right_keys, scorer=scorer, dtype=np.float64,
+                              score_cutoff=score_cutoff or None, workers=workers)
+        if k == 1:
+            top = np.argmax(block, axis=1)[:, None]  # argmax 同分取第一个
+        else:
+            top = np.argsort(-block, axis=1, kind="stable")[:, :k]  # 稳定排序：同分按位置升序
+        top_scores = np.take_along_axis(block, top, axis=1)
+        indices[start:start + len(block)] = np.where(top_scores >= score_cutoff, top, -1)
+        scores[start:start + len(block)] = top_scores
+    return indices, scores
+
+
 def smart_merge(left_df: pd.DataFrame, right_df: pd.DataFrame, 
                 left_on: str, right_on: str, 
-                logger: AuditLogger = None) -> pd.DataFrame:
+                logger: AuditLogger = None, namespace: Optional[str] = None) -> pd.DataFrame:
     """
-    智能三级匹配：Fuzz -> Adaptive LLM
+    智能三级匹配：别名库 -> Fuzz -> Adaptive LLM
+    namespace 为别名库的租户命名空间 (缺省 ALIAS_DEFAULT_NAMESPACE)；本次确认的映射会写回该命名空间。
     """
     left_keys = left_df[left_on].astype(str).unique()
     right_keys = right_df[right_on].astype(str).unique()
@@ -148,32 +367,72 @@ def smart_merge(left_df: pd.DataFrame, right_df: pd.DataFrame,
     if use_full_llm_match:
         print("   🚀 [Strategy] 目标数据量较小，启用 LLM 全量精准匹配模式")
     
+    # Level 0: 别名库 (已确认过的映射直接复用，命中的 key 不参与后续打分和 LLM 裁决)
+    aliases = {}
+    if settings.ALIAS_STORE_ENABLED:
+        aliases = get_alias_store().lookup(namespace, left_keys, right_keys)
+        if aliases:
+            print(f"   📖 [Alias] 别名库命中 {len(aliases)}/{len(left_keys)}")
+    pending = [lk for lk in left_keys if lk not in aliases]
+
+    # Level 1: Fuzz (批量计算得分矩阵，一次得到所有左表 key 的最佳匹配)
+    fuzz_idx, fuzz_scores = fuzzy_top_k(pending, right_keys, k=1, score_cutoff=90)
+    fuzz_hits = {lk: (right_keys[idx], score)
+                 for lk, idx, score in zip(pending, fuzz_idx[:, 0], fuzz_scores[:, 0]) if idx >= 0}
+
+    # Level 2 召回：模糊匹配未命中的 key 一次性批量编码，主数据向量索引跨调用复用
+    vector_candidates = {}
+    if vector_matcher and not use_full_llm_match:
+        unresolved = [lk for lk in pending if lk not in fuzz_hits]
+        if unresolved:
+            vector_candidates = dict(zip(unresolved, vector_matcher.get_candidates_batch(unresolved, right_keys, top_k=5)))
+
+    # Level 2: LLM (模糊匹配未命中且有候选的 key 批量、并发裁决)
+    judge_items = []
+    for lk in pending:
+        if lk in fuzz_hits:
+            continue
+        candidates = []
+        if use_full_llm_match:
+            candidates = list(right_keys)
+        elif vector_matcher:
+            candidates = vector_candidates.get(lk, [])
+        if candidates:
+            judge_items.append((lk, candidates))
+    judged, judge_stats = llm_judge.judge_many(
+        judge_items, shared_candidates=list(right_keys) if use_full_llm_match else None)
+    judged_candidates = dict(judge_items)
+    if judge_items:
+        print(f"   ⚖️ [LLM Judge] {judge_stats.describe()}")
+
+    learned = []
     for lk in left_keys:
         final_target = None
         method = "None"
         
+        # Level 0: 别名库
+        if lk in aliases:
+            final_target = aliases[lk]["target"]
+            method = f"Alias({aliases[lk]['method']})"
+        
         # Level 1: Fuzz
-        match = process.extractOne(lk, right_keys, scorer=fuzz.WRatio)
-        if match:
-            target, score, _ = match
-            if score >= 90:
-                final_target = target
-                method = f"Fuzz({int(score)})"
+        elif lk in fuzz_hits:
+            final_target, score = fuzz_hits[lk]
+            method = f"Fuzz({int(score)})"
+            if "fuzz" in settings.ALIAS_LEARN_METHODS and lk != final_target:
+                learned.append({"source": lk, "target": final_target, "method": "fuzz", "score": float(score)})
         
         # Level 2: LLM
-        if not final_target:
-            candidates = []
-            if use_full_llm_match:
-                candidates = list(right_keys)
-            elif vector_matcher:
-                candidates = vector_matcher.get_candidates(lk, right_keys, top_k=5)
-            
-            if candidates:
-                llm_choice = llm_judge.judge(lk, candidates)
-                if llm_choice:
-                    final_target = llm_choice
-                    source_type = "FullList" if use_full_llm_match else f"VectorTop{len(candidates)}"
-                    method = f"LLM({source_type})"
+        elif judged.get(lk):
+            final_target = judged[lk]
+            source_type = "FullList" if use_full_llm_match else f"VectorTop{len(judged_candidates[lk])}"
+            method = f"LLM({source_type})"
+            if "llm" in settings.ALIAS_LEARN_METHODS:
+                learned.append({"source": lk, "target": final_target, "method": "llm", "score": 100.0})
+        
+        # LLM 明确判定无匹配：同样记录 (绑定主数据指纹)，主数据不变时不再重复裁决
+        elif lk in judged and lk not in judge_stats.unconfirmed and "llm" in settings.ALIAS_LEARN_METHODS:
+            learned.append({"source": lk, "target": None, "method": "llm", "score": 0.0})
         
         # 记录
         if final_target:
@@ -182,6 +441,14 @@ def smart_merge(left_df: pd.DataFrame, right_df: pd.DataFrame,
                 matched_log.append(f"[{method}] '{lk}' -> '{final_target}'")
         else:
             mapping[lk] = None
+
+    # 写回别名库：审计日志中记录的已确认映射 (Fuzz 达到阈值 / LLM 裁决) 下次直接复用
+    learned_count = 0
+    if settings.ALIAS_STORE_ENABLED:
+        store = get_alias_store()
+        learned_count = store.record(namespace, learned, right_keys=right_keys) if learned else 0
+        if aliases and not learned_count:
+            store.flush(namespace)  # 只更新命中次数
             
     # 执行映射
     temp_col = f"_smart_join_{right_on}"
@@ -192,6 +459,9 @@ def smart_merge(left_df: pd.DataFrame, right_df: pd.DataFrame,
     if logger:
         success_count = len([x for x in mapping.values() if x is not None])
         desc = f"智能匹配: 输入 {len(left_keys)} 个实体，成功匹配 {success_count} 个。"
+        if settings.ALIAS_STORE_ENABLED:
+            hit_rate = len(aliases) / len(left_keys) if len(left_keys) else 0.0
+            desc += f"\n别名库命中 {len(aliases)}/{len(left_keys)} ({hit_rate:.0%})，新学习 {learned_count} 条。"
         
         if matched_log:
             # 将匹配细节追加到描述中
@@ -199,6 +469,8 @@ def smart_merge(left_df: pd.DataFrame, right_df: pd.DataFrame,
             desc += f"\n\n--- 匹配详情 ({len(matched_log)} 条) ---\n{detail_str}"
             
         logger.info("Smart Merge", desc, affected_rows=len(matched_log))
+        if judge_items:
+            logger.info("LLM Judge", judge_stats.describe(), affected_rows=judge_stats.items)
         
         if matched_log:
             print(f"   ✨ 匹配高光时刻:\n   " + "\n   ".join(matched_log[:5]) + "...")
@@ -321,4 +593,154 @@ def smart_reconcile(df_sys: pd.DataFrame, df_bank: pd.DataFrame,
         logger.info("Smart Reconcile", desc, affected_rows=len(merged))
         print("   📊 对账统计:\n" + desc)
 
-    return merged
\ No newline at end of file
+    return merged
+
+# ==========================================
+# 🧹 L1 数据体检工具 (向量化)
+# ==========================================
+NEGATIVE_COL_PATTERN = r"(金额|价|量|Amount|Price|Qty|Count)"
+EXTREME_COL_PATTERN = r"(Qty|Count|数量)"
+PRICE_COL_PATTERN = r"(单价|Price)"
+QTY_COL_PATTERN = r"(数量|Qty)"
+TOTAL_COL_PATTERN = r"(总金额|Total|Amount)"
+_NUMERIC_NOISE = r"[¥￥$,，\s]"
+_NUMERIC_SNIFF_SAMPLE = 200
+
+
+def _find_col(columns, pattern: str, exclude=()) -> str:
+    return next((c for c in columns if c not in exclude and re.search(pattern, str(c), re.I)), None)
+
+
+def _coerce_numeric_columns(df: pd.DataFrame, min_ratio: float) -> list:
+    """
+    文本列中 "看起来像数字" 的列 (去掉 ¥ , 空格后可解析的比例 >= min_ratio) 转为数值。
+    先在样本上判断，只有通过的列才做整列转换；含 3 个以上连续字母的列视为 ID/文本，跳过。
+    """
+    converted = []
+    for col in df.columns:
+        series = df[col]
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+        non_null = series.dropna()
+        if non_null.empty:
+            continue
+        sample = non_null.iloc[:_NUMERIC_SNIFF_SAMPLE].astype(str)
+        if not sample.str.contains(r"\d").any() or sample.str.contains(r"[a-zA-Z]{3,}").any():
+            continue
+        if pd.to_numeric(sample.str.replace(_NUMERIC_NOISE, "", regex=True), errors="coerce").notna().mean() < min_ratio:
+            continue
+        numbers = pd.to_numeric(non_null.astype(str).str.replace(_NUMERIC_NOISE, "", regex=True), errors="coerce")
+        if numbers.notna().mean() >= min_ratio:
+            df[col] = numbers.reindex(series.index)
+            converted.append(col)
+    return converted
+
+
+def _bool_mask(mask) -> pd.Series:
+    """可空类型 (Int64 / Float64 / boolean) 的比较结果含 NA，统一视为 False，避免 NA 传染到剔除掩码"""
+    return mask.fillna(False).astype(bool)
+
+
+def _log_new_exclusions(logger, step: str, desc: str, df: pd.DataFrame, mask: pd.Series, already: pd.Series):
+    """只记录尚未被前面规则剔除的行：同一行命中多条规则时只计一次，审计中的剔除行数与实际一致"""
+    if not logger:
+        return
+    new = mask & ~already
+    overlap = int(mask.sum()) - int(new.sum())
+    if overlap:
+        desc += f" (另有 {overlap} 行已在前面的规则中剔除)"
+    if new.any() or overlap:
+        logger.log_exclusion(step, desc, df[new])
+
+
+def auto_clean(dfs: dict, logger: AuditLogger = None, tables: list = None,
+               drop_duplicates: bool = True, coerce_numeric: bool = True, min_numeric_ratio: float = 0.9,
+               drop_negative: bool = True, extreme_threshold: float = 100000, extreme_sigma: float = None,
+               check_total: bool = True, total_tolerance: float = 1.0, drop_logic_errors: bool = True) -> pd.DataFrame:
+    """
+    通用数据体检 (L1)：去重 → 数值转换 → 负数 / 极端值检测 → 单价×数量=总金额 校验。
+    - 全部使用列级向量运算；各项检测先各自算出布尔掩码，最后每张表只过滤一次。
+    - 逻辑冲突 (P*Q != Total) 不修改数值，只记录 (drop_logic_errors=True 时剔除)，供人工核查。
+    - 清洗结果写回 dfs，返回每张表一行的体检报告。
+    """
+    report = []
+    names = tables or [n for n in dfs if not str(n).startswith("__") and isinstance(dfs[n], pd.DataFrame)]
+    for name in names:
+        df = dfs[name]
+        print(f"\n### 正在分析表: {name}")
+        row = {"表名": name, "原始行数": len(df)}
+
+        # 1. 完全重复行
+        if drop_duplicates:
+            dup_mask = df.duplicated()
+            row["重复行"] = int(dup_mask.sum())
+            if row["重复行"]:
+                print(f"- 🗑️ 剔除 {row['重复行']} 条完全重复行")
+                if logger:
+                    logger.log_exclusion(f"重复剔除-{name}", "完全重复行", df[dup_mask])
+                df = df[~dup_mask]
+        df = df.copy(deep=False)
+
+        # 2. 数值转换
+        converted = _coerce_numeric_columns(df, min_numeric_ratio) if coerce_numeric else []
+        row["转为数值的列"] = ", ".join(map(str, converted))
+        if converted:
+            print(f"- 🔢 转为数值: {row['转为数值的列']}")
+            if logger:
+                logger.info(f"数值转换-{name}", f"已转为数值的列: {row['转为数值的列']}", affected_rows=len(df))
+
+        # 3. 异常值 (负数 / 极端值) 与 4. 逻辑一致性：只计算掩码，最后统一过滤
+        drop_mask = pd.Series(False, index=df.index)
+        numeric_cols = df.select_dtypes(include=[np.number]).columns
+        negative_rows = pd.Series(False, index=df.index)
+        extreme_rows = pd.Series(False, index=df.index)
+        for col in numeric_cols:
+            values = df[col]
+            if drop_negative and re.search(NEGATIVE_COL_PATTERN, str(col), re.I):
+                mask = _bool_mask(values < 0)
+                if mask.any():
+                    negative_rows |= mask
+                    print(f"- ⚠️ {col}: 发现 {int(mask.sum())} 个负数 (已记录并剔除)")
+                    _log_new_exclusions(logger, f"负数异常-{name}", f"{col} 为负数", df, mask, drop_mask)
+                    drop_mask |= mask
+            if re.search(EXTREME_COL_PATTERN, str(col), re.I):
+                mask = values > extreme_threshold if extreme_threshold is not None else pd.Series(False, index=df.index)
+                mask = _bool_mask(mask)
+                if extreme_sigma:
+                    mask |= _bool_mask(values > values.mean() + extreme_sigma * values.std())
+                if mask.any():
+                    extreme_rows |= mask
+                    print(f"- ⚠️ {col}: 发现 {int(mask.sum())} 个极端大值 (已记录并剔除)")
+                    _log_new_exclusions(logger, f"极端值-{name}", f"{col} 过大", df, mask, drop_mask)
+                    drop_mask |= mask
+        row["负数"] = int(negative_rows.sum())  # 按行计数 (同一行多列为负只计一次)
+        row["极端值"] = int(extreme_rows.sum())
+
+        logic_errors = 0
+        if check_total:
+            p_col = _find_col(numeric_cols, PRICE_COL_PATTERN)
+            q_col = _find_col(numeric_cols, QTY_COL_PATTERN, exclude=(p_col,))
+            t_col = _find_col(numeric_cols, TOTAL_COL_PATTERN, exclude=(p_col, q_col))
+            if p_col and q_col and t_col:
+                mask = _bool_mask((df[p_col] * df[q_col] - df[t_col]).abs() > total_tolerance)
+                logic_errors = int(mask.sum())
+                if logic_errors:
+                    action = "已记录并剔除" if drop_logic_errors else "已记录"
+                    print(f"- ⚠️ 发现 {logic_errors} 条金额逻辑不符 ({p_col} × {q_col} ≠ {t_col}，{action})")
+                    desc = f"{p_col} × {q_col} ≠ {t_col} (容差 {total_tolerance})"
+                    if drop_logic_errors:
+                        _log_new_exclusions(logger, f"逻辑校验失败-{name}", desc, df, mask, drop_mask)
+                        drop_mask |= mask
+                    elif logger:
+                        logger.log_exclusion(f"逻辑校验失败-{name}", desc, df[mask])
+        row["逻辑不符"] = logic_errors
+
+        # 5. 统一过滤并写回
+        if drop_mask.any():
+            df = df[~drop_mask]
+        row["空值单元格"] = int(df.isna().sum().sum())
+        row["处理后行数"] = len(df)
+        dfs[name] = df
+        print(f"- 处理后: {len(df)} 行")
+        report.append(row)
+    return pd.DataFrame(report)
@@ -0,0 +1,106 @@
+"""
+生成代码静态预检基准：在 LLM 输出样例语料上对比 "直接执行" 与 "先静态检查再执行"
+(检出率、误报率、失败执行次数、校验耗时 vs 失败执行耗时)
+
+用法:
+    python benchmarks/bench_code_validator.py [--repeat 20]
+
+语料 benchmarks/data/worker_outputs.jsonl 中 label 含义：
+  ok 正常代码 | runtime_error 执行会报错 | forbidden 可执行但违反约定 (to_excel / read_excel / plt.show 等)
+forbidden 样例不会真正执行 (避免写文件)。
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.code_validator import validate_code
+from app.services.workflow import execute_code
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "worker_outputs.jsonl")
+
+
+def make_context(rows: int = 200) -> dict:
+    rng = np.random.default_rng(0)
+    qty = rng.integers(-2, 50, rows)
+    price = rng.uniform(10, 500, rows).round(2)
+    sales = pd.DataFrame({
+        "日期": pd.date_range("2024-01-01", periods=rows, freq="D"),
+        "订单号": [f"ORD-{i:05d}" for i in range(rows)],
+        "客户名称": rng.choice(["腾讯", "阿里巴巴", "字节跳动", "京东"], rows),
+        "数量": qty,
+        "单价": price,
+        "总金额": (qty * price).round(2),
+    })
+    bank = pd.DataFrame({
+        "交易日期": pd.date_range("2024-01-01", periods=rows, freq="D"),
+        "流水号": [f"ORD-{i:05d}" for i in range(rows)],
+        "对方户名": rng.choice(["腾讯科技", "阿里", "字节", "京东商城"], rows),
+        "金额": (qty * price).round(2),
+    })
+    return {"sales.xlsx": sales, "bank.xlsx": bank}
+
+
+def load_corpus(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20, help="校验耗时取多次平均")
+    args = parser.parse_args()
+
+    corpus = load_corpus(CORPUS)
+    context = make_context()
+
+    rows = []
+    for item in corpus:
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            issues = validate_code(item["code"], context)
+        validate_ms = (time.perf_counter() - t0) * 1000 / args.repeat
+
+        failed, exec_ms = None, 0.0
+        if item["label"] != "forbidden":
+            t0 = time.perf_counter()
+            result = execute_code(copy.deepcopy(context), item["code"])
+            exec_ms = (time.perf_counter() - t0) * 1000
+            failed = not result["success"]
+        rows.append((item, issues, failed, validate_ms, exec_ms))
+
+    ok = [r for r in rows if r[0]["label"] == "ok"]
+    runtime = [r for r in rows if r[2]]
+    forbidden = [r for r in rows if r[0]["label"] == "forbidden"]
+    mislabelled = [r[0]["id"] for r in rows if r[0]["label"] != "forbidden" and r[2] != (r[0]["label"] == "runtime_error")]
+
+    caught = [r for r in runtime if r[1]]
+    false_pos = [r for r in ok if r[1]]
+    forbidden_caught = [r for r in forbidden if r[1]]
+    executions = len(rows) - len(forbidden)
+
+    print(f"\n🔎 语料 {len(rows)} 条 (ok {len(ok)} | 运行时错误 {len(runtime)} | 违反约定 {len(forbidden)})")
+    if mislabelled:
+        print(f"   ⚠️ 标注与实际执行结果不符: {mislabelled}")
+    print(f"   运行时错误检出: {len(caught)}/{len(runtime)} ({len(caught) / max(len(runtime), 1):.0%})")
+    print(f"   违反约定检出:   {len(forbidden_caught)}/{len(forbidden)}")
+    print(f"   误报 (正常代码被拒): {len(false_pos)}/{len(ok)}")
+    print(f"   失败的执行: 直接执行 {len(runtime)}/{executions} ({len(runtime) / executions:.0%}) → "
+          f"静态检查后 {len(runtime) - len(caught)}/{executions} ({(len(runtime) - len(caught)) / executions:.0%})")
+    avg_validate = sum(r[3] for r in rows) / len(rows)
+    avg_failed_exec = sum(r[4] for r in runtime) / max(len(runtime), 1)
+    saved = sum(r[4] for r in caught)
+    print(f"   校验耗时: {avg_validate:.2f} ms/条 | 失败执行耗时: {avg_failed_exec:.1f} ms/条 | "
+          f"省去失败执行合计 {saved:.0f} ms")
+    for item, issues, failed, _, _ in rows:
+        if failed and not issues:
+            print(f"   · 未检出 {item['id']} ({item['note']})")
+        if item["label"] == "ok" and issues:
+            print(f"   ❌ 误报 {item['id']} ({item['note']}): {issues[0]}")
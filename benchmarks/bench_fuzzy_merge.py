@@ -0,0 +1,101 @@
+"""
+smart_merge Level 1 (模糊匹配) 基准：逐个 process.extractOne vs 分块 cdist 得分矩阵 (fuzzy_top_k)
+在 1k / 10k / 100k 个脏客户名上对比耗时，并校验两者得到的映射完全一致。
+
+用法:
+    python benchmarks/bench_fuzzy_merge.py [--left 1000 10000 100000] [--right 5000] [--legacy-max 10000]
+
+左表超过 --legacy-max 时，逐个匹配只跑前 --legacy-max 个 key，总耗时按比例外推 (标注 *)。
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+from rapidfuzz import process, fuzz
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.tools import fuzzy_top_k
+
+SYLLABLES = list("华创鑫泰隆盛恒达远博信和安德兴宏嘉瑞丰佳美新天中海金银")
+INDUSTRIES = ["科技", "贸易", "实业", "电子", "物流", "传媒", "制造", "咨询", "食品", "医药"]
+SUFFIXES = ["有限公司", "股份有限公司", "集团有限公司"]
+CITIES = ["北京", "上海", "深圳", "杭州", "成都", "武汉"]
+
+
+def make_master(n: int, rng) -> list:
+    names = set()
+    while len(names) < n:
+        core = "".join(rng.choice(SYLLABLES, rng.integers(2, 4)))
+        names.add(f"{rng.choice(CITIES)}{core}{rng.choice(INDUSTRIES)}{rng.choice(SUFFIXES)}")
+    return sorted(names)
+
+
+def make_dirty(master: list, n: int, rng) -> list:
+    """脏数据：去掉城市/后缀、插入空格、错别字、括号备注，另有 10% 完全无关的名字"""
+    dirty = []
+    for _ in range(n):
+        if rng.random() < 0.1:
+            dirty.append("".join(rng.choice(SYLLABLES, 4)) + "工作室")
+            continue
+        name = master[rng.integers(len(master))]
+        roll = rng.random()
+        if roll < 0.25:
+            name = name[2:]
+        elif roll < 0.45:
+            name = next((name[:-len(s)] for s in SUFFIXES if name.endswith(s)), name)
+        elif roll < 0.6:
+            i = rng.integers(1, len(name))
+            name = name[:i] + " " + name[i:]
+        elif roll < 0.8:
+            i = rng.integers(len(name))
+            name = name[:i] + rng.choice(SYLLABLES) + name[i + 1:]
+        else:
+            name = f"{name}(客户)"
+        dirty.append(name)
+    return list(dict.fromkeys(dirty))
+
+
+def legacy_mapping(left: list, right: list) -> dict:
+    mapping = {}
+    for lk in left:
+        match = process.extractOne(lk, right, scorer=fuzz.WRatio)
+        mapping[lk] = match[0] if match and match[1] >= 90 else None
+    return mapping
+
+
+def batched_mapping(left: list, right: list) -> dict:
+    idx, _ = fuzzy_top_k(left, right, k=1, score_cutoff=90)
+    return {lk: right[i] if i >= 0 else None for lk, i in zip(left, idx[:, 0])}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--left", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--right", type=int, default=5_000)
+    parser.add_argument("--legacy-max", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    right = make_master(args.right, rng)
+    print(f"🏢 主数据 {len(right)} 个标准客户名 | CPU {os.cpu_count()} 核\n")
+    print(f"{'左表 key':>9} | {'逐个 extractOne':>15} | {'分块 cdist':>10} | {'加速':>6} | {'匹配数':>7} | 映射一致")
+    for n in args.left:
+        left = make_dirty(right, n, rng)
+        sample = left[:args.legacy_max]
+
+        t0 = time.perf_counter()
+        legacy = legacy_mapping(sample, right)
+        legacy_s = (time.perf_counter() - t0) * len(left) / len(sample)
+
+        t0 = time.perf_counter()
+        batched = batched_mapping(left, right)
+        batched_s = time.perf_counter() - t0
+
+        same = all(batched[k] == v for k, v in legacy.items())
+        matched = sum(v is not None for v in batched.values())
+        mark = "*" if len(sample) < len(left) else " "
+        print(f"{len(left):>9,} | {legacy_s:>13.2f}s{mark} | {batched_s:>9.2f}s | {legacy_s / batched_s:>5.1f}x | "
+              f"{matched:>7,} | {'✅' if same else '❌'} ({len(sample):,} 个 key 对比)")
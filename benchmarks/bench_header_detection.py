@@ -0,0 +1,111 @@
+"""
+Sheet/Header 探测基准：启发式探测器 vs LLM 路径 (准确率 + 延迟)
+
+用法:
+    python benchmarks/bench_header_detection.py [--n 60] [--llm]
+
+--llm 需要配置 GOOGLE_API_KEY，会对同一批工作簿调用现有 LLM 路径做对比。
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.header_detector import HeuristicDetector
+from app.services.ingestion import llm_select_sheet, llm_detect_header
+
+HEADER_POOL = ["日期", "订单号", "客户名称", "产品", "数量", "单价", "总金额", "摘要",
+               "Date", "ID", "Name", "Amount", "Code", "部门", "流水号", "备注"]
+
+
+def make_workbook(path: str, rng: random.Random) -> tuple:
+    """生成一个带干扰项的工作簿，返回 (真实 Sheet, 真实 Header 行号)"""
+    n_cols = rng.randint(3, 8)
+    headers = rng.sample(HEADER_POOL, n_cols)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(rng.randint(20, 200)):
+        row = []
+        for h in headers:
+            if h in ("日期", "Date"):
+                row.append((start + timedelta(days=i)).strftime("%Y-%m-%d"))
+            elif h in ("数量", "单价", "总金额", "Amount"):
+                row.append(round(rng.uniform(1, 10000), 2))
+            else:
+                row.append(f"{h[:2]}-{rng.randint(1000, 9999)}")
+        rows.append(row)
+
+    # 表头上方的干扰：标题行 / 空行 / 制表说明
+    prefix = []
+    for _ in range(rng.choice([0, 0, 1, 2, 3])):
+        prefix.append(rng.choice([["2024年度财务报表"], [], ["制表人: 张三", None, "单位: 元"]]))
+    header_row = len(prefix)
+
+    data_sheet = rng.choice(["Sheet1", "明细", "Data", "流水"])
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        if rng.random() < 0.4:
+            pd.DataFrame([["本文件为系统导出"], ["请勿修改"]]).to_excel(
+                writer, sheet_name="封面说明", index=False, header=False)
+        grid = prefix + [headers] + rows
+        pd.DataFrame(grid).to_excel(writer, sheet_name=data_sheet, index=False, header=False)
+        if rng.random() < 0.3:
+            pd.DataFrame([["合计", sum(r[0] if isinstance(r[0], float) else 0 for r in rows)]]).to_excel(
+                writer, sheet_name="汇总", index=False, header=False)
+    return data_sheet, header_row
+
+
+def run(n: int, use_llm: bool, threshold: float):
+    rng = random.Random(42)
+    detector = HeuristicDetector()
+    stats = {"heuristic": [0, 0, 0.0], "llm": [0, 0, 0.0]}  # [sheet 正确, header 正确, 耗时]
+    confident = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = []
+        for i in range(n):
+            path = os.path.join(tmp, f"case_{i}.xlsx")
+            cases.append((path, *make_workbook(path, rng)))
+
+        for path, true_sheet, true_header in cases:
+            xls = pd.ExcelFile(path)
+            previews = {s: pd.read_excel(xls, sheet_name=s, header=None, nrows=20) for s in xls.sheet_names}
+
+            t0 = time.perf_counter()
+            sheet_det = detector.detect_sheet(previews)
+            header_det = detector.detect_header(previews[sheet_det.value])
+            stats["heuristic"][2] += time.perf_counter() - t0
+            stats["heuristic"][0] += sheet_det.value == true_sheet
+            stats["heuristic"][1] += header_det.value == true_header
+            confident += min(sheet_det.confidence, header_det.confidence) >= threshold
+
+            if use_llm:
+                t0 = time.perf_counter()
+                llm_sheet = llm_select_sheet(xls.sheet_names)
+                llm_header, _, _ = llm_detect_header(previews.get(llm_sheet, previews[true_sheet]))
+                stats["llm"][2] += time.perf_counter() - t0
+                stats["llm"][0] += llm_sheet == true_sheet
+                stats["llm"][1] += llm_header == true_header
+
+    print(f"\n📊 样本数: {n} | 置信度阈值: {threshold}")
+    for name, (sheet_ok, header_ok, elapsed) in stats.items():
+        if name == "llm" and not use_llm:
+            continue
+        print(f"   [{name:9s}] Sheet 准确率 {sheet_ok / n:.1%} | Header 准确率 {header_ok / n:.1%} "
+              f"| 平均耗时 {elapsed / n * 1000:.2f} ms")
+    print(f"   启发式高置信度 (无需 LLM) 占比: {confident / n:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=60)
+    parser.add_argument("--llm", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.75)
+    args = parser.parse_args()
+    run(args.n, args.llm, args.threshold)
@@ -0,0 +1,86 @@
+"""
+工作簿解析基准：旧流程 (三次 openpyxl 解析) vs WorkbookReader (预览只解析前 20 行，目标 Sheet 完整解析一次，优先 calamine)
+并校验加载结果与 pd.read_excel 的值和 dtype 完全一致。
+
+用法:
+    python benchmarks/bench_ingestion_reader.py [--rows 100000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.workbook_reader import WorkbookReader, HAS_CALAMINE
+
+
+def make_ledger(path: str, rows: int):
+    """生成带标题行的多 MB 流水账 (xlsxwriter 写入更快；未安装时退回 openpyxl)"""
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    df = pd.DataFrame({
+        "日期": [start + timedelta(minutes=i) for i in range(rows)],
+        "流水号": [f"TRX-{i:08d}" for i in range(rows)],
+        "客户名称": [rng.choice(["腾讯", "阿里巴巴", "字节跳动", "京东", "美团"]) for _ in range(rows)],
+        "数量": [rng.randint(1, 500) for _ in range(rows)],
+        "单价": [round(rng.uniform(1, 999), 2) for _ in range(rows)],
+        "总金额": [round(rng.uniform(1, 99999), 2) for _ in range(rows)],
+        "摘要": [rng.choice(["服务费", "订阅", "充值", "退款"]) for _ in range(rows)],
+        "客户编号": [f"{rng.randint(1, 99999):05d}" for _ in range(rows)],  # 文本单元格 '00123'，不能被转成数值
+    })
+    try:
+        import xlsxwriter  # noqa: F401
+        engine = "xlsxwriter"
+    except ImportError:
+        engine = "openpyxl"
+    with pd.ExcelWriter(path, engine=engine) as writer:
+        pd.DataFrame([["2024年度流水账"]]).to_excel(writer, sheet_name="明细", index=False, header=False)
+        df.to_excel(writer, sheet_name="明细", index=False, startrow=2)
+        df.to_excel(writer, sheet_name="辅助", index=False)  # 与明细同样大的辅助 Sheet：预览时不应整表解析
+
+
+def legacy_ingest(path: str, header_row: int) -> pd.DataFrame:
+    xls = pd.ExcelFile(path, engine="openpyxl")
+    sheet = xls.sheet_names[0]
+    pd.read_excel(path, sheet_name=sheet, header=None, nrows=20, engine="openpyxl")
+    return pd.read_excel(path, sheet_name=sheet, header=header_row, engine="openpyxl")
+
+
+def reader_ingest(path: str, header_row: int, engine=None) -> pd.DataFrame:
+    with WorkbookReader(path, engine=engine) as reader:
+        for sheet in reader.sheet_names:  # 与摄取流程一致：每个 Sheet 都取预览
+            reader.preview(sheet, nrows=20)
+        return reader.load(reader.sheet_names[0], header_row)
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ledger.xlsx")
+        make_ledger(path, args.rows)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"\n📂 测试文件: {args.rows} 行, {size_mb:.1f} MB")
+
+        legacy_df, t_legacy = timed(legacy_ingest, path, 2)
+        print(f"   [legacy   ] 3 次 openpyxl 解析: {t_legacy:.2f}s")
+
+        engines = ["openpyxl"] + (["calamine"] if HAS_CALAMINE else [])
+        for engine in engines:
+            df, elapsed = timed(reader_ingest, path, 2, engine=engine)
+            same = df.dtypes.equals(legacy_df.dtypes) and df.equals(legacy_df)
+            print(f"   [reader/{engine:9s}] {elapsed:.2f}s | 加速 {t_legacy / elapsed:.1f}x | 结果一致 (值 + dtype): {same}")
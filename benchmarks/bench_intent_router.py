@@ -0,0 +1,78 @@
+"""
+Supervisor 路由基准：本地意图分类器 (快速路径) vs LLM 路由 (覆盖率 + 一致率 + 延迟)
+
+用法:
+    python benchmarks/bench_intent_router.py [--classifier rules] [--threshold 0.8] [--llm]
+
+--llm 需要配置 GOOGLE_API_KEY：对语料逐条调用现有 LLM 路由，统计快速路径与 LLM 的一致率。
+不加 --llm 时以语料中的人工标注 (label) 作为参照。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.intent_router import get_intent_classifier
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_corpus.jsonl")
+# 与真实会话类似的上下文：提到表名/列名也是路由信号
+DEMO_CONTEXT = {
+    "sales.xlsx": pd.DataFrame(columns=["日期", "订单号", "客户名称", "数量", "单价", "总金额"]),
+    "bank.xlsx": pd.DataFrame(columns=["交易日期", "流水号", "对方户名", "金额"]),
+}
+
+
+def load_corpus(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--classifier", default="rules")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--llm", action="store_true")
+    args = parser.parse_args()
+
+    corpus = load_corpus(CORPUS)
+    classifier = get_intent_classifier(args.classifier)
+
+    if args.llm:
+        from app.services.workflow import llm_route
+        t0 = time.perf_counter()
+        for item in corpus:
+            item["reference"] = llm_route(item["instruction"], [], list(DEMO_CONTEXT.keys()))["router_decision"]
+        llm_ms = (time.perf_counter() - t0) * 1000 / len(corpus)
+        reference = "LLM 路由"
+    else:
+        for item in corpus:
+            item["reference"] = item["label"]
+        llm_ms = None
+        reference = "人工标注"
+
+    covered, agree, disagreements = 0, 0, []
+    t0 = time.perf_counter()
+    for item in corpus:
+        intent = classifier.classify(item["instruction"], DEMO_CONTEXT)
+        if intent is None or intent.confidence < args.threshold:
+            continue
+        covered += 1
+        if intent.decision == item["reference"]:
+            agree += 1
+        else:
+            disagreements.append((item["instruction"], intent.decision, item["reference"], intent.confidence))
+    fast_ms = (time.perf_counter() - t0) * 1000 / len(corpus)
+
+    print(f"\n🧭 语料 {len(corpus)} 条 | 分类器 {args.classifier} | 阈值 {args.threshold} | 参照: {reference}")
+    print(f"   快速路径覆盖率: {covered / len(corpus):.1%} ({covered}/{len(corpus)})")
+    print(f"   覆盖部分一致率: {agree / covered:.1%}" if covered else "   覆盖部分一致率: -")
+    print(f"   本地分类耗时: {fast_ms:.3f} ms/条" + (f" | LLM 路由耗时: {llm_ms:.0f} ms/条" if llm_ms else ""))
+    if llm_ms:
+        print(f"   预计每轮节省: {covered / len(corpus) * llm_ms:.0f} ms")
+    for text, got, expected, conf in disagreements:
+        print(f"   ❌ {text!r}: 快速路径 {got} ({conf:.2f}) vs {expected}")
@@ -0,0 +1,89 @@
+"""
+报表导出基准：旧流程 (pandas + openpyxl 全量写出) vs xlsxwriter 常量内存逐行写出 vs parquet / csv 压缩包
+以及数据未变化时的指纹复用
+
+用法:
+    python benchmarks/bench_report_export.py [--rows 200000] [--trace-memory]
+    (--trace-memory 统计峰值内存，tracemalloc 本身会明显拖慢写入)
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import report_export
+from app.services.report_export import (save_full_context_excel, save_full_context_archive,
+                                       report_fingerprint, report_tables)
+from app.utils.tools import AuditLogger
+
+
+def make_context(rows: int) -> dict:
+    rng = np.random.default_rng(0)
+    sales = pd.DataFrame({
+        "订单号": [f"ORD-{i:08d}" for i in range(rows)],
+        "日期": pd.date_range("2024-01-01", periods=rows, freq="min"),
+        "客户名称": rng.choice(["腾讯", "阿里巴巴", "字节跳动", "京东", "美团"], rows),
+        "数量": rng.integers(1, 500, rows),
+        "单价": rng.uniform(1, 999, rows).round(2),
+    })
+    sales.loc[::97, "单价"] = np.nan
+    bank = sales.sample(frac=0.5, random_state=0).reset_index(drop=True)
+    return {"sales.xlsx": sales, "bank.xlsx": bank}
+
+
+def timed(fn, *args, trace_memory=False):
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - t0
+    if not trace_memory:
+        return elapsed, ""
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, f" | 峰值内存 {peak / 1024 / 1024:.0f} MB"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    dfs = make_context(args.rows)
+    audit = AuditLogger()
+    audit.info("清洗", "去除空值", 10)
+    print(f"\n📦 测试数据: {sum(len(df) for df in dfs.values())} 行, {len(dfs)} 张表")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        has_xlsxwriter = report_export.HAS_XLSXWRITER
+        report_export.HAS_XLSXWRITER = False
+        t_legacy, mem_legacy = timed(save_full_context_excel, None, dfs, audit, os.path.join(tmp, "legacy.xlsx"),
+                                     trace_memory=args.trace_memory)
+        print(f"   [openpyxl   ] {t_legacy:.2f}s{mem_legacy}")
+
+        if has_xlsxwriter:
+            report_export.HAS_XLSXWRITER = True
+            path = os.path.join(tmp, "stream.xlsx")
+            t_new, mem_new = timed(save_full_context_excel, None, dfs, audit, path, trace_memory=args.trace_memory)
+            same = all(
+                pd.read_excel(path, sheet_name=os.path.splitext(name)[0]).equals(df)
+                for name, df in dfs.items()
+            )
+            print(f"   [xlsxwriter ] {t_new:.2f}s{mem_new} | 加速 {t_legacy / t_new:.1f}x | 回读一致: {same}")
+
+        for fmt in ["parquet", "csv"]:
+            path = os.path.join(tmp, f"report_{fmt}.zip")
+            t_fmt, mem_fmt = timed(save_full_context_archive, dfs, audit, path, fmt, trace_memory=args.trace_memory)
+            print(f"   [{fmt:11s}] {t_fmt:.2f}s{mem_fmt} | 加速 {t_legacy / t_fmt:.1f}x | "
+                  f"文件 {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+        t_fp, _ = timed(report_fingerprint, report_tables(dfs))
+        print(f"   [指纹复用   ] {t_fp * 1000:.0f} ms (数据未变化时只需计算指纹)")
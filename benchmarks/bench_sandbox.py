@@ -0,0 +1,113 @@
+"""
+沙箱执行基准：对比服务进程内执行与沙箱进程池执行的单次开销 (冷启动 / 预热后 / 表未变化 / 表被修改)，
+并演示失控代码 (死循环、内存暴涨) 被终止后服务进程不受影响；
+--over-budget 校验表总大小超过共享内存预算 (单个 Session 超预算 / 多个 Session 并发排队) 时执行仍然成功。
+
+用法:
+    python benchmarks/bench_sandbox.py [--rows 10000 100000 1000000] [--repeat 5] [--runaway] [--over-budget]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.sandbox import SandboxPool
+from app.services.workflow import execute_code_local
+
+READ_ONLY = "summary = dfs['sales.xlsx'].groupby('客户名称')['总金额'].sum()\nprint(summary.head())"
+MUTATE = "dfs['sales.xlsx']['含税金额'] = dfs['sales.xlsx']['总金额'] * 1.13\nprint('WORKER_DONE')"
+
+
+def make_tables(rows: int) -> dict:
+    rng = np.random.default_rng(0)
+    sales = pd.DataFrame({
+        "日期": pd.date_range("2024-01-01", periods=rows, freq="min"),
+        "订单号": [f"ORD-{i:07d}" for i in range(rows)],
+        "客户名称": rng.choice(["腾讯", "阿里巴巴", "字节跳动", "京东"], rows),
+        "数量": rng.integers(1, 50, rows),
+        "总金额": rng.uniform(10, 5000, rows).round(2),
+    })
+    bank = sales[["日期", "订单号", "总金额"]].rename(columns={"总金额": "金额"})
+    return {"sales.xlsx": sales, "bank.xlsx": bank}
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(samples))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--runaway", action="store_true", help="演示死循环 / 内存暴涨被终止")
+    parser.add_argument("--over-budget", action="store_true", help="表总大小超过共享内存预算时的正确性")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    pool = SandboxPool(size=1, timeout=10, cpu_seconds=5, memory_mb=1024)
+    pool.execute({}, "print('warm up')")
+    print(f"🚀 进程池启动 + 预热: {(time.perf_counter() - t0) * 1000:.0f} ms (仅服务启动时一次)")
+
+    print(f"\n{'行数':>10} | {'进程内 只读':>10} | {'沙箱 首次':>9} | {'沙箱 只读':>9} | {'进程内 修改':>10} | {'沙箱 修改':>9}")
+    for rows in args.rows:
+        tables = make_tables(rows)
+        local_read = timed(lambda: execute_code_local(dict(tables), READ_ONLY), args.repeat)
+
+        shared = dict(tables)
+        t0 = time.perf_counter()
+        pool.execute(shared, READ_ONLY)  # 首次：写入共享内存 + worker 解码
+        first = (time.perf_counter() - t0) * 1000
+        sandbox_read = timed(lambda: pool.execute(shared, READ_ONLY), args.repeat)
+
+        local_mutate = timed(lambda: execute_code_local({k: v.copy() for k, v in tables.items()}, MUTATE),
+                             args.repeat)
+        sandbox_mutate = timed(lambda: pool.execute(dict(tables), MUTATE), args.repeat)
+        print(f"{rows:>10,} | {local_read:>9.1f}ms | {first:>7.1f}ms | {sandbox_read:>7.1f}ms | "
+              f"{local_mutate:>9.1f}ms | {sandbox_mutate:>7.1f}ms")
+
+    if args.runaway:
+        print()
+        for label, code in [("死循环", "while True:\n    pass"),
+                            ("内存暴涨", "blocks = []\nwhile True:\n    blocks.append(np.ones(10_000_000))"),
+                            ("sleep 超时", "import time\ntime.sleep(60)")]:
+            t0 = time.perf_counter()
+            result = pool.execute({}, code)
+            message = result["log"].strip().splitlines()[-1]
+            print(f"🧨 {label}: {(time.perf_counter() - t0):.1f}s 后返回 → {message[:70]}")
+        t0 = time.perf_counter()
+        ok = pool.execute({}, "print('still alive')")["log"].strip()
+        print(f"✅ 之后的执行: {ok} ({(time.perf_counter() - t0) * 1000:.0f} ms，含补充新 worker 的预热)")
+
+    if args.over_budget:
+        # 预算 1 MB，每个 Session 两张约 10 MB 的表：发布第二张表时第一张也不能被淘汰
+        small = SandboxPool(size=1, timeout=60, cpu_seconds=30, memory_mb=2048, shm_mb=1)
+        sessions = [make_tables(200_000) for _ in range(4)]
+        results = []
+
+        def run(tables):
+            results.append(small.execute(dict(tables), READ_ONLY)["success"])
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=run, args=(t,)) for t in sessions for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = small.stats()
+        print(f"\n💾 超预算: {len(sessions)} 个 Session × 2 次并发执行 (预算 1 MB) → 成功 {sum(results)}/{len(results)}, "
+              f"{time.perf_counter() - t0:.1f}s, 结束后共享文件 {stats['shared_tables_mb']} MB / 钉住 {stats['shared_pinned']}")
+        small.shutdown()
+
+    print(f"\n📊 {pool.stats()}")
+    pool.shutdown()
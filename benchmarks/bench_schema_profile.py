@@ -0,0 +1,60 @@
+"""
+Schema 上下文基准：旧流程 (每次 df.info + head 全量拼接) vs SchemaProfiler (按表版本缓存 + Token 预算裁剪)
+
+用法:
+    python benchmarks/bench_schema_profile.py [--rows 200000] [--wide-cols 300] [--retries 3]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.schema_profile import SchemaProfiler, legacy_schema
+from app.utils.tokens import estimate_tokens
+
+
+def make_context(rows: int, wide_cols: int) -> dict:
+    rng = np.random.default_rng(0)
+    sales = pd.DataFrame({
+        "订单号": [f"ORD-{i:08d}" for i in range(rows)],
+        "日期": pd.date_range("2024-01-01", periods=rows, freq="min"),
+        "客户名称": rng.choice(["腾讯", "阿里巴巴", "字节跳动", "京东", "美团"], rows),
+        "数量": rng.integers(1, 500, rows),
+        "单价": rng.uniform(1, 999, rows).round(2),
+    })
+    wide = pd.DataFrame(rng.normal(size=(5000, wide_cols)), columns=[f"指标_{i}" for i in range(wide_cols)])
+    return {"sales.xlsx": sales, "metrics.xlsx": wide}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--wide-cols", type=int, default=300)
+    parser.add_argument("--retries", type=int, default=3, help="模拟自愈重试次数 (每次都要重建 Schema)")
+    args = parser.parse_args()
+
+    dfs = make_context(args.rows, args.wide_cols)
+    calls = 1 + args.retries
+
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        legacy = "".join(legacy_schema(name, df) for name, df in dfs.items())
+    t_legacy = time.perf_counter() - t0
+
+    profiler = SchemaProfiler()
+    t0 = time.perf_counter()
+    schema = profiler.render(dfs)
+    t_cold = time.perf_counter() - t0
+    for _ in range(args.retries):
+        schema = profiler.render(dfs)
+    t_new = time.perf_counter() - t0
+
+    print(f"\n📐 {len(dfs)} 张表, {calls} 次调用 (1 次生成 + {args.retries} 次重试)")
+    print(f"   [legacy  ] Token/次 {estimate_tokens(legacy)} | 总耗时 {t_legacy * 1000:.0f} ms")
+    print(f"   [profiler] Token/次 {estimate_tokens(schema)} | 总耗时 {t_new * 1000:.0f} ms "
+          f"(首次 {t_cold * 1000:.0f} ms, 命中缓存 {(t_new - t_cold) / max(args.retries, 1) * 1000:.0f} ms/次) | 缓存 {profiler.stats()}")
@@ -0,0 +1,60 @@
+"""
+快照存储基准：内存深拷贝备份 vs SnapshotStore (磁盘 Arrow IPC，懒加载)
+
+用法:
+    python benchmarks/bench_snapshot_store.py [--rows 1000000]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.snapshot_store import SnapshotStore
+
+
+def make_table(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "订单号": [f"ORD-{i:08d}" for i in range(rows)],
+        "日期": pd.date_range("2024-01-01", periods=rows, freq="min"),
+        "客户名称": rng.choice(["腾讯", "阿里巴巴", "字节跳动", "京东", "美团"], rows),
+        "数量": rng.integers(1, 500, rows),
+        "单价": rng.uniform(1, 999, rows).round(2),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    df = make_table(args.rows)
+    resident_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+    print(f"\n📦 测试表: {args.rows} 行, 内存占用 {resident_mb:.1f} MB")
+
+    t0 = time.perf_counter()
+    backup = df.copy(deep=True)
+    t_copy = time.perf_counter() - t0
+    restored = backup.copy(deep=True)
+    t_copy_restore = time.perf_counter() - t0 - t_copy
+    print(f"   [deep copy] 常驻额外内存 {resident_mb:.1f} MB | 备份 {t_copy * 1000:.0f} ms | 还原 {t_copy_restore * 1000:.0f} ms")
+    del backup, restored
+
+    for compression in ["zstd", "lz4", "uncompressed"]:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(tmp, compression=compression)
+            t0 = time.perf_counter()
+            store.save("sales.xlsx", df, "original")
+            t_save = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            restored = store.load("sales.xlsx", "original")
+            t_load = time.perf_counter() - t0
+            ok = restored.equals(df)
+            print(f"   [{compression:12s}] 常驻额外内存 0 MB | 磁盘 {store.nbytes() / 1024 / 1024:.1f} MB "
+                  f"| 备份 {t_save * 1000:.0f} ms | 还原 {t_load * 1000:.0f} ms | 一致: {ok}")